@@ -0,0 +1,97 @@
+"""
+Alembic environment. The database URL comes from the app settings (DATABASE_URL),
+not from alembic.ini, so `alembic upgrade head` always targets the portal's database.
+"""
+
+from logging.config import fileConfig
+
+from alembic import context
+from sqlalchemy import engine_from_config, pool
+
+from models.database import Base, DATABASE_URL
+import models.user
+import models.vendor
+import models.invoice
+import models.session
+import models.audit
+import models.error_log
+import models.message
+import models.system_setting
+import models.tax_document
+import models.stored_file
+import models.upload_session
+import models.invoice_rollup
+import models.fingerprint
+from services.search import FTS_TABLES, TRGM_INDEXES
+
+config = context.config
+if config.config_file_name is not None and config.attributes.get("configure_logger", True):
+    fileConfig(config.config_file_name, disable_existing_loggers=False)
+
+target_metadata = Base.metadata
+
+# FTS5 shadow tables that SQLite creates next to each virtual table
+FTS_SHADOW_SUFFIXES = ("", "_data", "_idx", "_config", "_docsize", "_content")
+
+def include_name(name, type_, parent_names) -> bool:
+    """
+    Leave the search index (services/search.py install(), run by init_db) out of
+    autogenerate: the FTS5 tables and the pg_trgm indexes are not in the metadata,
+    so without this `alembic revision --autogenerate` would drop them.
+    """
+    if type_ == "table":
+        return not any(name == fts + suffix for fts in FTS_TABLES for suffix in FTS_SHADOW_SUFFIXES)
+    if type_ == "index":
+        return name not in TRGM_INDEXES
+    return True
+
+def database_url() -> str:
+    # An explicit -x url=... (or a URL set programmatically) wins over the app settings
+    url = context.get_x_argument(as_dictionary=True).get("url")
+    configured = config.get_main_option("sqlalchemy.url")
+    if not url and configured and not configured.startswith("driver://"):
+        url = configured
+    return url or DATABASE_URL
+
+def run_migrations_offline():
+    """Emit the migration SQL to stdout (alembic upgrade head --sql)."""
+    url = database_url()
+    context.configure(
+        url=url,
+        target_metadata=target_metadata,
+        literal_binds=True,
+        dialect_opts={"paramstyle": "named"},
+        render_as_batch=url.startswith("sqlite"),
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+def run_migrations_online():
+    # init_db() passes its own connection so the app and the migrations share one engine
+    connection = config.attributes.get("connection")
+    if connection is not None:
+        _run(connection)
+        return
+
+    connectable = engine_from_config(
+        {"sqlalchemy.url": database_url()}, prefix="sqlalchemy.", poolclass=pool.NullPool
+    )
+    with connectable.connect() as connection:
+        _run(connection)
+
+def _run(connection):
+    context.configure(
+        connection=connection,
+        target_metadata=target_metadata,
+        # SQLite cannot ALTER most things in place; batch mode rebuilds the table instead
+        render_as_batch=connection.dialect.name == "sqlite",
+        include_name=include_name,
+    )
+    with context.begin_transaction():
+        context.run_migrations()
+
+if context.is_offline_mode():
+    run_migrations_offline()
+else:
+    run_migrations_online()
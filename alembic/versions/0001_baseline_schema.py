@@ -0,0 +1,271 @@
+"""baseline schema
+
+The schema as Base.metadata.create_all() built it up to this revision, including the
+stored invoice totals, the content-addressed store, upload sessions and invoice rollups.
+Databases created by create_all() before migrations existed are stamped at this
+revision by init_db() instead of running it.
+
+Revision ID: 0001
+Revises:
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0001'
+down_revision = None
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('invoice_rollups',
+    sa.Column('vendor_id', sa.Integer(), nullable=False),
+    sa.Column('status', sa.String(length=50), nullable=False),
+    sa.Column('document_type', sa.String(length=20), nullable=False),
+    sa.Column('invoice_count', sa.Integer(), nullable=False),
+    sa.Column('base_amount', sa.Numeric(precision=16, scale=2), nullable=False),
+    sa.Column('tax_amount', sa.Numeric(precision=16, scale=2), nullable=False),
+    sa.Column('igst_amount', sa.Numeric(precision=16, scale=2), nullable=False),
+    sa.PrimaryKeyConstraint('vendor_id', 'status', 'document_type')
+    )
+    op.create_table('stored_files',
+    sa.Column('file_hash', sa.String(length=64), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('size', sa.Integer(), nullable=True),
+    sa.Column('ref_count', sa.Integer(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('file_hash')
+    )
+    op.create_table('system_settings',
+    sa.Column('key', sa.String(length=100), nullable=False),
+    sa.Column('value', sa.Text(), nullable=False),
+    sa.PrimaryKeyConstraint('key')
+    )
+    op.create_index('ix_system_settings_key', 'system_settings', ['key'], unique=False)
+
+    op.create_table('vendors',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('company_name', sa.String(length=255), nullable=False),
+    sa.Column('contact_person', sa.String(length=255), nullable=True),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('mobile', sa.String(length=15), nullable=True),
+    sa.Column('pan', sa.String(length=10), nullable=True),
+    sa.Column('gstin', sa.String(length=15), nullable=True),
+    sa.Column('bank_account_no', sa.String(length=50), nullable=True),
+    sa.Column('bank_name', sa.String(length=255), nullable=True),
+    sa.Column('ifsc_code', sa.String(length=20), nullable=True),
+    sa.Column('account_holder_name', sa.String(length=255), nullable=True),
+    sa.Column('address', sa.Text(), nullable=True),
+    sa.Column('entity_type', sa.String(length=50), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('kyc_verified', sa.Boolean(), nullable=True),
+    sa.Column('tds_applicable', sa.Boolean(), nullable=True),
+    sa.Column('tds_rate', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('tds_nature_of_payment', sa.String(length=255), nullable=True),
+    sa.Column('pan_doc_path', sa.String(length=500), nullable=True),
+    sa.Column('gst_doc_path', sa.String(length=500), nullable=True),
+    sa.Column('msme_doc_path', sa.String(length=500), nullable=True),
+    sa.Column('coi_doc_path', sa.String(length=500), nullable=True),
+    sa.Column('cheque_doc_path', sa.String(length=500), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('remarks', sa.Text(), nullable=True),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_vendors_created_at', 'vendors', ['created_at'], unique=False)
+    op.create_index('ix_vendors_email', 'vendors', ['email'], unique=True)
+    op.create_index('ix_vendors_id', 'vendors', ['id'], unique=False)
+    op.create_index('ix_vendors_status', 'vendors', ['status'], unique=False)
+
+    op.create_table('users',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('email', sa.String(length=255), nullable=False),
+    sa.Column('password_hash', sa.String(length=255), nullable=False),
+    sa.Column('name', sa.String(length=255), nullable=False),
+    sa.Column('role', sa.String(length=50), nullable=True),
+    sa.Column('is_active', sa.Boolean(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.Column('vendor_id', sa.Integer(), nullable=True),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_users_email', 'users', ['email'], unique=True)
+    op.create_index('ix_users_id', 'users', ['id'], unique=False)
+
+    op.create_table('error_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('error_message', sa.Text(), nullable=False),
+    sa.Column('stack_trace', sa.Text(), nullable=True),
+    sa.Column('endpoint', sa.String(length=500), nullable=True),
+    sa.Column('method', sa.String(length=10), nullable=True),
+    sa.Column('user_id', sa.Integer(), nullable=True),
+    sa.Column('ai_suggestion', sa.Text(), nullable=True),
+    sa.Column('is_resolved', sa.Boolean(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_error_logs_id', 'error_logs', ['id'], unique=False)
+    op.create_index('ix_error_logs_timestamp', 'error_logs', ['timestamp'], unique=False)
+
+    op.create_table('invoices',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('invoice_no', sa.String(length=50), nullable=False),
+    sa.Column('document_type', sa.String(length=20), nullable=True),
+    sa.Column('vendor_id', sa.Integer(), nullable=False),
+    sa.Column('amount', sa.Numeric(precision=10, scale=2), nullable=False),
+    sa.Column('tax_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('description', sa.Text(), nullable=True),
+    sa.Column('category', sa.String(length=100), nullable=True),
+    sa.Column('invoice_date', sa.DateTime(), nullable=True),
+    sa.Column('file_path', sa.String(length=500), nullable=True),
+    sa.Column('status', sa.String(length=50), nullable=True),
+    sa.Column('rejection_reason', sa.Text(), nullable=True),
+    sa.Column('approved_by', sa.Integer(), nullable=True),
+    sa.Column('approval_comment', sa.Text(), nullable=True),
+    sa.Column('ocr_confidence', sa.Numeric(precision=5, scale=2), nullable=True),
+    sa.Column('is_handwritten', sa.Integer(), nullable=True),
+    sa.Column('file_hash', sa.String(length=64), nullable=True),
+    sa.Column('internal_remarks', sa.Text(), nullable=True),
+    sa.Column('taxable_value', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('non_taxable_value', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('discount', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('cgst', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('sgst', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('igst', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('effective_tax', sa.Numeric(precision=12, scale=2), server_default='0', nullable=False),
+    sa.Column('grand_total', sa.Numeric(precision=12, scale=2), server_default='0', nullable=False),
+    sa.Column('line_items_json', sa.Text(), nullable=True),
+    sa.Column('payment_date', sa.DateTime(), nullable=True),
+    sa.Column('payment_reference', sa.String(length=100), nullable=True),
+    sa.Column('payment_remarks', sa.Text(), nullable=True),
+    sa.Column('tds_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('paid_amount', sa.Numeric(precision=10, scale=2), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('updated_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['approved_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_invoices_created_at', 'invoices', ['created_at'], unique=False)
+    op.create_index('ix_invoices_document_type', 'invoices', ['document_type'], unique=False)
+    op.create_index('ix_invoices_effective_tax', 'invoices', ['effective_tax'], unique=False)
+    op.create_index('ix_invoices_file_hash', 'invoices', ['file_hash'], unique=False)
+    op.create_index('ix_invoices_grand_total', 'invoices', ['grand_total'], unique=False)
+    op.create_index('ix_invoices_id', 'invoices', ['id'], unique=False)
+    op.create_index('ix_invoices_invoice_no', 'invoices', ['invoice_no'], unique=True)
+    op.create_index('ix_invoices_status', 'invoices', ['status'], unique=False)
+
+    op.create_table('messages',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('sender_id', sa.Integer(), nullable=False),
+    sa.Column('receiver_id', sa.Integer(), nullable=False),
+    sa.Column('content', sa.Text(), nullable=False),
+    sa.Column('is_read', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['receiver_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['sender_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_messages_id', 'messages', ['id'], unique=False)
+
+    op.create_table('sessions',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('token', sa.String(length=100), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('vendor_id', sa.Integer(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_sessions_id', 'sessions', ['id'], unique=False)
+    op.create_index('ix_sessions_token', 'sessions', ['token'], unique=True)
+
+    op.create_table('upload_sessions',
+    sa.Column('id', sa.String(length=32), nullable=False),
+    sa.Column('user_id', sa.Integer(), nullable=False),
+    sa.Column('purpose', sa.String(length=20), nullable=False),
+    sa.Column('filename', sa.String(length=255), nullable=False),
+    sa.Column('size', sa.BigInteger(), nullable=False),
+    sa.Column('file_hash', sa.String(length=64), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('expires_at', sa.DateTime(), nullable=False),
+    sa.ForeignKeyConstraint(['user_id'], ['users.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_upload_sessions_expires_at', 'upload_sessions', ['expires_at'], unique=False)
+
+    op.create_table('vendor_tax_documents',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('vendor_id', sa.Integer(), nullable=False),
+    sa.Column('file_path', sa.String(length=500), nullable=False),
+    sa.Column('financial_year', sa.String(length=20), nullable=False),
+    sa.Column('quarter', sa.Enum('Q1', 'Q2', 'Q3', 'Q4', name='taxquarter'), nullable=False),
+    sa.Column('document_type', sa.String(length=50), nullable=True),
+    sa.Column('uploaded_by', sa.Integer(), nullable=True),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.Column('remarks', sa.Text(), nullable=True),
+    sa.ForeignKeyConstraint(['uploaded_by'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['vendor_id'], ['vendors.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_vendor_tax_documents_id', 'vendor_tax_documents', ['id'], unique=False)
+
+    op.create_table('audit_logs',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('invoice_id', sa.Integer(), nullable=True),
+    sa.Column('actor_id', sa.Integer(), nullable=True),
+    sa.Column('actor_name', sa.String(length=255), nullable=True),
+    sa.Column('actor_role', sa.String(length=50), nullable=True),
+    sa.Column('action', sa.String(length=50), nullable=False),
+    sa.Column('comment', sa.Text(), nullable=True),
+    sa.Column('timestamp', sa.DateTime(), nullable=True),
+    sa.ForeignKeyConstraint(['actor_id'], ['users.id'], ),
+    sa.ForeignKeyConstraint(['invoice_id'], ['invoices.id'], ),
+    sa.PrimaryKeyConstraint('id')
+    )
+    op.create_index('ix_audit_logs_id', 'audit_logs', ['id'], unique=False)
+
+
+def downgrade():
+    op.drop_index('ix_audit_logs_id', table_name='audit_logs')
+    op.drop_table('audit_logs')
+    op.drop_index('ix_vendor_tax_documents_id', table_name='vendor_tax_documents')
+    op.drop_table('vendor_tax_documents')
+    sa.Enum(name='taxquarter').drop(op.get_bind(), checkfirst=True)
+    op.drop_index('ix_upload_sessions_expires_at', table_name='upload_sessions')
+    op.drop_table('upload_sessions')
+    op.drop_index('ix_sessions_token', table_name='sessions')
+    op.drop_index('ix_sessions_id', table_name='sessions')
+    op.drop_table('sessions')
+    op.drop_index('ix_messages_id', table_name='messages')
+    op.drop_table('messages')
+    op.drop_index('ix_invoices_status', table_name='invoices')
+    op.drop_index('ix_invoices_invoice_no', table_name='invoices')
+    op.drop_index('ix_invoices_id', table_name='invoices')
+    op.drop_index('ix_invoices_grand_total', table_name='invoices')
+    op.drop_index('ix_invoices_file_hash', table_name='invoices')
+    op.drop_index('ix_invoices_effective_tax', table_name='invoices')
+    op.drop_index('ix_invoices_document_type', table_name='invoices')
+    op.drop_index('ix_invoices_created_at', table_name='invoices')
+    op.drop_table('invoices')
+    op.drop_index('ix_error_logs_timestamp', table_name='error_logs')
+    op.drop_index('ix_error_logs_id', table_name='error_logs')
+    op.drop_table('error_logs')
+    op.drop_index('ix_users_id', table_name='users')
+    op.drop_index('ix_users_email', table_name='users')
+    op.drop_table('users')
+    op.drop_index('ix_vendors_status', table_name='vendors')
+    op.drop_index('ix_vendors_id', table_name='vendors')
+    op.drop_index('ix_vendors_email', table_name='vendors')
+    op.drop_index('ix_vendors_created_at', table_name='vendors')
+    op.drop_table('vendors')
+    op.drop_index('ix_system_settings_key', table_name='system_settings')
+    op.drop_table('system_settings')
+    op.drop_table('stored_files')
+    op.drop_table('invoice_rollups')
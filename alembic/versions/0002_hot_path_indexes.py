@@ -0,0 +1,52 @@
+"""hot-path indexes
+
+Indexes for the vendor-scoped invoice queries (duplicate checks in
+ValidationService.validate_invoice, every "WHERE vendor_id = ?"), admin listings by
+status, message threads, session expiry sweeps, audit trails and tax documents.
+
+invoices.vendor_id gets no index of its own: both vendor composites lead with it,
+so either one answers a plain vendor_id lookup.
+
+On PostgreSQL the indexes are built CONCURRENTLY, so a live database keeps taking
+writes while they build. IF NOT EXISTS makes the revision safe to re-run after a
+partial failure and on databases whose tables create_all() built with the indexes.
+
+Revision ID: 0002
+Revises: 0001
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0002'
+down_revision = '0001'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_invoices_vendor_invoice_no', 'invoices', ['vendor_id', 'invoice_no']),
+    ('ix_invoices_vendor_amount_date', 'invoices', ['vendor_id', 'amount', 'invoice_date']),
+    ('ix_invoices_status_created_at', 'invoices', ['status', 'created_at']),
+    ('ix_messages_conversation', 'messages', ['sender_id', 'receiver_id', 'created_at']),
+    ('ix_sessions_expires_at', 'sessions', ['expires_at']),
+    ('ix_audit_logs_invoice_timestamp', 'audit_logs', ['invoice_id', 'timestamp']),
+    ('ix_vendor_tax_documents_vendor_created', 'vendor_tax_documents', ['vendor_id', 'created_at']),
+]
+
+
+def upgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    # CREATE INDEX CONCURRENTLY cannot run inside a transaction
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True,
+                          postgresql_concurrently=concurrently)
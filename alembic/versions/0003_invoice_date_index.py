@@ -0,0 +1,31 @@
+"""invoice date index
+
+Date-range filters (financial-year views in the invoice list, pending invoices,
+reports) read the whole invoices table without it; test_query_plans.py flags them.
+
+Revision ID: 0003
+Revises: 0002
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0003'
+down_revision = '0002'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.create_index('ix_invoices_invoice_date', 'invoices', ['invoice_date'], unique=False, if_not_exists=True,
+                        postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        op.drop_index('ix_invoices_invoice_date', table_name='invoices', if_exists=True,
+                      postgresql_concurrently=concurrently)
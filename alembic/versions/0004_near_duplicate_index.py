@@ -0,0 +1,61 @@
+"""near duplicate index
+
+File fingerprints, their locality-sensitive hash buckets and the matches found
+between files (services/near_duplicates.py). Tables and indexes are created with
+IF NOT EXISTS: databases that init_db() built with create_all() and stamped at the
+baseline already have them.
+
+Revision ID: 0004
+Revises: 0003
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '0004'
+down_revision = '0003'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.create_table('file_fingerprints',
+    sa.Column('file_hash', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('signature', sa.LargeBinary(), nullable=False),
+    sa.Column('created_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('file_hash'),
+    if_not_exists=True
+    )
+    op.create_table('fingerprint_bands',
+    sa.Column('band_key', sa.BigInteger(), autoincrement=False, nullable=False),
+    sa.Column('file_hash', sa.String(length=64), nullable=False),
+    sa.PrimaryKeyConstraint('band_key', 'file_hash'),
+    if_not_exists=True
+    )
+    op.create_table('near_duplicate_matches',
+    sa.Column('id', sa.Integer(), nullable=False),
+    sa.Column('file_hash', sa.String(length=64), nullable=False),
+    sa.Column('match_hash', sa.String(length=64), nullable=False),
+    sa.Column('kind', sa.String(length=10), nullable=False),
+    sa.Column('similarity', sa.Float(), nullable=False),
+    sa.Column('detected_at', sa.DateTime(), nullable=True),
+    sa.PrimaryKeyConstraint('id'),
+    if_not_exists=True
+    )
+    op.create_index('ix_near_duplicate_matches_detected_at', 'near_duplicate_matches', ['detected_at'], unique=False, if_not_exists=True)
+    op.create_index('ix_near_duplicate_matches_file_hash', 'near_duplicate_matches', ['file_hash'], unique=False, if_not_exists=True)
+    op.create_index('ix_near_duplicate_matches_id', 'near_duplicate_matches', ['id'], unique=False, if_not_exists=True)
+    op.create_index('ix_near_duplicate_matches_match_hash', 'near_duplicate_matches', ['match_hash'], unique=False, if_not_exists=True)
+
+
+def downgrade():
+    op.drop_index('ix_near_duplicate_matches_match_hash', table_name='near_duplicate_matches')
+    op.drop_index('ix_near_duplicate_matches_id', table_name='near_duplicate_matches')
+    op.drop_index('ix_near_duplicate_matches_file_hash', table_name='near_duplicate_matches')
+    op.drop_index('ix_near_duplicate_matches_detected_at', table_name='near_duplicate_matches')
+    op.drop_table('near_duplicate_matches')
+    op.drop_table('fingerprint_bands')
+    op.drop_table('file_fingerprints')
@@ -0,0 +1,40 @@
+"""vendor directory indexes
+
+GET /api/admin/vendors pages, filters and sorts in SQL. These let the default
+company-name ordering, alone or under a status / KYC filter, walk an index and
+stop after one page instead of sorting the whole vendor master.
+
+Revision ID: 0005
+Revises: 0004
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0005'
+down_revision = '0004'
+branch_labels = None
+depends_on = None
+
+INDEXES = [
+    ('ix_vendors_company_name', 'vendors', ['company_name', 'id']),
+    ('ix_vendors_status_company_name', 'vendors', ['status', 'company_name', 'id']),
+    ('ix_vendors_kyc_verified_company_name', 'vendors', ['kyc_verified', 'company_name', 'id']),
+]
+
+
+def upgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, columns in INDEXES:
+            op.create_index(name, table, columns, unique=False, if_not_exists=True,
+                            postgresql_concurrently=concurrently)
+
+
+def downgrade():
+    concurrently = op.get_bind().dialect.name == 'postgresql'
+    with op.get_context().autocommit_block():
+        for name, table, _ in reversed(INDEXES):
+            op.drop_index(name, table_name=table, if_exists=True,
+                          postgresql_concurrently=concurrently)
@@ -0,0 +1,29 @@
+"""normalize vendor status
+
+The vendor directory filters on status with a plain comparison, so that it can
+walk ix_vendors_status_company_name. The application writes the lowercase
+VendorStatus values, but older rows may hold mixed case, padding or NULL
+(shown as "pending"); rewrite those to the canonical form.
+
+Revision ID: 0006
+Revises: 0005
+Create Date: 2026-10-17 00:00:00
+"""
+from alembic import op
+
+
+# revision identifiers, used by Alembic.
+revision = '0006'
+down_revision = '0005'
+branch_labels = None
+depends_on = None
+
+
+def upgrade():
+    op.execute("UPDATE vendors SET status = 'pending' WHERE status IS NULL OR TRIM(status) = ''")
+    op.execute("UPDATE vendors SET status = LOWER(TRIM(status)) WHERE status <> LOWER(TRIM(status))")
+
+
+def downgrade():
+    # The original spellings are not kept; the normalized values are valid under 0005 too
+    pass
@@ -0,0 +1,103 @@
+"""
+Benchmark for the bulk invoice import (services/bulk_import.py): builds a manifest and a
+zip of N small invoice files on disk, imports them into a throwaway SQLite database
+(plus a second import of the same files, all rejected as duplicates), and reports time
+per row and peak memory. Also checks every row got a result and the invoices landed.
+
+Usage: python benchmark_bulk_import.py [rows]   (default: 10000)
+"""
+
+import csv
+import os
+import resource
+import sys
+import tempfile
+import time
+import zipfile
+from datetime import datetime, timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+# Must be set before models.database creates its engines; uploads/ goes to the temp dir too
+os.environ["DATABASE_URL"] = f"sqlite:///{os.path.join(_tmp.name, 'bulk.db')}"
+os.environ.pop("ASYNC_DATABASE_URL", None)
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+os.chdir(_tmp.name)
+
+from sqlalchemy import func, select
+
+from models.database import init_db, SessionLocal
+from models.audit import AuditLog
+from models.invoice import Invoice
+from models.invoice_rollup import InvoiceRollup
+from models.user import User
+from models.vendor import Vendor
+from services.bulk_import import bulk_import_service
+from services.validation import validation_service
+
+VENDORS = 20
+
+def build_inputs(rows: int) -> tuple:
+    """manifest.csv and invoices.zip with one distinct file per row, streamed to disk."""
+    manifest_path = os.path.join(_tmp.name, "manifest.csv")
+    archive_path = os.path.join(_tmp.name, "invoices.zip")
+    today = datetime.now()
+    with open(manifest_path, "w", newline="") as manifest, zipfile.ZipFile(archive_path, "w", zipfile.ZIP_DEFLATED) as archive:
+        writer = csv.writer(manifest)
+        writer.writerow(["invoice_no", "file", "amount", "invoice_date", "vendor_id", "cgst", "sgst", "category"])
+        for i in range(rows):
+            name = f"scans/{i // 1000:03d}/bulk-{i:06d}.pdf"
+            archive.writestr(name, b"%PDF-1.4\n" + f"bulk import benchmark invoice {i}\n".encode() * 200)
+            date = today - timedelta(days=i % 60)
+            writer.writerow([f"BULK-{i:06d}", name, f"{1000 + i}.00", date.strftime("%d-%m-%Y"), i % VENDORS + 1, "90", "90", "Travel"])
+    return manifest_path, archive_path
+
+def peak_rss_mb() -> float:
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 10000
+    init_db()
+    with SessionLocal() as db:
+        db.add_all([Vendor(company_name=f"Vendor {v:03d}", email=f"v{v}@example.com") for v in range(1, VENDORS + 1)])
+        admin = User(email="admin@example.com", name="Admin", password_hash="-", role="admin", is_active=True)
+        db.add(admin)
+        db.commit()
+        user = {"id": admin.id, "role": "admin"}
+        validation_service.warm_up(db)
+
+    print("=" * 60)
+    print(f"BULK IMPORT BENCHMARK ({rows} rows)")
+    print("=" * 60)
+    started = time.perf_counter()
+    manifest_path, archive_path = build_inputs(rows)
+    print(f"\nℹ inputs built in {time.perf_counter() - started:.1f}s, archive {os.path.getsize(archive_path) / 1024 / 1024:.1f} MB")
+    rss_before = peak_rss_mb()
+
+    failed = False
+    for label, expect_imported in (("first import", rows), ("re-import (all duplicates)", 0)):
+        with SessionLocal() as db:
+            started = time.perf_counter()
+            report = bulk_import_service.run(db, user, manifest_path, "csv", archive_path)
+            elapsed = time.perf_counter() - started
+        print(f"\nℹ {label}: {elapsed:.2f}s, {elapsed / rows * 1e3:.3f} ms/row, "
+              f"imported {report['imported']}, rejected {report['rejected']}, peak RSS {peak_rss_mb():.0f} MB")
+        if report["total"] != rows or report["imported"] != expect_imported or len(report["rows"]) != rows:
+            print(f"❌ expected {expect_imported} imported of {rows}")
+            failed = True
+
+    with SessionLocal() as db:
+        invoices = db.scalar(select(func.count(Invoice.id)))
+        audits = db.scalar(select(func.count(AuditLog.id)))
+        rolled = db.scalar(select(func.sum(InvoiceRollup.invoice_count)))
+    print(f"\nℹ invoices {invoices}, audit entries {audits}, rollup count {rolled}, RSS grew {peak_rss_mb() - rss_before:.0f} MB")
+    if not invoices == audits == rolled == rows:
+        print("❌ invoices, audit entries and rollups disagree")
+        failed = True
+
+    print("\n" + "=" * 60)
+    print("❌ FAILED" if failed else "✅ OK")
+    print("=" * 60)
+    sys.exit(1 if failed else 0)
+
+if __name__ == "__main__":
+    main()
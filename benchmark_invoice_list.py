@@ -0,0 +1,124 @@
+"""
+Benchmark for the /api/invoices/data summary queries.
+Compares the previous round trips (COUNT(*), then totals via IN (subquery)) with
+the single aggregate pass in summarize_invoices(), on a throwaway SQLite database.
+
+Usage: python benchmark_invoice_list.py [rows ...]   (default: 100000 1000000)
+"""
+
+import asyncio
+import os
+import random
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta
+
+from sqlalchemy import create_engine, insert, select, func
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
+
+from models.database import Base
+from models.invoice import Invoice
+from models.user import User  # invoices.approved_by references users
+from models.vendor import Vendor
+from models.invoice import EFFECTIVE_TAX_SQL, backfill_invoice_totals
+from routers.invoices import summarize_invoices
+
+VENDORS = 200
+BATCH = 50000
+REPEAT = 3
+
+def seed(url: str, rows: int):
+    engine = create_engine(url)
+    Base.metadata.create_all(engine)
+    rng = random.Random(42)
+    start = datetime(2022, 4, 1)
+    with engine.begin() as conn:
+        conn.execute(insert(Vendor), [
+            {"id": v, "company_name": f"Vendor {v:03d}", "email": f"v{v}@example.com", "mobile": f"9{v:09d}",
+             "pan": f"ABCDE{v:04d}F", "gstin": f"29ABCDE{v:04d}F1Z5"}
+            for v in range(1, VENDORS + 1)
+        ])
+        for offset in range(0, rows, BATCH):
+            batch = []
+            for i in range(offset, min(offset + BATCH, rows)):
+                amount = rng.randint(1000, 500000) / 100
+                gst = rng.random() < 0.7
+                batch.append({
+                    "invoice_no": f"INV-{i:08d}",
+                    "vendor_id": rng.randint(1, VENDORS),
+                    "amount": amount,
+                    "tax_amount": 0 if gst else round(amount * 0.18, 2),
+                    "cgst": round(amount * 0.09, 2) if gst else 0,
+                    "sgst": round(amount * 0.09, 2) if gst else 0,
+                    "igst": 0,
+                    "status": rng.choice(["pending", "approved", "rejected", "paid"]),
+                    "invoice_date": start + timedelta(days=rng.randint(0, 1000)),
+                    "payment_reference": f"UTR{rng.randrange(10 ** 12):012d}" if rng.random() < 0.3 else None,
+                })
+            conn.execute(insert(Invoice), batch)
+        # Core inserts skip the ORM hook that fills the stored totals
+        backfill_invoice_totals(conn)
+    engine.dispose()
+
+def scenarios():
+    base = select(Invoice)
+    return {
+        "all invoices": base,
+        "status=approved": base.where(Invoice.status == "approved"),
+        "vendor search + FY": base.join(Vendor).where(
+            Vendor.company_name.ilike("%Vendor 01%"),
+            Invoice.invoice_date >= datetime(2023, 4, 1),
+            Invoice.invoice_date <= datetime(2024, 3, 31, 23, 59, 59)
+        ),
+    }
+
+async def legacy_summary(db, query):
+    """What list_my_invoices did before: a count, then totals over IN (subquery)."""
+    total = await db.scalar(select(func.count()).select_from(query.order_by(None).subquery()))
+    totals = (await db.execute(select(
+        func.sum(Invoice.amount),
+        func.sum(EFFECTIVE_TAX_SQL),
+        func.sum(func.coalesce(Invoice.igst, 0))
+    ).where(Invoice.id.in_(query.with_only_columns(Invoice.id).order_by(None))))).first()
+    return total, float(totals[0] or 0), float(totals[1] or 0)
+
+async def timed(fn):
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        result = await fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, result
+
+async def run(url: str):
+    engine = create_async_engine(url)
+    Session = async_sessionmaker(engine, expire_on_commit=False)
+    async with Session() as db:
+        for name, query in scenarios().items():
+            old_time, old = await timed(lambda: legacy_summary(db, query))
+            new_time, summary = await timed(lambda: summarize_invoices(db, query))
+            new = (summary["total"], summary["total_amount"], summary["total_tax"])
+            same = old[0] == new[0] and abs(old[1] - new[1]) < 0.01 and abs(old[2] - new[2]) < 0.01
+            print(f"  {name:<22} before {old_time * 1000:9.1f} ms   after {new_time * 1000:9.1f} ms   "
+                  f"x{old_time / new_time:5.2f}   rows {new[0]:>8}   {'✅' if same else '❌ totals differ'}")
+    await engine.dispose()
+
+def main():
+    sizes = [int(arg) for arg in sys.argv[1:]] or [100000, 1000000]
+    print("=" * 60)
+    print("INVOICE LIST SUMMARY BENCHMARK (best of %d)" % REPEAT)
+    print("=" * 60)
+    for rows in sizes:
+        with tempfile.TemporaryDirectory() as tmp:
+            path = os.path.join(tmp, "bench.db")
+            print(f"\nℹ Seeding {rows:,} invoices...")
+            started = time.perf_counter()
+            seed(f"sqlite:///{path}", rows)
+            print(f"ℹ Seeded in {time.perf_counter() - started:.1f}s")
+            asyncio.run(run(f"sqlite+aiosqlite:///{path}"))
+    print("\n" + "=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for the list endpoint payloads: per-row cost of building and
+encoding /api/invoices/data and /api/admin/pending-invoices rows.
+  before: display-string rows -> jsonable_encoder -> JSONResponse (json.dumps)
+  after:  raw rows -> FastJSONResponse (orjson), as the endpoints now return them
+Runs on in-memory invoices; no database needed.
+
+Usage: python benchmark_json_payloads.py [rows]   (default: 500, an admin page)
+"""
+
+import random
+import sys
+import time
+from datetime import datetime, timedelta
+from decimal import Decimal
+
+from fastapi.encoders import jsonable_encoder
+from fastapi.responses import JSONResponse
+
+from core.responses import FastJSONResponse
+from models.invoice import Invoice
+from models.vendor import Vendor
+from routers.admin import pending_invoice_item
+from routers.invoices import invoice_list_item
+
+REPEAT = 200
+
+def make_invoices(rows: int) -> list:
+    rng = random.Random(42)
+    vendors = [Vendor(id=v, company_name=f"Vendor {v:03d} Travels", email=f"v{v}@example.com", mobile=f"9{v:09d}") for v in range(1, 51)]
+    invoices = []
+    for i in range(rows):
+        amount = Decimal(rng.randint(1000, 500000)) / 100
+        cgst = (amount * Decimal("0.09")).quantize(Decimal("0.01"))
+        invoices.append(Invoice(
+            id=i + 1,
+            invoice_no=f"INV-{i:08d}",
+            vendor=rng.choice(vendors),
+            amount=amount,
+            taxable_value=amount,
+            tax_amount=Decimal(0),
+            cgst=cgst, sgst=cgst, igst=Decimal(0),
+            effective_tax=cgst * 2,
+            grand_total=amount + cgst * 2,
+            status=rng.choice(["pending", "under_review", "approved"]),
+            invoice_date=datetime(2025, 4, 1) + timedelta(days=rng.randint(0, 300)),
+            created_at=datetime(2025, 4, 1) + timedelta(days=rng.randint(0, 300)),
+            file_path=f"uploads/invoices/ab/cd/{i:064x}.pdf",
+            file_hash=f"{i:064x}",
+            is_handwritten=0,
+            category="Travel",
+        ))
+    return invoices
+
+def timed(fn) -> tuple:
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        body = fn()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, len(body)
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 500
+    invoices = make_invoices(rows)
+    summary = {"total": rows, "total_exact": True, "total_amount": 0.0, "total_tax": 0.0, "total_igst": 0.0}
+
+    def list_before():
+        content = {"items": [invoice_list_item(inv, 1) for inv in invoices], **summary, "page": 1, "limit": rows, "next_cursor": None}
+        return JSONResponse(jsonable_encoder(content)).body
+
+    def list_after():
+        content = {"items": [invoice_list_item(inv, 1, raw=True) for inv in invoices], **summary, "page": 1, "limit": rows, "next_cursor": None}
+        return FastJSONResponse(content).body
+
+    def pending_before():
+        return JSONResponse(jsonable_encoder([pending_invoice_item(inv) for inv in invoices])).body
+
+    def pending_after():
+        return FastJSONResponse([pending_invoice_item(inv, raw=True) for inv in invoices]).body
+
+    print("=" * 60)
+    print(f"LIST PAYLOAD BENCHMARK ({rows} rows, best of {REPEAT})")
+    print("=" * 60)
+    for name, before, after in [("/api/invoices/data", list_before, list_after),
+                                ("/api/admin/pending-invoices", pending_before, pending_after)]:
+        old_time, old_size = timed(before)
+        new_time, new_size = timed(after)
+        print(f"\nℹ {name}")
+        print(f"  before {old_time / rows * 1e6:7.2f} µs/row   {old_size / 1024:7.1f} KB")
+        print(f"  after  {new_time / rows * 1e6:7.2f} µs/row   {new_size / 1024:7.1f} KB   x{old_time / new_time:.2f}")
+    print("\n" + "=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""
+Benchmark for invoice grid search: ILIKE '%term%' scans vs the trigram search index
+(services/search.py), on a throwaway SQLite database seeded like benchmark_invoice_list.py.
+
+Usage: python benchmark_search.py [rows]   (default: 1000000)
+"""
+
+import os
+import sys
+import tempfile
+import time
+
+from sqlalchemy import create_engine, select, func, or_
+
+from benchmark_invoice_list import seed
+from models.invoice import Invoice
+from models.vendor import Vendor
+from services.search import search_index
+
+REPEAT = 5
+
+# (label, parameter, term)
+SEARCHES = [
+    ("invoice no", "search", "INV-0042"),
+    ("invoice no (rare)", "search", "00123456"),
+    ("UTR", "search", "7654321"),
+    ("vendor name", "vendor_search", "Vendor 12"),
+    ("GSTIN", "vendor_search", "E0077F1"),
+    ("PAN", "vendor_search", "abcde0150f"),
+]
+
+def legacy_filter(param: str, term: str):
+    """The filters list_my_invoices used before (invoice_no / company_name only)."""
+    pattern = f"%{term}%"
+    if param == "search":
+        return or_(Invoice.invoice_no.ilike(pattern), Invoice.payment_reference.ilike(pattern))
+    vendor_ids = select(Vendor.id).where(or_(Vendor.company_name.ilike(pattern), Vendor.gstin.ilike(pattern), Vendor.pan.ilike(pattern)))
+    return Invoice.vendor_id.in_(vendor_ids)
+
+def indexed_filter(param: str, term: str):
+    if param == "search":
+        return search_index.invoice_filter("sqlite", term)
+    return search_index.invoice_vendor_filter("sqlite", term)
+
+def timed(conn, where):
+    """Best-of-REPEAT time of what the grid runs: count + first page."""
+    best = None
+    for _ in range(REPEAT):
+        started = time.perf_counter()
+        total = conn.execute(select(func.count(Invoice.id)).where(where)).scalar()
+        conn.execute(select(Invoice.id).where(where).order_by(Invoice.id.desc()).limit(10)).all()
+        elapsed = time.perf_counter() - started
+        best = elapsed if best is None else min(best, elapsed)
+    return best, total
+
+def main():
+    rows = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    print("=" * 60)
+    print(f"INVOICE SEARCH BENCHMARK (best of {REPEAT}, count + first page)")
+    print("=" * 60)
+    with tempfile.TemporaryDirectory() as tmp:
+        url = f"sqlite:///{os.path.join(tmp, 'bench.db')}"
+        print(f"\nℹ Seeding {rows:,} invoices...")
+        seed(url, rows)
+        engine = create_engine(url)
+        started = time.perf_counter()
+        with engine.begin() as conn:
+            if not search_index.install(conn):
+                print("❌ FTS5 trigram tokenizer not available in this SQLite build")
+                return
+        print(f"ℹ Built search index in {time.perf_counter() - started:.1f}s\n")
+        with engine.connect() as conn:
+            for label, param, term in SEARCHES:
+                scan_time, scan_total = timed(conn, legacy_filter(param, term))
+                index_time, index_total = timed(conn, indexed_filter(param, term))
+                print(f"  {label:<18} {term!r:<14} scan {scan_time * 1000:8.1f} ms   index {index_time * 1000:8.1f} ms   "
+                      f"x{scan_time / index_time:6.1f}   rows {index_total:>7}   {'✅' if scan_total == index_total else '❌ results differ'}")
+        engine.dispose()
+    print("\n" + "=" * 60)
+
+if __name__ == "__main__":
+    main()
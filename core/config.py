@@ -8,9 +8,56 @@ class Settings(BaseSettings):
     SECRET_KEY: str = os.getenv("SECRET_KEY", "your-secret-key-for-dev")
     ALGORITHM: str = "HS256"
     ACCESS_TOKEN_EXPIRE_MINUTES: int = 480 # 8 hours
+
+    # Password hashing: bcrypt cost factor and size of the hashing worker pool
+    BCRYPT_ROUNDS: int = 12
+    PASSWORD_HASH_WORKERS: int = 2
+
+    # Largest accepted upload (invoice scans, tax documents)
+    MAX_UPLOAD_MB: int = 50
+
+    # Bulk invoice import (manifest + zip): row limit, archive size, total size of the files
+    # extracted from it, hashing threads, rows per INSERT batch
+    BULK_IMPORT_MAX_ROWS: int = 10000
+    BULK_IMPORT_MAX_MB: int = 2048
+    BULK_IMPORT_MAX_EXTRACTED_MB: int = 4096
+    BULK_IMPORT_WORKERS: int = 4
+    BULK_IMPORT_BATCH_SIZE: int = 1000
+
+    # Resumable uploads: chunk size (offsets are multiples of it), idle lifetime of a
+    # session, and how many unfinished sessions one user may hold
+    UPLOAD_CHUNK_MB: int = 5
+    UPLOAD_SESSION_TTL_HOURS: int = 24
+    UPLOAD_MAX_SESSIONS_PER_USER: int = 10
+
+    # Original-file downloads: browser cache lifetime, and optional proxy offload.
+    # FILE_OFFLOAD = "x-accel-redirect" (nginx) or "x-sendfile" (Apache/lighttpd);
+    # for nginx, FILE_OFFLOAD_PREFIX is an `internal` location aliased to uploads/.
+    FILE_CACHE_MAX_AGE: int = 86400
+    FILE_OFFLOAD: Optional[str] = None
+    FILE_OFFLOAD_PREFIX: str = "/protected/"
+    # Lifetime of signed file URLs (/api/files/<token>)
+    SIGNED_URL_TTL_SECONDS: int = 300
+
+    # Per-request SQL statement budgets: expose X-Query-Count, and fail over-budget requests (tests)
+    QUERY_COUNT_HEADER: bool = False
+    QUERY_BUDGET_STRICT: bool = False
+
+    # Session validation cache (per worker process)
+    SESSION_CACHE_TTL_SECONDS: int = 60
+    SESSION_CACHE_MAX_ENTRIES: int = 2048
+
+    # Near-duplicate file detection on upload (perceptual hash / text MinHash; warns, never blocks)
+    NEAR_DUPLICATES: bool = True
+
+    # In-memory Bloom filter in front of the invoice duplicate checks (per worker process;
+    # turn off when other processes also insert invoices into the same database)
+    DUPLICATE_FILTER: bool = True
     
     # Essential Database URL
     DATABASE_URL: str = os.getenv("DATABASE_URL", f"sqlite:///{(Path(__file__).resolve().parent.parent / 'nvs_portal.db').as_posix()}")
+    # Optional explicit asyncio URL; by default derived from DATABASE_URL (aiosqlite / asyncpg)
+    ASYNC_DATABASE_URL: Optional[str] = None
 
     model_config = {
         "env_file": ".env",
@@ -0,0 +1,102 @@
+"""
+Data-version ETags for polled dashboard and list APIs.
+A counter is bumped after every committed transaction that wrote invoices or vendors.
+Routes declare `dependencies=[Depends(data_etag(<auth dependency>))]`; the weak ETag
+combines the counter with the path, query parameters and user scope, so a request
+whose If-None-Match still matches gets a 304 before any query runs.
+
+The counter lives in this worker's memory (like core.cache): writes made by another
+process are not seen, so only run these routes with a single worker per database.
+Each process starts a new epoch, so tags issued before a restart never match.
+"""
+import hashlib
+import itertools
+import os
+import threading
+import time
+from typing import Callable, Optional
+
+from fastapi import Depends, HTTPException, Request
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+
+# Writes to these tables change what the tagged routes return
+TRACKED_TABLES = {"invoices", "vendors"}
+
+
+class DataVersion:
+    """Monotonic in-process version of the tracked tables."""
+
+    def __init__(self):
+        self.epoch = f"{os.getpid():x}{time.time_ns():x}"
+        self.value = 0
+        self._lock = threading.Lock()
+
+    def bump(self) -> int:
+        with self._lock:
+            self.value += 1
+            return self.value
+
+    def etag(self, *parts) -> str:
+        """Weak ETag for the current version and the given request parts."""
+        raw = "|".join(str(p) for p in (self.epoch, self.value) + parts)
+        return f'W/"{hashlib.sha256(raw.encode()).hexdigest()[:32]}"'
+
+
+data_version = DataVersion()
+
+
+def _tracked(obj) -> bool:
+    return getattr(obj, "__tablename__", None) in TRACKED_TABLES
+
+@event.listens_for(Session, "after_flush")
+def _mark_flushed_changes(session, flush_context):
+    if any(_tracked(obj) for obj in itertools.chain(session.new, session.dirty, session.deleted)):
+        session.info["data_changed"] = True
+
+@event.listens_for(Session, "do_orm_execute")
+def _mark_bulk_changes(orm_execute_state):
+    """update(Invoice)... / delete(Vendor)... bypass the flush."""
+    if orm_execute_state.is_update or orm_execute_state.is_delete or orm_execute_state.is_insert:
+        table = getattr(orm_execute_state.statement, "table", None)
+        if getattr(table, "name", None) in TRACKED_TABLES:
+            orm_execute_state.session.info["data_changed"] = True
+
+def mark_changed(session: Session):
+    """For writes the session does not see (e.g. COPY on the raw connection)."""
+    session.info["data_changed"] = True
+
+@event.listens_for(Session, "after_commit")
+def _bump_after_commit(session):
+    # Only after the commit: a client must never see the new tag with the old data
+    if session.info.pop("data_changed", False):
+        data_version.bump()
+
+@event.listens_for(Session, "after_rollback")
+def _forget_rolled_back(session):
+    session.info.pop("data_changed", None)
+
+
+def _matches(request: Request, etag: str) -> bool:
+    if_none_match = request.headers.get("if-none-match")
+    if not if_none_match:
+        return False
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    return any((t.strip()[2:] if t.strip().startswith("W/") else t.strip()) == opaque for t in if_none_match.split(","))
+
+def data_etag(auth: Callable, extra: Optional[Callable[[], object]] = None):
+    """
+    Route dependency: 304 when the client's copy is current, else tag the response.
+    `auth` is the route's own user dependency (resolved once per request); `extra`
+    adds a value that also invalidates the tag, e.g. the signed-URL window.
+    """
+    async def check_data_etag(request: Request, user=Depends(auth)):
+        query = "&".join(sorted(f"{k}={v}" for k, v in request.query_params.multi_items()))
+        scope = (user.get("id"), user.get("role"), user.get("vendor_id"))
+        etag = data_version.etag(request.url.path, query, *scope, extra() if extra else "")
+        if _matches(request, etag):
+            raise HTTPException(status_code=304, headers={"ETag": etag, "Cache-Control": "private, no-cache"})
+        # Added to the 200 response by main.attach_data_etag
+        request.state.data_etag = etag
+    return check_data_etag
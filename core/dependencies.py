@@ -1,25 +1,71 @@
 from fastapi import Request, HTTPException, Depends
-from models.database import get_db
+from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
+from models.database import SessionLocal, AsyncSessionLocal
 from services.auth import auth_service
 
-async def get_current_user(request: Request):
+def get_db():
+    """
+    Request-scoped unit of work. FastAPI caches this dependency per request, so
+    the auth lookup, the route body and audit logging all share one Session (and
+    at most one pooled connection at a time).
+    """
+    db = SessionLocal()
+    try:
+        yield db
+    finally:
+        db.close()
+
+async def get_async_db():
+    """Same unit of work as get_db, on the asyncio engine, for routes that await their queries."""
+    async with AsyncSessionLocal() as db:
+        yield db
+
+def _read_token(request: Request) -> str:
     token = request.headers.get("Authorization")
     if not token:
         raise HTTPException(status_code=401, detail="Missing Authorization Header")
+    return token
+
+async def get_current_user(request: Request, db: Session = Depends(get_db)):
+    token = _read_token(request)
         
-    session = auth_service.validate_session(token)
+    session = auth_service.validate_session(token, db=db)
     if not session:
         raise HTTPException(status_code=401, detail="Invalid or Expired Session")
+    # Kept for the global error handler so it doesn't re-validate the token
+    request.state.user = session
     return session
 
-async def require_admin(user = Depends(get_current_user)):
-    """Only allow Admin role."""
+async def get_current_user_async(request: Request, db: AsyncSession = Depends(get_async_db)):
+    """get_current_user for routes that use get_async_db, so auth shares their AsyncSession."""
+    token = _read_token(request)
+    
+    session = await auth_service.validate_session_async(token, db)
+    if not session:
+        raise HTTPException(status_code=401, detail="Invalid or Expired Session")
+    request.state.user = session
+    return session
+
+def _check_admin(user: dict):
     if user["role"] not in ["admin", "superadmin", "finance"]:
         # We still allow these role strings if they exist in DB for now, 
         # but logic is consolidated.
         raise HTTPException(status_code=403, detail="Forbidden: Admin access required")
     return user
 
+async def require_admin(user = Depends(get_current_user)):
+    """Only allow Admin role."""
+    return _check_admin(user)
+
+async def require_admin_async(user = Depends(get_current_user_async)):
+    """require_admin for routes on the async engine."""
+    return _check_admin(user)
+
 async def require_user(user = Depends(get_current_user)):
     """Require any authenticated user."""
     return user
+
+async def require_user_async(user = Depends(get_current_user_async)):
+    """require_user for routes on the async engine."""
+    return user
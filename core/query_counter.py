@@ -0,0 +1,52 @@
+"""
+Per-request SQL statement counting, to catch N+1 query regressions.
+Both engines report every statement to the counter of the request being served;
+routes declare their ceiling with `dependencies=[Depends(query_budget(n))]`.
+Over-budget requests are logged, and with QUERY_BUDGET_STRICT (tests) they fail
+with a 500 so the regression cannot go unnoticed.
+"""
+import contextvars
+from contextlib import contextmanager
+
+from fastapi import Request
+from sqlalchemy import event
+
+_current = contextvars.ContextVar("query_counter", default=None)
+
+class QueryCounter:
+    """Statements executed while this counter is active (first `keep` kept for diagnostics)."""
+
+    def __init__(self, keep: int = 50):
+        self.count = 0
+        self.keep = keep
+        self.statements = []
+
+    def record(self, statement: str):
+        self.count += 1
+        if len(self.statements) < self.keep:
+            self.statements.append(statement)
+
+def _count_statement(conn, cursor, statement, parameters, context, executemany):
+    counter = _current.get()
+    if counter is not None:
+        counter.record(statement)
+
+def instrument(engine):
+    """Report `engine`'s statements to the active counter (pass async_engine.sync_engine for asyncio)."""
+    event.listen(engine, "before_cursor_execute", _count_statement)
+
+@contextmanager
+def count_queries():
+    """Count the statements run inside the block, including in threadpool and async DB calls."""
+    counter = QueryCounter()
+    token = _current.set(counter)
+    try:
+        yield counter
+    finally:
+        _current.reset(token)
+
+def query_budget(max_statements: int):
+    """Route dependency declaring the most statements one request may run."""
+    def declare_budget(request: Request):
+        request.state.query_budget = max_statements
+    return declare_budget
@@ -0,0 +1,29 @@
+"""
+JSON responses encoded with orjson.
+FastJSONResponse is the app's default response class. Hot list endpoints return it
+directly with plain str/int/float/None payloads, which also skips FastAPI's
+jsonable_encoder pass over every row.
+"""
+from decimal import Decimal
+from typing import Any
+
+import orjson
+from fastapi.responses import JSONResponse
+
+
+def _default(value: Any):
+    """Types orjson does not encode natively (same result as jsonable_encoder)."""
+    if isinstance(value, Decimal):
+        return int(value) if value == value.to_integral_value() and value.as_tuple().exponent >= 0 else float(value)
+    if isinstance(value, (set, frozenset)):
+        return list(value)
+    if hasattr(value, "model_dump"):
+        return value.model_dump(mode="json")
+    raise TypeError(f"Object of type {type(value).__name__} is not JSON serializable")
+
+
+class FastJSONResponse(JSONResponse):
+    """JSONResponse rendered by orjson: datetimes, dates, UUIDs, enums and Decimals included."""
+
+    def render(self, content: Any) -> bytes:
+        return orjson.dumps(content, default=_default, option=orjson.OPT_NON_STR_KEYS)
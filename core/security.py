@@ -1,10 +1,15 @@
 from datetime import datetime, timedelta
-from typing import Any, Union
+from typing import Any, Optional, Union
+import base64
+import hashlib
+import hmac
+import json
+import time
 from jose import jwt
 from passlib.context import CryptContext
 from core.config import settings
 
-pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
 
 def create_access_token(subject: Union[str, Any], expires_delta: timedelta = None) -> str:
     if expires_delta:
@@ -20,3 +25,42 @@ def verify_password(plain_password: str, hashed_password: str) -> bool:
 
 def get_password_hash(password: str) -> str:
     return pwd_context.hash(password)
+
+def _b64(data: bytes) -> str:
+    return base64.urlsafe_b64encode(data).rstrip(b"=").decode()
+
+def _unb64(data: str) -> bytes:
+    return base64.urlsafe_b64decode(data + "=" * (-len(data) % 4))
+
+def sign_file_token(file_path: str, user_id: int, etag: str, filename: str = None, media_type: str = None, ttl_seconds: int = None) -> str:
+    """
+    HMAC-signed capability for one stored file, minted for one user.
+    The expiry is rounded up to a whole TTL window so the same file gets the same
+    URL for a while and the browser cache can key on it; a token lives ttl..2*ttl.
+    """
+    ttl = ttl_seconds or settings.SIGNED_URL_TTL_SECONDS
+    expires = (file_token_window(ttl) + 2) * ttl
+    payload = {"p": file_path, "u": user_id, "e": expires, "h": etag}
+    if filename: payload["n"] = filename
+    if media_type: payload["t"] = media_type
+    body = _b64(json.dumps(payload, separators=(",", ":")).encode())
+    signature = hmac.new(settings.SECRET_KEY.encode(), body.encode(), hashlib.sha256).digest()
+    return f"{body}.{_b64(signature)}"
+
+def file_token_window(ttl_seconds: int = None) -> int:
+    """Index of the current signing window: tokens minted within it are identical."""
+    return int(time.time()) // (ttl_seconds or settings.SIGNED_URL_TTL_SECONDS)
+
+def verify_file_token(token: str) -> Optional[dict]:
+    """Payload of a valid, unexpired sign_file_token() token, else None. CPU only, no DB."""
+    try:
+        body, signature = token.split(".", 1)
+        expected = hmac.new(settings.SECRET_KEY.encode(), body.encode(), hashlib.sha256).digest()
+        if not hmac.compare_digest(expected, _unb64(signature)):
+            return None
+        payload = json.loads(_unb64(body))
+    except (ValueError, TypeError):
+        return None
+    if payload.get("e", 0) < time.time():
+        return None
+    return payload
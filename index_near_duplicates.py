@@ -0,0 +1,65 @@
+"""
+Fingerprint invoice files that are not in the near-duplicate index yet: everything
+uploaded before the index existed, and bulk imports (which skip it to stay fast).
+Files are indexed oldest first, so each match points at the earlier invoice.
+Safe to re-run at any time; already indexed files are skipped.
+
+Usage: python index_near_duplicates.py [workers]   (default: CPU count)
+"""
+
+import os
+import sys
+from concurrent.futures import ProcessPoolExecutor
+
+from sqlalchemy import func, select
+
+from models.database import SessionLocal, init_db
+from models.fingerprint import FileFingerprint
+from models.invoice import Invoice
+from services.near_duplicates import near_duplicate_service
+
+BATCH = 200
+
+def fingerprint(file_path: str):
+    return near_duplicate_service.fingerprint(file_path) if os.path.isfile(file_path) else None
+
+def main():
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else os.cpu_count()
+    init_db()
+    db = SessionLocal()
+    print("=" * 60)
+    print("INDEXING INVOICE FILES FOR NEAR-DUPLICATES")
+    print("=" * 60)
+    indexed = skipped = matched = 0
+    try:
+        # One row per file: its first invoice
+        files = db.execute(
+            select(Invoice.file_hash, func.min(Invoice.file_path), func.min(Invoice.id).label("first_id"))
+            .where(Invoice.file_hash.isnot(None), Invoice.file_path.isnot(None))
+            .where(Invoice.file_hash.notin_(select(FileFingerprint.file_hash)))
+            .group_by(Invoice.file_hash)
+            .order_by("first_id")
+        ).all()
+        print(f"ℹ {len(files)} file(s) to fingerprint with {workers} worker(s)")
+        with ProcessPoolExecutor(max_workers=workers) as pool:
+            for start in range(0, len(files), BATCH):
+                batch = files[start:start + BATCH]
+                for (file_hash, _, _), fp in zip(batch, pool.map(fingerprint, [path for _, path, _ in batch])):
+                    if fp is None:
+                        skipped += 1
+                        continue
+                    matches = near_duplicate_service.index(db, file_hash, fp)
+                    indexed += 1
+                    matched += bool(matches)
+                db.commit()
+                print(f"  {min(start + BATCH, len(files))}/{len(files)}")
+        print(f"✅ Indexed {indexed} file(s), {matched} with possible duplicates; {skipped} could not be fingerprinted")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Indexing failed: {e}")
+    finally:
+        db.close()
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -6,19 +6,70 @@ from pathlib import Path
 import traceback
 
 from core.config import settings, BASE_DIR
-from core.error_handler import AppException, log_error
+from core.error_handler import AppException, log_error, logger
+from core.query_counter import count_queries
+from core.responses import FastJSONResponse
 
 # Import Routers
-from routers import auth, vendors, invoices, admin, general, reports, monitoring, settings as settings_router, tax_documents
+from routers import auth, vendors, invoices, admin, general, reports, monitoring, settings as settings_router, tax_documents, uploads, files
 
 from core.dependencies import get_db
-from models.database import init_db
+from models.database import init_db, AsyncSessionLocal, SessionLocal
+from services.uploads import resumable_upload_service
+from services.storage import storage_service
+from services.validation import validation_service
+import asyncio
 
-app = FastAPI(title=settings.PROJECT_NAME)
+# orjson for every JSON response (routes returning dicts still go through jsonable_encoder)
+app = FastAPI(title=settings.PROJECT_NAME, default_response_class=FastJSONResponse)
+
+async def purge_expired_uploads():
+    """Background sweep for abandoned resumable upload sessions and unreferenced blobs."""
+    while True:
+        try:
+            async with AsyncSessionLocal() as db:
+                await resumable_upload_service.purge_expired(db)
+                await storage_service.purge_orphans(db)
+        except Exception as e:
+            log_error(e, "purge_expired_uploads")
+        await asyncio.sleep(3600)
 
 @app.on_event("startup")
 async def startup_event():
     init_db()
+    with SessionLocal() as db:
+        validation_service.warm_up(db)
+    app.state.upload_purge_task = asyncio.create_task(purge_expired_uploads())
+
+@app.middleware("http")
+async def enforce_query_budget(request: Request, call_next):
+    """Count each request's SQL statements and check them against the route's query_budget()."""
+    with count_queries() as counter:
+        response = await call_next(request)
+    budget = getattr(request.state, "query_budget", None)
+    if budget is not None and counter.count > budget:
+        logger.warning(f"Query budget exceeded on {request.method} {request.url.path}: {counter.count} > {budget} statements")
+        if settings.QUERY_BUDGET_STRICT:
+            return JSONResponse(status_code=500, content={
+                "success": False,
+                "error_code": "QUERY_BUDGET_EXCEEDED",
+                "message": f"{counter.count} SQL statements, budget is {budget}",
+                "statements": counter.statements
+            })
+    if settings.QUERY_COUNT_HEADER:
+        response.headers["X-Query-Count"] = str(counter.count)
+    return response
+
+@app.middleware("http")
+async def attach_data_etag(request: Request, call_next):
+    """ETag of a data_etag() route, on its 200 response (routes may return their own Response)."""
+    response = await call_next(request)
+    etag = getattr(request.state, "data_etag", None)
+    if etag and response.status_code == 200:
+        response.headers["ETag"] = etag
+        # Revalidate every time: the browser sends If-None-Match and reuses its copy on 304
+        response.headers["Cache-Control"] = "private, no-cache"
+    return response
 
 # CORS Middleware
 from fastapi.middleware.cors import CORSMiddleware
@@ -43,6 +94,8 @@ app.include_router(reports.router)
 app.include_router(monitoring.router)
 app.include_router(settings_router.router)
 app.include_router(tax_documents.router)
+app.include_router(uploads.router)
+app.include_router(files.router)
 
 # Exception Handlers
 @app.exception_handler(AppException)
@@ -74,17 +127,10 @@ async def global_exception_handler(request: Request, exc: Exception):
     try:
         from models.database import SessionLocal
         from models.error_log import ErrorLog
-        from core.dependencies import get_current_user
-        
-        db = SessionLocal()
         
-        # Try to get user context if possible
-        user_id = None
-        try:
-            user = await get_current_user(request)
-            user_id = user.get("id")
-        except:
-            pass
+        # User context was stored by get_current_user if auth ran
+        user = getattr(request.state, "user", None) or {}
+        user_id = user.get("id")
             
         error_entry = ErrorLog(
             error_message=str(exc),
@@ -93,9 +139,14 @@ async def global_exception_handler(request: Request, exc: Exception):
             method=request.method,
             user_id=user_id
         )
-        db.add(error_entry)
-        db.commit()
-        db.close()
+        
+        # A Session of its own: the request's get_db / get_async_db Session is already closed here
+        db = SessionLocal()
+        try:
+            db.add(error_entry)
+            db.commit()
+        finally:
+            db.close()
     except Exception as e:
         print(f"FAILED TO LOG TO ERROR_LOG: {e}")
 
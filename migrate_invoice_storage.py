@@ -0,0 +1,66 @@
+"""
+Move invoice files from the flat uploads/invoices/<uuid>.<ext> layout into the
+content-addressed store (uploads/invoices/ab/cd/<sha256>.<ext>) and record a
+StoredFile row with a reference count for each blob.
+Safe to re-run: invoices already pointing into the store are skipped.
+"""
+
+import hashlib
+import os
+
+from models.database import SessionLocal, init_db
+from models.invoice import Invoice
+from models.stored_file import StoredFile
+from services.storage import storage_service, CHUNK_SIZE
+
+def file_sha256(path: str) -> str:
+    hasher = hashlib.sha256()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(CHUNK_SIZE), b""):
+            hasher.update(chunk)
+    return hasher.hexdigest()
+
+def migrate_invoice_storage():
+    init_db()
+    db = SessionLocal()
+    moved = skipped = missing = 0
+    try:
+        for inv in db.query(Invoice).filter(Invoice.file_path.isnot(None)).all():
+            if not os.path.exists(inv.file_path):
+                missing += 1
+                continue
+            file_hash = file_sha256(inv.file_path)
+            ext = inv.file_path.rsplit(".", 1)[-1].lower()
+            target = storage_service.blob_path(file_hash, ext)
+            if os.path.normpath(inv.file_path) == os.path.normpath(target):
+                skipped += 1
+                continue
+
+            blob = db.get(StoredFile, file_hash)
+            if not blob:
+                blob = StoredFile(file_hash=file_hash, file_path=target, size=os.path.getsize(inv.file_path), ref_count=0)
+                db.add(blob)
+            if os.path.exists(blob.file_path):
+                os.remove(inv.file_path)
+            else:
+                os.makedirs(os.path.dirname(blob.file_path), exist_ok=True)
+                os.replace(inv.file_path, blob.file_path)
+
+            blob.ref_count = (blob.ref_count or 0) + 1
+            inv.file_path = blob.file_path
+            inv.file_hash = inv.file_hash or file_hash
+            db.commit()
+            moved += 1
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Migration stopped: {e}")
+    finally:
+        db.close()
+    print(f"✅ Moved {moved} file(s) into the store, {skipped} already migrated, {missing} missing on disk")
+
+if __name__ == "__main__":
+    print("=" * 60)
+    print("Migrating Invoice Files to Content-Addressed Storage")
+    print("=" * 60)
+    migrate_invoice_storage()
+    print("=" * 60)
@@ -0,0 +1,25 @@
+"""
+Add and backfill the stored Invoice.effective_tax / grand_total columns.
+init_db() adds them automatically on first start; run this to (re)compute the
+values for every invoice, e.g. after editing amounts directly in the database.
+Safe to re-run.
+"""
+
+from models.database import engine, init_db
+from models.invoice import backfill_invoice_totals
+
+def migrate_invoice_totals():
+    init_db()  # adds the columns and indexes if missing
+    print("=" * 60)
+    print("BACKFILLING INVOICE TOTALS")
+    print("=" * 60)
+    try:
+        with engine.begin() as connection:
+            rows = backfill_invoice_totals(connection)
+        print(f"✅ Recomputed effective_tax / grand_total for {rows} invoice(s)")
+    except Exception as e:
+        print(f"❌ Backfill failed: {e}")
+    print("=" * 60)
+
+if __name__ == "__main__":
+    migrate_invoice_totals()
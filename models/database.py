@@ -1,4 +1,7 @@
+import os
+
 from sqlalchemy import create_engine
+from sqlalchemy.ext.asyncio import create_async_engine, async_sessionmaker
 from sqlalchemy.orm import declarative_base, sessionmaker
 from core.config import settings
 
@@ -24,22 +27,68 @@ if is_sqlite:
         cursor.execute("PRAGMA synchronous=NORMAL")
         cursor.close()
 
+# Per-request statement counting (N+1 guard), see core/query_counter.py
+from core.query_counter import instrument
+instrument(engine)
+
 # Session factory
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
 
+def _to_async_url(url: str) -> str:
+    """Pick the asyncio driver for the configured database (aiosqlite / asyncpg)."""
+    if url.startswith("sqlite:"):
+        return url.replace("sqlite:", "sqlite+aiosqlite:", 1)
+    if url.startswith("postgresql+psycopg2:"):
+        return url.replace("postgresql+psycopg2:", "postgresql+asyncpg:", 1)
+    if url.startswith("postgresql:"):
+        return url.replace("postgresql:", "postgresql+asyncpg:", 1)
+    return url
+
+# Async engine for the hot routes, derived from DATABASE_URL unless overridden
+ASYNC_DATABASE_URL = settings.ASYNC_DATABASE_URL or _to_async_url(DATABASE_URL)
+async_engine = create_async_engine(ASYNC_DATABASE_URL)
+
+if is_sqlite:
+    event.listen(async_engine.sync_engine, "connect", set_sqlite_pragma)
+
+# expire_on_commit=False: attributes stay readable after commit without a lazy (blocking) reload
+instrument(async_engine.sync_engine)
+AsyncSessionLocal = async_sessionmaker(async_engine, autoflush=False, expire_on_commit=False)
+
 # Base class for models
 Base = declarative_base()
 
-def get_db():
-    """Dependency for getting database sessions."""
-    db = SessionLocal()
-    try:
-        yield db
-    finally:
-        db.close()
+# Revision every database created by create_all() (before migrations existed) matches
+BASELINE_REVISION = "0001"
+
+def run_migrations(revision: str = "head"):
+    """
+    Upgrade the schema with the alembic revisions in alembic/versions.
+    A database built by create_all() before migrations existed is first completed to the
+    baseline schema and stamped, so only the later revisions run against it.
+    """
+    from alembic import command
+    from alembic.config import Config
+    from sqlalchemy import inspect
+
+    config = Config(os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "alembic.ini"))
+    config.attributes["configure_logger"] = False  # keep the app's logging setup
+    with engine.connect() as connection:
+        config.attributes["connection"] = connection
+        tables = set(inspect(connection).get_table_names())
+        if tables and "alembic_version" not in tables:
+            from models.invoice import ensure_invoice_totals
+            Base.metadata.create_all(bind=connection)
+            # Stored effective_tax / grand_total on databases created before those columns
+            ensure_invoice_totals(connection)
+            connection.commit()
+            command.stamp(config, BASELINE_REVISION)
+        # Leave no transaction open, so alembic manages its own (and can leave it for CONCURRENTLY)
+        connection.commit()
+        command.upgrade(config, revision)
 
 def init_db():
-    """Initialize database tables."""
+    """Initialize database tables (alembic migrations), search index and rollups."""
     from models.user import User
     from models.vendor import Vendor
     from models.invoice import Invoice
@@ -48,4 +97,21 @@ def init_db():
     from models.error_log import ErrorLog
     from models.message import Message
     from models.system_setting import SystemSetting
-    Base.metadata.create_all(bind=engine)
+    from models.stored_file import StoredFile
+    from models.upload_session import UploadSession
+    from models.tax_document import VendorTaxDocument
+    from models.fingerprint import FileFingerprint, FingerprintBand, NearDuplicateMatch
+    from models.invoice_rollup import InvoiceRollup, rebuild_invoice_rollups
+    run_migrations()
+
+    # Trigram search index (FTS5 / pg_trgm); created once, then kept in sync by the database
+    from services.search import search_index
+    with engine.begin() as connection:
+        search_index.install(connection)
+
+    # First start with the rollup table: fill it from the existing invoices
+    from sqlalchemy import select
+    with SessionLocal() as db:
+        if db.scalar(select(InvoiceRollup.vendor_id).limit(1)) is None and db.scalar(select(Invoice.id).limit(1)) is not None:
+            rebuild_invoice_rollups(db)
+            db.commit()
@@ -0,0 +1,42 @@
+from sqlalchemy import Column, Integer, BigInteger, String, DateTime, Float, LargeBinary
+from sqlalchemy.sql import func
+from models.database import Base
+
+class FileFingerprint(Base):
+    """Similarity signature of a stored file (services/near_duplicates.py), one per content hash."""
+    __tablename__ = "file_fingerprints"
+
+    file_hash = Column(String(64), primary_key=True) # SHA-256 of the file, as on Invoice/StoredFile
+    kind = Column(String(10), nullable=False) # image (perceptual hash) | text (MinHash of word shingles)
+    signature = Column(LargeBinary, nullable=False)
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<FileFingerprint {self.file_hash[:12]} {self.kind}>"
+
+class FingerprintBand(Base):
+    """
+    Locality-sensitive hash index: one row per (band bucket, file). Similar files share
+    at least one bucket, so candidates come from an index lookup instead of a scan.
+    """
+    __tablename__ = "fingerprint_bands"
+
+    band_key = Column(BigInteger, primary_key=True, autoincrement=False) # kind | band number | bucket value
+    file_hash = Column(String(64), primary_key=True)
+
+    def __repr__(self):
+        return f"<FingerprintBand {self.band_key:x} {self.file_hash[:12]}>"
+
+class NearDuplicateMatch(Base):
+    """A file found similar to an earlier one when it was indexed (admin "possible duplicates" report)."""
+    __tablename__ = "near_duplicate_matches"
+
+    id = Column(Integer, primary_key=True, index=True)
+    file_hash = Column(String(64), nullable=False, index=True) # The file being indexed
+    match_hash = Column(String(64), nullable=False, index=True) # The earlier, similar file
+    kind = Column(String(10), nullable=False)
+    similarity = Column(Float, nullable=False) # 0..1
+    detected_at = Column(DateTime, default=func.now(), index=True)
+
+    def __repr__(self):
+        return f"<NearDuplicateMatch {self.file_hash[:12]} ~ {self.match_hash[:12]} {self.similarity:.2f}>"
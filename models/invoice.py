@@ -1,8 +1,9 @@
-from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Text, Boolean, Numeric, Enum
+from sqlalchemy import Column, Integer, String, DateTime, Float, ForeignKey, Text, Boolean, Numeric, Enum, Index, event, inspect, text, update
 from sqlalchemy.orm import relationship
-from sqlalchemy.sql import func
+from sqlalchemy.sql import func, case
 from models.database import Base
 import enum
+from decimal import Decimal
 
 
 class InvoiceStatus(str, enum.Enum):
@@ -22,6 +23,13 @@ class DocumentType(str, enum.Enum):
 
 class Invoice(Base):
     __tablename__ = "invoices"
+    __table_args__ = (
+        # Vendor-scoped lookups; the leading vendor_id also serves every "WHERE vendor_id = ?"
+        Index("ix_invoices_vendor_invoice_no", "vendor_id", "invoice_no"),
+        Index("ix_invoices_vendor_amount_date", "vendor_id", "amount", "invoice_date"),
+        # Admin listings: status filter, newest first
+        Index("ix_invoices_status_created_at", "status", "created_at"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     invoice_no = Column(String(50), unique=True, index=True, nullable=False)
@@ -31,7 +39,7 @@ class Invoice(Base):
     tax_amount = Column(Numeric(10, 2), default=0)
     description = Column(Text)
     category = Column(String(100)) # e.g., 'Travel', 'Software', 'Hardware'
-    invoice_date = Column(DateTime)
+    invoice_date = Column(DateTime, index=True) # FY / date-range filters
     file_path = Column(String(500))
     status = Column(String(50), default=InvoiceStatus.PENDING.value, index=True)
     rejection_reason = Column(Text)
@@ -49,6 +57,10 @@ class Invoice(Base):
     cgst = Column(Numeric(10, 2), default=0)
     sgst = Column(Numeric(10, 2), default=0)
     igst = Column(Numeric(10, 2), default=0)
+    # Derived on every flush (see set_invoice_totals): tax_amount, else cgst + sgst + igst;
+    # grand_total = amount + effective_tax. Stored so totals and sorting read indexed columns.
+    effective_tax = Column(Numeric(12, 2), nullable=False, default=0, server_default="0", index=True)
+    grand_total = Column(Numeric(12, 2), nullable=False, default=0, server_default="0", index=True)
     
     line_items_json = Column(Text, nullable=True)
     
@@ -72,5 +84,53 @@ class Invoice(Base):
     def __repr__(self):
         return f"<Invoice {self.invoice_no}>"
 
+def effective_tax(tax_amount, cgst, sgst, igst) -> Decimal:
+    """Tax as lists and dashboards show it: tax_amount, or the GST components when tax_amount is 0."""
+    tax = Decimal(str(tax_amount or 0))
+    if tax == 0:
+        tax = Decimal(str(cgst or 0)) + Decimal(str(sgst or 0)) + Decimal(str(igst or 0))
+    return tax
+
+@event.listens_for(Invoice, "before_insert")
+@event.listens_for(Invoice, "before_update")
+def set_invoice_totals(mapper, connection, target):
+    target.effective_tax = effective_tax(target.tax_amount, target.cgst, target.sgst, target.igst).quantize(Decimal("0.01"))
+    target.grand_total = (Decimal(str(target.amount or 0)) + target.effective_tax).quantize(Decimal("0.01"))
+
+# The same rule in SQL, for backfills; queries read Invoice.effective_tax instead
+EFFECTIVE_TAX_SQL = func.coalesce(Invoice.tax_amount, 0) + case(
+    (func.coalesce(Invoice.tax_amount, 0) == 0,
+     func.coalesce(Invoice.cgst, 0) + func.coalesce(Invoice.sgst, 0) + func.coalesce(Invoice.igst, 0)),
+    else_=0
+)
+INVOICE_TAX = Invoice.effective_tax
+
+def ensure_invoice_totals(connection) -> bool:
+    """
+    Add effective_tax / grand_total to an invoices table created before they existed,
+    index and backfill them. Returns True if the columns were added.
+    """
+    columns = {c["name"] for c in inspect(connection).get_columns("invoices")}
+    missing = [name for name in ("effective_tax", "grand_total") if name not in columns]
+    if not missing:
+        return False
+    for name in missing:
+        connection.execute(text(f"ALTER TABLE invoices ADD COLUMN {name} NUMERIC(12, 2) NOT NULL DEFAULT 0"))
+    for index in Invoice.__table__.indexes:
+        if {c.name for c in index.columns} & set(missing):
+            index.create(connection, checkfirst=True)
+    backfill_invoice_totals(connection)
+    return True
+
+def backfill_invoice_totals(connection) -> int:
+    """Recompute effective_tax / grand_total for every invoice in SQL. Returns rows updated."""
+    table = Invoice.__table__
+    return connection.execute(update(table).values(
+        effective_tax=EFFECTIVE_TAX_SQL,
+        grand_total=func.coalesce(table.c.amount, 0) + EFFECTIVE_TAX_SQL
+    )).rowcount
+
 # Prevent circular imports but ensure AuditLog is known to the mapper
 import models.audit
+# Keeps invoice_rollups in step with every flush that touches invoices
+import models.invoice_rollup
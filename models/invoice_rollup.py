@@ -0,0 +1,163 @@
+from decimal import Decimal
+import enum
+
+from sqlalchemy import Column, Integer, String, Numeric, event, insert, update, delete, select, func
+from sqlalchemy.orm import Session, attributes
+from models.database import Base
+from models.invoice import Invoice, INVOICE_TAX, effective_tax
+
+class InvoiceRollup(Base):
+    """
+    Running totals of invoices per (vendor, status, document type), so dashboard stats
+    read a handful of rows instead of scanning invoices. Maintained by the flush hook
+    below in the same transaction as the invoice change; rebuild_invoice_rollups.py
+    recomputes it from scratch.
+    """
+    __tablename__ = "invoice_rollups"
+
+    vendor_id = Column(Integer, primary_key=True)
+    status = Column(String(50), primary_key=True) # "" for invoices without a status
+    document_type = Column(String(20), primary_key=True)
+    invoice_count = Column(Integer, default=0, nullable=False)
+    base_amount = Column(Numeric(16, 2), default=0, nullable=False)
+    tax_amount = Column(Numeric(16, 2), default=0, nullable=False) # Sum of Invoice.effective_tax
+    igst_amount = Column(Numeric(16, 2), default=0, nullable=False)
+
+    def __repr__(self):
+        return f"<InvoiceRollup vendor={self.vendor_id} {self.status}/{self.document_type} n={self.invoice_count}>"
+
+# Invoice attributes that decide an invoice's bucket or its contribution to it
+ROLLUP_FIELDS = ("vendor_id", "status", "document_type", "amount", "tax_amount", "cgst", "sgst", "igst")
+
+def _load_old_value(target, value, oldvalue, initiator):
+    pass
+
+# Load the old value when one of these is assigned, so the flush hook can subtract it
+for _field in ROLLUP_FIELDS:
+    event.listen(getattr(Invoice, _field), "set", _load_old_value, active_history=True)
+
+def _plain(value):
+    return value.value if isinstance(value, enum.Enum) else value
+
+def _money(value) -> Decimal:
+    return Decimal(str(value or 0))
+
+def _contribution(values: dict):
+    """((vendor_id, status, document_type), [count, base, tax, igst]) for one invoice state."""
+    tax = effective_tax(values["tax_amount"], values["cgst"], values["sgst"], values["igst"])
+    key = (values["vendor_id"], _plain(values["status"]) or "", _plain(values["document_type"]) or "")
+    return key, [1, _money(values["amount"]), tax, _money(values["igst"])]
+
+def _column_default(field: str):
+    """The value an INSERT stores for an Invoice field left unset (scalar Python defaults only)."""
+    default = Invoice.__table__.c[field].default
+    return default.arg if default is not None and default.is_scalar else None
+
+def _snapshot(invoice: Invoice, before: bool, inserted: bool = False) -> dict:
+    """
+    Rollup fields of `invoice` as of the last flush (before=True) or as being flushed now.
+    For an `inserted` invoice, unset fields take their column default, as the row did.
+    """
+    values = {}
+    for field in ROLLUP_FIELDS:
+        history = attributes.get_history(invoice, field, passive=attributes.PASSIVE_NO_INITIALIZE)
+        if before:
+            current = history.deleted or history.unchanged
+        else:
+            current = history.added or history.unchanged
+        values[field] = current[0] if current else None
+        if inserted and values[field] is None:
+            values[field] = _column_default(field)
+    return values
+
+def _add(deltas: dict, values: dict, sign: int):
+    key, amounts = _contribution(values)
+    if key[0] is None:
+        return
+    total = deltas.setdefault(key, [0, Decimal(0), Decimal(0), Decimal(0)])
+    for i, amount in enumerate(amounts):
+        total[i] += sign * amount
+
+def _apply(connection, key, delta):
+    vendor_id, status, document_type = key
+    values = dict(
+        vendor_id=vendor_id, status=status, document_type=document_type,
+        invoice_count=delta[0], base_amount=delta[1], tax_amount=delta[2], igst_amount=delta[3]
+    )
+    increments = dict(
+        invoice_count=InvoiceRollup.invoice_count + delta[0],
+        base_amount=InvoiceRollup.base_amount + delta[1],
+        tax_amount=InvoiceRollup.tax_amount + delta[2],
+        igst_amount=InvoiceRollup.igst_amount + delta[3]
+    )
+    # Relative updates, so concurrent transactions add up instead of overwriting each other
+    dialect = connection.dialect.name
+    if dialect in ("sqlite", "postgresql"):
+        if dialect == "sqlite":
+            from sqlalchemy.dialects.sqlite import insert as upsert
+        else:
+            from sqlalchemy.dialects.postgresql import insert as upsert
+        connection.execute(upsert(InvoiceRollup).values(**values).on_conflict_do_update(
+            index_elements=["vendor_id", "status", "document_type"], set_=increments
+        ))
+        return
+
+    result = connection.execute(update(InvoiceRollup).where(
+        (InvoiceRollup.vendor_id == vendor_id)
+        & (InvoiceRollup.status == status)
+        & (InvoiceRollup.document_type == document_type)
+    ).values(**increments))
+    if result.rowcount == 0:
+        connection.execute(insert(InvoiceRollup).values(**values))
+
+@event.listens_for(Session, "after_flush")
+def track_invoice_rollups(session, flush_context):
+    """Fold the invoices written by this flush into invoice_rollups, in the same transaction."""
+    deltas = {}
+    for obj in session.new:
+        if isinstance(obj, Invoice):
+            _add(deltas, _snapshot(obj, before=False, inserted=True), +1)
+    for obj in session.dirty:
+        if isinstance(obj, Invoice):
+            before, after = _snapshot(obj, before=True), _snapshot(obj, before=False)
+            if before != after:
+                _add(deltas, before, -1)
+                _add(deltas, after, +1)
+    for obj in session.deleted:
+        if isinstance(obj, Invoice):
+            _add(deltas, _snapshot(obj, before=True), -1)
+
+    changed = {key: delta for key, delta in deltas.items() if any(delta)}
+    if changed:
+        connection = session.connection()
+        for key, delta in sorted(changed.items()):
+            _apply(connection, key, delta)
+
+def add_to_invoice_rollups(connection, rows: list):
+    """Fold invoices inserted without a flush (bulk imports) into invoice_rollups. `rows` hold ROLLUP_FIELDS."""
+    deltas = {}
+    for values in rows:
+        _add(deltas, values, +1)
+    for key, delta in sorted(deltas.items()):
+        if any(delta):
+            _apply(connection, key, delta)
+
+def rebuild_invoice_rollups(session: Session) -> int:
+    """Recompute every rollup row from the invoices table. Returns the number of rows written."""
+    session.execute(delete(InvoiceRollup))
+    grouped = select(
+        Invoice.vendor_id,
+        func.coalesce(Invoice.status, ""),
+        func.coalesce(Invoice.document_type, ""),
+        func.count(Invoice.id),
+        func.coalesce(func.sum(Invoice.amount), 0),
+        func.coalesce(func.sum(INVOICE_TAX), 0),
+        func.coalesce(func.sum(func.coalesce(Invoice.igst, 0)), 0)
+    ).where(Invoice.vendor_id.isnot(None)).group_by(
+        Invoice.vendor_id, func.coalesce(Invoice.status, ""), func.coalesce(Invoice.document_type, "")
+    )
+    session.execute(insert(InvoiceRollup).from_select(
+        ["vendor_id", "status", "document_type", "invoice_count", "base_amount", "tax_amount", "igst_amount"],
+        grouped
+    ))
+    return session.scalar(select(func.count()).select_from(InvoiceRollup))
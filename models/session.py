@@ -11,7 +11,7 @@ class Session(Base):
     token = Column(String(100), unique=True, index=True, nullable=False)
     user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
     vendor_id = Column(Integer, nullable=True)  # Populated for vendor role users
-    expires_at = Column(DateTime, nullable=False)
+    expires_at = Column(DateTime, nullable=False, index=True)
     created_at = Column(DateTime, default=datetime.utcnow)
     
     # Relationship to User
@@ -0,0 +1,29 @@
+from sqlalchemy import Column, Integer, String, DateTime, case, event, update
+from sqlalchemy.orm import Session
+from sqlalchemy.sql import func
+from models.database import Base
+from models.invoice import Invoice
+
+class StoredFile(Base):
+    """A content-addressed blob in the upload store, shared by every invoice that references it."""
+    __tablename__ = "stored_files"
+    
+    file_hash = Column(String(64), primary_key=True) # SHA-256, also the blob's name on disk
+    file_path = Column(String(500), nullable=False)
+    size = Column(Integer, default=0)
+    ref_count = Column(Integer, default=0, nullable=False) # Invoices pointing at this blob
+    created_at = Column(DateTime, default=func.now())
+
+    def __repr__(self):
+        return f"<StoredFile {self.file_hash[:12]} refs={self.ref_count}>"
+
+@event.listens_for(Session, "after_flush")
+def release_deleted_invoice_blobs(session, flush_context):
+    """Drop the blob reference of invoices deleted by this flush; StorageService.purge_orphans() removes the file."""
+    hashes = [obj.file_hash for obj in session.deleted if isinstance(obj, Invoice) and obj.file_hash]
+    if hashes:
+        connection = session.connection()
+        for file_hash in hashes:
+            connection.execute(update(StoredFile).where(StoredFile.file_hash == file_hash).values(
+                ref_count=case((StoredFile.ref_count > 0, StoredFile.ref_count - 1), else_=0)
+            ))
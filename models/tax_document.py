@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Enum, Text, Index
 from sqlalchemy.orm import relationship
 from sqlalchemy.sql import func
 from models.database import Base
@@ -12,6 +12,9 @@ class TaxQuarter(str, enum.Enum):
 
 class VendorTaxDocument(Base):
     __tablename__ = "vendor_tax_documents"
+    __table_args__ = (
+        Index("ix_vendor_tax_documents_vendor_created", "vendor_id", "created_at"),
+    )
 
     id = Column(Integer, primary_key=True, index=True)
     vendor_id = Column(Integer, ForeignKey("vendors.id"), nullable=False)
@@ -0,0 +1,19 @@
+from sqlalchemy import Column, Integer, String, DateTime, BigInteger, ForeignKey
+from sqlalchemy.sql import func
+from models.database import Base
+
+class UploadSession(Base):
+    """A resumable upload in progress. Received chunks live on disk under uploads/partial/<id>/."""
+    __tablename__ = "upload_sessions"
+    
+    id = Column(String(32), primary_key=True) # uuid4 hex, also the chunk directory name
+    user_id = Column(Integer, ForeignKey("users.id"), nullable=False)
+    purpose = Column(String(20), nullable=False) # invoice, tax_doc
+    filename = Column(String(255), nullable=False)
+    size = Column(BigInteger, nullable=False) # Declared total size in bytes
+    file_hash = Column(String(64), nullable=True) # Expected SHA-256, verified on finalize if given
+    created_at = Column(DateTime, default=func.now())
+    expires_at = Column(DateTime, nullable=False, index=True) # Pushed forward on every chunk
+
+    def __repr__(self):
+        return f"<UploadSession {self.id} {self.purpose} {self.size}B>"
@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, Numeric
+from sqlalchemy import Column, Integer, String, DateTime, Text, Float, Boolean, Numeric, Index
 from sqlalchemy.sql import func
 from sqlalchemy.orm import relationship
 from models.database import Base
@@ -14,6 +14,12 @@ class VendorStatus(str, enum.Enum):
 
 class Vendor(Base):
     __tablename__ = "vendors"
+    __table_args__ = (
+        # Vendor directory: company-name order, alone or under a status / KYC filter
+        Index("ix_vendors_company_name", "company_name", "id"),
+        Index("ix_vendors_status_company_name", "status", "company_name", "id"),
+        Index("ix_vendors_kyc_verified_company_name", "kyc_verified", "company_name", "id"),
+    )
     
     id = Column(Integer, primary_key=True, index=True)
     company_name = Column(String(255), nullable=False)
@@ -14,6 +14,10 @@ import models.error_log
 import models.message
 import models.system_setting
 import models.tax_document
+import models.stored_file
+import models.upload_session
+import models.invoice_rollup
+import models.fingerprint
 
 from passlib.context import CryptContext
 
@@ -0,0 +1,28 @@
+"""
+Recompute the invoice_rollups table (dashboard stats) from the invoices table.
+Run after restoring a backup, editing invoices outside the app, or if the
+rollup ever drifts. Safe to re-run at any time.
+"""
+
+from models.database import SessionLocal, init_db
+from models.invoice_rollup import rebuild_invoice_rollups
+
+def main():
+    init_db()
+    db = SessionLocal()
+    print("=" * 60)
+    print("REBUILDING INVOICE ROLLUPS")
+    print("=" * 60)
+    try:
+        rows = rebuild_invoice_rollups(db)
+        db.commit()
+        print(f"✅ Rebuilt {rows} rollup row(s)")
+    except Exception as e:
+        db.rollback()
+        print(f"❌ Rebuild failed: {e}")
+    finally:
+        db.close()
+    print("=" * 60)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,28 @@
+"""
+Rebuild the invoice/vendor search index (FTS5 tables on SQLite, pg_trgm indexes on PostgreSQL).
+The index is normally maintained by the database itself; run this after a restore
+or bulk edits made with triggers disabled. Safe to re-run at any time.
+"""
+
+from models.database import engine, init_db
+from services.search import search_index
+
+def main():
+    init_db()
+    print("=" * 60)
+    print("REBUILDING SEARCH INDEX")
+    print("=" * 60)
+    try:
+        with engine.begin() as connection:
+            if not search_index.install(connection):
+                print(f"ℹ No search index for {connection.dialect.name}; searches use ILIKE scans")
+                return
+            search_index.rebuild(connection)
+        print("✅ Search index rebuilt")
+    except Exception as e:
+        print(f"❌ Rebuild failed: {e}")
+    finally:
+        print("=" * 60)
+
+if __name__ == "__main__":
+    main()
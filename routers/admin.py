@@ -1,19 +1,28 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, Body
-from fastapi.responses import HTMLResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func, case
-from typing import List
+from fastapi.responses import HTMLResponse, StreamingResponse
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, or_, select
+from typing import List, Optional
+import orjson
 
 from core.config import TEMPLATES
-from core.dependencies import get_db, require_admin, require_user
-from core.security import get_password_hash
+from core.dependencies import get_db, get_async_db, require_admin, require_admin_async, require_user
+from core.query_counter import query_budget
+from core.responses import FastJSONResponse
+from core.data_version import data_etag
+from models.database import AsyncSessionLocal
 from models.vendor import Vendor, VendorStatus
 from models.invoice import Invoice, InvoiceStatus
+from models.invoice_rollup import InvoiceRollup
 from models.user import User
 from schemas.vendor import VendorCreate
 from services.audit import audit_service, AuditAction
+from services.auth import auth_service
 from services.workflow import workflow_service
 from services.notification import notification_service
+from services.near_duplicates import near_duplicate_service
+from services.search import search_index
 
 router = APIRouter(tags=["admin"])
 
@@ -27,26 +36,98 @@ async def admin_vendors_page(request: Request):
     return TEMPLATES.TemplateResponse("admin_vendors.html", {"request": request})
 
 # --- API ---
-@router.get("/api/admin/vendors")
-async def get_vendors(db: Session = Depends(get_db), admin = Depends(require_admin)):
-    vendors = db.query(Vendor).all()
-    # Map to list
-    return [{
-        "id": v.id,
-        "company_name": v.company_name,
-        "vendor_code": f"V-{v.id:04d}",
-        "contact_person": v.contact_person,
-        "email": v.email,
-        "mobile": v.mobile,
-        "status": (v.status.strip().lower() if v.status else "pending"),
-        "kyc_verified": v.kyc_verified,
-        "entity_type": v.entity_type or "Company",
-        "pan": v.pan,
-        "gstin": v.gstin,
-        "bank_name": v.bank_name,
-        "bank_account_no": v.bank_account_no,
-        "remarks": v.remarks
-    } for v in vendors]
+# Directory field -> column it is read from (vendor_code is derived from the id)
+VENDOR_FIELDS = {
+    "id": Vendor.id,
+    "company_name": Vendor.company_name,
+    "vendor_code": Vendor.id,
+    "contact_person": Vendor.contact_person,
+    "email": Vendor.email,
+    "mobile": Vendor.mobile,
+    "status": Vendor.status,
+    "kyc_verified": Vendor.kyc_verified,
+    "entity_type": Vendor.entity_type,
+    "pan": Vendor.pan,
+    "gstin": Vendor.gstin,
+    "bank_name": Vendor.bank_name,
+    "bank_account_no": Vendor.bank_account_no,
+    "remarks": Vendor.remarks,
+}
+
+# Sort key -> ORDER BY expression; Vendor.id breaks ties, so pages never overlap.
+# Creation order uses the id, as for invoices.
+VENDOR_SORTS = {
+    "company_name": Vendor.company_name,
+    "status": Vendor.status,
+    "created_at": Vendor.id,
+    "vendor_code": Vendor.id,
+}
+
+MAX_VENDOR_PAGE = 500
+
+def vendor_directory_item(row) -> dict:
+    """One /api/admin/vendors row, from the projected columns only."""
+    item = dict(row._mapping)
+    if "vendor_code" in item:
+        item["vendor_code"] = f"V-{item['vendor_code']:04d}"
+    if "status" in item:
+        item["status"] = item["status"].strip().lower() if item["status"] else "pending"
+    if "entity_type" in item:
+        item["entity_type"] = item["entity_type"] or "Company"
+    return item
+
+# Session lookup + count + page
+@router.get("/api/admin/vendors", dependencies=[Depends(query_budget(3)), Depends(data_etag(require_admin_async))])
+async def get_vendors(
+    page: int = 1,
+    limit: Optional[int] = None, # Paged response when set; otherwise every matching vendor
+    status: Optional[str] = None, # One or more, comma separated
+    kyc_verified: Optional[bool] = None,
+    search: Optional[str] = None, # Company name, email, PAN or GSTIN
+    sort: str = "company_name",
+    dir: str = "asc",
+    fields: Optional[str] = None, # Comma separated projection, e.g. "id,company_name" for dropdowns
+    db: AsyncSession = Depends(get_async_db),
+    admin = Depends(require_admin_async)
+):
+    """Vendor directory, filtered, sorted and paged in SQL."""
+    names = [f.strip() for f in fields.split(",") if f.strip()] if fields else list(VENDOR_FIELDS)
+    unknown = [f for f in names if f not in VENDOR_FIELDS]
+    if unknown:
+        raise HTTPException(status_code=400, detail=f"Unknown fields: {', '.join(unknown)}")
+    if sort not in VENDOR_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(VENDOR_SORTS)}")
+
+    query = select(*(VENDOR_FIELDS[f].label(f) for f in dict.fromkeys(names)))
+    if status and status.strip():
+        # Stored statuses are lowercase (migration 0006), so this stays an index range
+        query = query.where(Vendor.status.in_([s.strip().lower() for s in status.split(",") if s.strip()]))
+    if kyc_verified is not None:
+        query = query.where(Vendor.kyc_verified == kyc_verified)
+    if search and search.strip():
+        # Substring search, answered from the trigram index (see services/search.py)
+        query = query.where(search_index.vendor_filter(db.bind.dialect.name, search, email=True))
+
+    sort_column = VENDOR_SORTS[sort]
+    if dir == "desc":
+        query = query.order_by(sort_column.desc(), Vendor.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Vendor.id.asc())
+
+    if limit is None:
+        # Unpaged: the plain array earlier clients expect
+        return FastJSONResponse([vendor_directory_item(row) for row in await db.execute(query)])
+
+    limit = max(1, min(limit, MAX_VENDOR_PAGE))
+    page = max(1, page)
+    total = await db.scalar(query.with_only_columns(func.count(Vendor.id)).order_by(None))
+    rows = await db.execute(query.offset((page - 1) * limit).limit(limit))
+    return FastJSONResponse({
+        "items": [vendor_directory_item(row) for row in rows],
+        "total": total,
+        "page": page,
+        "limit": limit
+    })
 
 @router.post("/api/admin/vendors")
 async def add_vendor(vendor_data: VendorCreate, db: Session = Depends(get_db), admin = Depends(require_admin)):
@@ -61,14 +142,15 @@ async def add_vendor(vendor_data: VendorCreate, db: Session = Depends(get_db), a
         if existing_user:
             raise HTTPException(status_code=400, detail=f"User account with email {vendor_data.email} already exists")
         
+        # Default password as discussed: nvs@123 (hashed before the write transaction starts)
+        pwd_hash = await auth_service.hash_password("nvs@123")
+        
         # Manual Add Vendor
         new_vendor = Vendor(**vendor_data.dict(), status=VendorStatus.VERIFIED, kyc_verified=True)
         db.add(new_vendor)
         db.flush() # Get ID for user linking
         
         # Create corresponding User account
-        # Default password as discussed: nvs@123
-        pwd_hash = get_password_hash("nvs@123")
         new_user = User(
             email=vendor_data.email,
             name=vendor_data.contact_person or vendor_data.company_name,
@@ -122,82 +204,155 @@ async def delete_vendor(vendor_id: int, db: Session = Depends(get_db), admin = D
     
     audit_service.log_action(db, admin["id"], AuditAction.VENDOR_UPDATE, vendor.id, f"Inactivated Vendor {vendor.company_name}")
     db.commit()
+    
+    # Drop cached sessions so deactivated users stop hitting the cache
+    auth_service.invalidate_vendor(vendor_id)
+    for user in linked_users:
+        auth_service.invalidate_user(user.id)
     return {"success": True, "message": "Vendor marked as INACTIVE"}
 
-from datetime import date as dt, timedelta
+from datetime import date as dt, datetime, timedelta
 from typing import Optional
 
-@router.get("/api/admin/pending-invoices")
+# Sort key -> ORDER BY expression; Invoice.id breaks ties, so pages never overlap.
+# Submission order reads ix_invoices_status_created_at under the status filter.
+PENDING_SORTS = {
+    "submitted": Invoice.created_at,
+    "invoice_no": Invoice.invoice_no,
+    "invoice_date": func.coalesce(Invoice.invoice_date, datetime(1900, 1, 1)),
+    "amount": Invoice.grand_total,
+    "status": Invoice.status,
+    "vendor": Vendor.company_name,
+}
+
+MAX_PENDING_PAGE = 500
+NDJSON_BATCH = 1000
+
+# Session lookup + count + page + vendors (NDJSON rows stream after the response starts)
+@router.get("/api/admin/pending-invoices", dependencies=[Depends(query_budget(4)), Depends(data_etag(require_admin_async))])
 async def get_pending_invoices(
     start_date: Optional[dt] = None, 
     end_date: Optional[dt] = None, 
     vendor_id: Optional[int] = None,
-    db: Session = Depends(get_db), 
-    admin = Depends(require_admin)
+    raw: bool = False, # null for missing dates, formatted by the page
+    page: int = 1,
+    limit: Optional[int] = None, # Paged response when set; otherwise every matching invoice
+    search: Optional[str] = None, # Invoice number / UTR, or vendor name / GSTIN / PAN
+    sort: Optional[str] = None, # Pages default to newest submitted first
+    dir: str = "desc",
+    format: str = "json", # json | ndjson (one invoice per line, streamed, for exports)
+    db: AsyncSession = Depends(get_async_db), 
+    admin = Depends(require_admin_async)
 ):
+    if sort is not None and sort not in PENDING_SORTS:
+        raise HTTPException(status_code=400, detail=f"sort must be one of: {', '.join(PENDING_SORTS)}")
+    if format not in ("json", "ndjson"):
+        raise HTTPException(status_code=400, detail="format must be 'json' or 'ndjson'")
+
     # If finance, only approved invoices? No, finance sees Paid/Unpaid.
     # Logic from main.py:
     # return invoices where status not paid/rejected?
-    query = db.query(Invoice).filter(Invoice.status.in_([InvoiceStatus.PENDING, InvoiceStatus.UNDER_REVIEW, InvoiceStatus.APPROVED]))
+    query = select(Invoice).where(Invoice.status.in_([InvoiceStatus.PENDING, InvoiceStatus.UNDER_REVIEW, InvoiceStatus.APPROVED]))
 
     if vendor_id:
-        query = query.filter(Invoice.vendor_id == vendor_id)
+        query = query.where(Invoice.vendor_id == vendor_id)
 
     if start_date:
-        query = query.filter(Invoice.invoice_date >= start_date)
+        query = query.where(Invoice.invoice_date >= start_date)
     if end_date:
         # Include the entire end_date (up to 23:59:59.999)
-        query = query.filter(Invoice.invoice_date < end_date + timedelta(days=1))
-        
-    invoices = query.all()
-    
-    results = []
-    for inv in invoices:
-        v = inv.vendor
-        # Calculate tax for display fallback
-        tax_calc = float(inv.tax_amount) if inv.tax_amount and float(inv.tax_amount) > 0 else (float(inv.cgst or 0) + float(inv.sgst or 0) + float(inv.igst or 0))
-        
-        base_amt = float(inv.amount or 0)
-        total_amt = base_amt + tax_calc
-
-        results.append({
-            "id": inv.id,
-            "invoice_no": inv.invoice_no,
-            "vendor_name": v.company_name if v else "Unknown",
-            "invoice_date": inv.invoice_date.strftime("%Y-%m-%d") if inv.invoice_date else "-",
-            "submitted_date": inv.created_at.strftime("%Y-%m-%d") if inv.created_at else "-",
-            "amount": total_amt,        # Total Invoice Value
-            "base_amount": base_amt,    # Taxable + Non-Taxable
-            "taxable_value": float(inv.taxable_value or 0),
-            "tax_amount": tax_calc,
-            "total_amount": total_amt,  # Explicit total for mapping
-            "status": inv.status,
-            "email": v.email if v else "",
-            "mobile": v.mobile if v else "",
-            "is_handwritten": bool(inv.is_handwritten),
-            "category": inv.category or "Basic",
-            "internal_remarks": inv.internal_remarks
-        })
-    return results
-
-
-@router.get("/api/admin/stats")
-async def admin_stats(db: Session = Depends(get_db), admin = Depends(require_admin)):
-    total_vendors = db.query(Vendor).count()
+        query = query.where(Invoice.invoice_date < end_date + timedelta(days=1))
+
+    if search and search.strip():
+        # Substring search, answered from the trigram index (see services/search.py)
+        dialect = db.bind.dialect.name
+        query = query.where(or_(search_index.invoice_filter(dialect, search), search_index.invoice_vendor_filter(dialect, search)))
+
+    # Pages need a total order. Full reads only sort when asked: about half the table is
+    # pending, and an ordered full read costs a sort or a walk of the whole invoices table.
+    if sort is None and limit is not None:
+        sort = "submitted"
+    if sort == "vendor":
+        query = query.join(Vendor)
+    if sort is not None:
+        sort_column = PENDING_SORTS[sort]
+        if dir == "asc":
+            query = query.order_by(sort_column.asc(), Invoice.id.asc())
+        else:
+            query = query.order_by(sort_column.desc(), Invoice.id.desc())
+
+    # Vendors are loaded eagerly: lazy loads cannot run on an AsyncSession
+    rows = query.options(selectinload(Invoice.vendor))
+
+    if format == "ndjson":
+        return StreamingResponse(stream_pending_invoices(rows, raw), media_type="application/x-ndjson")
+
+    if limit is None:
+        invoices = (await db.scalars(rows)).all()
+        # Plain str/int/float payload: orjson encodes it directly, no jsonable_encoder pass
+        return FastJSONResponse([pending_invoice_item(inv, raw) for inv in invoices])
+
+    limit = max(1, min(limit, MAX_PENDING_PAGE))
+    page = max(1, page)
+    total = await db.scalar(query.with_only_columns(func.count(Invoice.id)).order_by(None))
+    invoices = (await db.scalars(rows.offset((page - 1) * limit).limit(limit))).all()
+    return FastJSONResponse({
+        "items": [pending_invoice_item(inv, raw) for inv in invoices],
+        "total": total,
+        "page": page,
+        "limit": limit
+    })
+
+
+async def stream_pending_invoices(query, raw: bool):
+    """
+    NDJSON lines for `query`, read NDJSON_BATCH rows at a time (yield_per), so an
+    export never holds the whole result. Uses its own session: the request's one
+    is closed once the response has started.
+    """
+    async with AsyncSessionLocal() as db:
+        result = await db.stream_scalars(query.execution_options(yield_per=NDJSON_BATCH))
+        async for invoices in result.partitions():
+            # The identity map holds them weakly, so each batch is freed once encoded
+            yield b"".join(orjson.dumps(pending_invoice_item(inv, raw)) + b"\n" for inv in invoices)
+
+
+def pending_invoice_item(inv: Invoice, raw: bool = False) -> dict:
+    """One /api/admin/pending-invoices row. raw: missing dates are null instead of "-"."""
+    v = inv.vendor
+    # Stored totals: tax_amount, or cgst + sgst + igst when it is 0
+    total_amt = float(inv.grand_total or 0)
+    missing = None if raw else "-"
+    return {
+        "id": inv.id,
+        "invoice_no": inv.invoice_no,
+        "vendor_name": v.company_name if v else "Unknown",
+        "invoice_date": inv.invoice_date.strftime("%Y-%m-%d") if inv.invoice_date else missing,
+        "submitted_date": inv.created_at.strftime("%Y-%m-%d") if inv.created_at else missing,
+        "amount": total_amt,        # Total Invoice Value
+        "base_amount": float(inv.amount or 0),    # Taxable + Non-Taxable
+        "taxable_value": float(inv.taxable_value or 0),
+        "tax_amount": float(inv.effective_tax or 0),
+        "total_amount": total_amt,  # Explicit total for mapping
+        "status": inv.status,
+        "email": v.email if v else "",
+        "mobile": v.mobile if v else "",
+        "is_handwritten": bool(inv.is_handwritten),
+        "category": inv.category or "Basic",
+        "internal_remarks": inv.internal_remarks
+    }
+
+
+@router.get("/api/admin/stats", dependencies=[Depends(data_etag(require_admin_async))])
+async def admin_stats(db: AsyncSession = Depends(get_async_db), admin = Depends(require_admin_async)):
+    total_vendors = await db.scalar(select(func.count(Vendor.id)))
     
-    # Calculate totals for unpaid invoices
-    totals = db.query(
-        func.sum(Invoice.amount).label("pending_amount"),
-        func.sum(
-            func.coalesce(Invoice.tax_amount, 0) + 
-            case(
-                (func.coalesce(Invoice.tax_amount, 0) == 0, 
-                 func.coalesce(Invoice.cgst, 0) + func.coalesce(Invoice.sgst, 0) + func.coalesce(Invoice.igst, 0)),
-                else_=0
-            )
-        ).label("pending_tax"),
-        func.sum(func.coalesce(Invoice.igst, 0)).label("pending_igst")
-    ).filter(Invoice.status != InvoiceStatus.PAID).first()
+    # Totals for unpaid invoices, from the rollup (one row per vendor/status/type)
+    totals = (await db.execute(select(
+        func.sum(InvoiceRollup.base_amount).label("pending_amount"),
+        func.sum(InvoiceRollup.tax_amount).label("pending_tax"),
+        func.sum(InvoiceRollup.igst_amount).label("pending_igst")
+    ).where(InvoiceRollup.status.notin_([InvoiceStatus.PAID.value, ""])))).first()
 
     return {
         "success": True, 
@@ -209,6 +364,19 @@ async def admin_stats(db: Session = Depends(get_db), admin = Depends(require_adm
         }
     }
 
+@router.get("/api/admin/possible-duplicates")
+async def possible_duplicates(
+    limit: int = 100,
+    min_similarity: float = 0.0,
+    vendor_id: Optional[int] = None,
+    db: Session = Depends(get_db),
+    admin = Depends(require_admin)
+):
+    """Invoice pairs whose files look alike (rescans, re-exports), most recently detected first."""
+    limit = max(1, min(limit, 500))
+    items = near_duplicate_service.report(db, limit=limit, min_similarity=min_similarity, vendor_id=vendor_id)
+    return FastJSONResponse({"success": True, "data": items})
+
 @router.get("/api/admin/vendors/{vendor_id}")
 async def get_vendor(vendor_id: int, db: Session = Depends(get_db), admin = Depends(require_admin)):
     vendor = db.query(Vendor).filter(Vendor.id == vendor_id).first()
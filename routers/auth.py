@@ -24,7 +24,7 @@ async def api_register(request: Request):
             raise HTTPException(status_code=400, detail=f"Missing field: {field}")
             
     try:
-        result = auth_service.register_vendor(data)
+        result = await auth_service.register_vendor(data)
         if not result:
              raise HTTPException(status_code=500, detail="Registration failed")
              
@@ -47,7 +47,7 @@ async def api_login(request: Request):
     email = data.get("email", "")
     password = data.get("password", "")
     
-    result = auth_service.authenticate(email, password)
+    result = await auth_service.authenticate(email, password)
     if not result:
         raise HTTPException(status_code=401, detail="Invalid credentials")
     
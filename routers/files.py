@@ -0,0 +1,70 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Body
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import select
+import os
+
+from core.dependencies import get_async_db, get_current_user_async
+from core.security import verify_file_token
+from models.invoice import Invoice
+from models.tax_document import VendorTaxDocument
+from routers.tax_documents import download_filename
+from services.storage import storage_service, UPLOAD_ROOT
+
+router = APIRouter(prefix="/api/files", tags=["files"])
+
+MAX_SIGN_BATCH = 500
+
+@router.post("/sign")
+async def sign_file_urls(
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
+):
+    """
+    Mint short-lived download URLs in bulk.
+    Body: {"invoice_ids": [...], "tax_doc_ids": [...]}; ids the caller cannot see are left out.
+    """
+    try:
+        invoice_ids = {int(i) for i in payload.get("invoice_ids") or []}
+        tax_doc_ids = {int(i) for i in payload.get("tax_doc_ids") or []}
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="invoice_ids and tax_doc_ids must be lists of ids")
+    if len(invoice_ids) + len(tax_doc_ids) > MAX_SIGN_BATCH:
+        raise HTTPException(status_code=400, detail=f"At most {MAX_SIGN_BATCH} files per request")
+
+    invoices = {}
+    if invoice_ids:
+        query = select(Invoice.id, Invoice.file_path, Invoice.file_hash).where(Invoice.id.in_(invoice_ids))
+        if user["role"] == "vendor":
+            query = query.where(Invoice.vendor_id == user["vendor_id"])
+        for row in (await db.execute(query)).all():
+            if row.file_path:
+                invoices[row.id] = storage_service.signed_url(user["id"], row.file_path, row.file_hash)
+
+    tax_docs = {}
+    # Tax documents are not visible to vendors (see /api/tax-docs/list)
+    if tax_doc_ids and user["role"] != "vendor":
+        query = select(
+            VendorTaxDocument.id, VendorTaxDocument.file_path,
+            VendorTaxDocument.financial_year, VendorTaxDocument.quarter
+        ).where(VendorTaxDocument.id.in_(tax_doc_ids))
+        for row in (await db.execute(query)).all():
+            tax_docs[row.id] = storage_service.signed_url(
+                user["id"], row.file_path, filename=download_filename(row), media_type="application/pdf"
+            )
+
+    return {"success": True, "invoices": invoices, "tax_docs": tax_docs}
+
+@router.get("/{token}")
+async def download_signed_file(token: str, request: Request):
+    """Serve a file from a signed URL. The signature is the authorization: no header, no DB."""
+    grant = verify_file_token(token)
+    if not grant:
+        raise HTTPException(status_code=403, detail="Link is invalid or has expired")
+
+    # Defence in depth: only ever serve from the upload area
+    file_path = grant["p"]
+    if not os.path.abspath(file_path).startswith(os.path.abspath(UPLOAD_ROOT) + os.sep):
+        raise HTTPException(status_code=403, detail="Link is invalid or has expired")
+
+    return storage_service.file_response(request, file_path, grant["h"], media_type=grant.get("t"), filename=grant.get("n"))
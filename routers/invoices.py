@@ -1,23 +1,37 @@
 from fastapi import APIRouter, Request, Depends, HTTPException, UploadFile, File, Form, Body
 from fastapi.responses import HTMLResponse, FileResponse
-from sqlalchemy.orm import Session
-from sqlalchemy import func, case
+from sqlalchemy.orm import Session, selectinload
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import func, case, select, tuple_
 from typing import Optional, List
+from decimal import Decimal
+import base64
+import json
 import shutil
 import os
 import uuid
 from datetime import datetime
 
-from core.config import TEMPLATES
-from core.dependencies import get_db, require_user, get_current_user, require_admin
-from models.invoice import Invoice, InvoiceStatus
+from core.config import TEMPLATES, settings
+from core.dependencies import get_db, get_async_db, require_user, require_user_async, get_current_user, get_current_user_async, require_admin
+from core.query_counter import query_budget
+from core.responses import FastJSONResponse
+from core.data_version import data_etag
+from core.security import file_token_window
+from models.invoice import Invoice, InvoiceStatus, INVOICE_TAX
 from models.vendor import Vendor
+from models.stored_file import StoredFile
 from services.workflow import workflow_service
 from services.audit import audit_service, AuditAction
 from services.notification import notification_service
 from services.validation import validation_service
+from services.storage import storage_service, INVOICE_STORE
+from services.search import search_index
+from services.near_duplicates import near_duplicate_service
+from services.bulk_import import bulk_import_service, IMPORT_DIR, MANIFEST_TYPES
 
 from sqlalchemy.exc import IntegrityError
+from starlette.concurrency import run_in_threadpool
 from core.error_handler import BadRequestError
 
 router = APIRouter()
@@ -36,7 +50,112 @@ def validate_file_extension(filename: str):
 async def list_invoices(request: Request):
     return TEMPLATES.TemplateResponse("invoices.html", {"request": request})
 
-@router.get("/api/invoices/data")
+_NO_DATE = datetime(1900, 1, 1)
+COUNT_CAP = 10000
+
+# Sort key -> (ORDER BY expression, its value on a loaded invoice, cursor value parser).
+# NULLs are coalesced so ordering and keyset comparisons agree on every database.
+# Creation order uses the id: it grows with created_at, and server-set timestamps
+# (CURRENT_TIMESTAMP) are stored in a different text format than bound datetimes
+# on SQLite, which would break the keyset comparison.
+INVOICE_SORTS = {
+    "created_at": (Invoice.id, lambda inv: inv.id, int),
+    "invoice_no": (Invoice.invoice_no, lambda inv: inv.invoice_no, str),
+    "date": (func.coalesce(Invoice.invoice_date, _NO_DATE), lambda inv: inv.invoice_date or _NO_DATE, datetime.fromisoformat),
+    "base_amount": (Invoice.amount, lambda inv: inv.amount, Decimal),
+    "amount": (Invoice.grand_total, lambda inv: inv.grand_total, Decimal), # Total (base + tax), stored
+    "status": (func.coalesce(Invoice.status, ""), lambda inv: inv.status or "", str),
+    "vendor": (Vendor.company_name, lambda inv: inv.vendor.company_name, str),
+}
+
+def encode_invoice_cursor(inv: Invoice, sort: str, descending: bool) -> str:
+    """Opaque position after `inv` in the given ordering."""
+    value = INVOICE_SORTS[sort][1](inv)
+    value = value.isoformat() if isinstance(value, datetime) else str(value)
+    raw = json.dumps({"s": sort, "d": descending, "v": value, "i": inv.id}, separators=(",", ":"))
+    return base64.urlsafe_b64encode(raw.encode()).decode().rstrip("=")
+
+def decode_invoice_cursor(cursor: str, sort: str, descending: bool):
+    """(last sort value, last id) from a cursor issued for the same ordering."""
+    try:
+        data = json.loads(base64.urlsafe_b64decode(cursor + "=" * (-len(cursor) % 4)))
+        if data["s"] != sort or data["d"] != descending:
+            raise ValueError("cursor was issued for another sort order")
+        return INVOICE_SORTS[sort][2](data["v"]), int(data["i"])
+    except (ValueError, KeyError, TypeError, ArithmeticError):
+        raise HTTPException(status_code=400, detail="Invalid cursor for this sort order")
+
+async def summarize_invoices(db: AsyncSession, query, count: str = "exact", totals: bool = True) -> dict:
+    """
+    Row count and amount/tax/IGST totals of the filtered set, in one aggregate pass
+    over the same FROM/WHERE as `query` (no IN (subquery) re-scan).
+    count: exact | capped (stops at COUNT_CAP rows when totals are off) | none
+    """
+    if count not in ("exact", "capped", "none"):
+        raise HTTPException(status_code=400, detail="count must be 'exact', 'capped' or 'none'")
+    summary = {"total": None, "total_exact": False, "total_amount": 0.0, "total_tax": 0.0, "total_igst": 0.0}
+
+    if totals:
+        # Totals need the whole set anyway, so the exact count comes for free
+        row = (await db.execute(query.with_only_columns(
+            func.count(Invoice.id).label("total"),
+            func.sum(Invoice.amount).label("total_amount"),
+            func.sum(INVOICE_TAX).label("total_tax"),
+            func.sum(func.coalesce(Invoice.igst, 0)).label("total_igst")
+        ).order_by(None))).first()
+        summary.update(
+            total_amount=float(row.total_amount or 0.0),
+            total_tax=float(row.total_tax or 0.0),
+            total_igst=float(row.total_igst or 0.0)
+        )
+        if count != "none":
+            summary.update(total=row.total, total_exact=True)
+    elif count == "exact":
+        summary.update(total=await db.scalar(query.with_only_columns(func.count(Invoice.id)).order_by(None)), total_exact=True)
+    elif count == "capped":
+        rows = query.with_only_columns(Invoice.id).order_by(None).limit(COUNT_CAP + 1)
+        total = await db.scalar(select(func.count()).select_from(rows.subquery()))
+        summary.update(total=min(total, COUNT_CAP), total_exact=total <= COUNT_CAP)
+    return summary
+
+def invoice_list_item(inv: Invoice, user_id: int, raw: bool = False) -> dict:
+    """
+    One /api/invoices/data row. raw: amounts as numbers, ISO date and status code,
+    formatted by the page; otherwise display strings ("₹1,234.00", "Under Review").
+    """
+    item = {
+        "id": inv.id,
+        "invoice_no": inv.invoice_no,
+        "vendor_name": inv.vendor.company_name if inv.vendor else None,
+        "date": inv.invoice_date.strftime("%Y-%m-%d") if inv.invoice_date else None,
+        "amount": float(inv.grand_total or 0), # Total Amount (Base + Tax)
+        "base_amount": float(inv.amount or 0), # Base Amount (Stored Amount)
+        "taxable_value": float(inv.taxable_value or 0),
+        "tax": float(inv.effective_tax or 0),
+        "cgst": float(inv.cgst or 0),
+        "sgst": float(inv.sgst or 0),
+        "igst": float(inv.igst or 0),
+        "status": inv.status or InvoiceStatus.PENDING.value,
+        "file_path": inv.file_path,
+        "file_url": storage_service.signed_url(user_id, inv.file_path, inv.file_hash)
+    }
+    if not raw:
+        item.update(
+            vendor_name=item["vendor_name"] or "Unknown",
+            date=item["date"] or "N/A",
+            amount=f"₹{item['amount']:,.2f}",
+            base_amount=f"₹{item['base_amount']:,.2f}",
+            taxable_value=f"₹{item['taxable_value']:,.2f}",
+            tax=f"₹{item['tax']:,.2f}",
+            status=item["status"].replace("_", " ").title()
+        )
+    return item
+
+# Session lookup + summary + page + vendors, whatever the page size.
+# The tag also changes with the signing window, so a 304 never revives expired file URLs.
+@router.get("/api/invoices/data", dependencies=[
+    Depends(query_budget(4)), Depends(data_etag(require_user_async, extra=file_token_window))
+])
 async def list_my_invoices(
     page: int = 1,
     limit: int = 10,
@@ -47,24 +166,29 @@ async def list_my_invoices(
     dir: Optional[str] = "asc",
     start_date: Optional[str] = None,
     end_date: Optional[str] = None,
-    db: Session = Depends(get_db), 
-    user = Depends(require_user)
+    cursor: Optional[str] = None, # Keyset paging: "" for the first page, then next_cursor
+    count: str = "exact", # exact | capped | none
+    totals: bool = True, # amount/tax/IGST sums of the filtered set
+    raw: bool = False, # numbers and codes instead of display strings
+    db: AsyncSession = Depends(get_async_db), 
+    user = Depends(require_user_async)
 ):
     # Base Query
-    query = db.query(Invoice)
+    query = select(Invoice)
+    vendor_joined = False
 
     # Role specific filters
     if user["role"] not in ["admin", "superadmin", "finance"]:
         vendor_id = user.get("vendor_id")
         if not vendor_id:
             raise HTTPException(status_code=403, detail="No vendor linked to account")
-        query = query.filter(Invoice.vendor_id == vendor_id)
+        query = query.where(Invoice.vendor_id == vendor_id)
 
     # Apply Filters
     if start_date:
         try:
              s_date = datetime.strptime(start_date, "%Y-%m-%d")
-             query = query.filter(Invoice.invoice_date >= s_date)
+             query = query.where(Invoice.invoice_date >= s_date)
         except: pass
         
     if end_date:
@@ -72,7 +196,7 @@ async def list_my_invoices(
              e_date = datetime.strptime(end_date, "%Y-%m-%d")
              # Set time to end of day
              e_date = e_date.replace(hour=23, minute=59, second=59)
-             query = query.filter(Invoice.invoice_date <= e_date)
+             query = query.where(Invoice.invoice_date <= e_date)
         except: pass
 
     if status and status.strip():
@@ -82,126 +206,140 @@ async def list_my_invoices(
         if s_term == "under_review": s_term = InvoiceStatus.UNDER_REVIEW.value
         
         # Safe string comparison since column is String
-        query = query.filter(Invoice.status == s_term)
+        query = query.where(Invoice.status == s_term)
 
+    # Substring search, answered from the trigram index (see services/search.py)
+    dialect = db.bind.dialect.name
     if search and search.strip():
-        term = f"%{search.strip()}%"
-        query = query.filter(Invoice.invoice_no.ilike(term))
+        # Invoice number or payment reference (UTR)
+        query = query.where(search_index.invoice_filter(dialect, search))
 
     if vendor_search and vendor_search.strip():
-        # Join Vendor to filter by company name if not already joined
-        if not any(mapper.class_ == Vendor for mapper in query._compile_state()._join_entities):
-             query = query.join(Vendor)
-        
-        term = f"%{vendor_search.strip()}%"
-        query = query.filter(Vendor.company_name.ilike(term))
-
-    # Sorting Logic
-    if sort:
-        sort_column = None
-        if sort == "invoice_no": sort_column = Invoice.invoice_no
-        elif sort == "date": sort_column = Invoice.invoice_date
-        elif sort == "base_amount": sort_column = Invoice.amount
-        elif sort == "amount": sort_column = Invoice.amount # Sort by base amount for now as total requires calculation or derived column
-        elif sort == "status": sort_column = Invoice.status
-        elif sort == "vendor": 
-            # Join if not already joined
-            if not any(mapper.class_ == Vendor for mapper in query._compile_state()._join_entities):
-                 query = query.join(Vendor)
-            sort_column = Vendor.company_name
-        
-        if sort_column:
-            if dir == "desc":
-                query = query.order_by(sort_column.desc())
-            else:
-                query = query.order_by(sort_column.asc())
-        else:
-             query = query.order_by(Invoice.created_at.desc())
-    else:
-        query = query.order_by(Invoice.created_at.desc())
+        # Vendor name, GSTIN or PAN
+        query = query.where(search_index.invoice_vendor_filter(dialect, vendor_search))
 
-    # Pagination Logic
-    total_count = query.count()
-    offset = (page - 1) * limit
-    
-    invoices = query.offset(offset).limit(limit).all()
-    
-    # Calculate Totals for the filtered set (before pagination)
-    # Accounting for component taxes if tax_amount is 0
-    totals_query = db.query(
-        func.sum(Invoice.amount).label("total_amount"),
-        func.sum(
-            func.coalesce(Invoice.tax_amount, 0) + 
-            case(
-                (func.coalesce(Invoice.tax_amount, 0) == 0, 
-                 func.coalesce(Invoice.cgst, 0) + func.coalesce(Invoice.sgst, 0) + func.coalesce(Invoice.igst, 0)),
-                else_=0
-            )
-        ).label("total_tax"),
-        func.sum(func.coalesce(Invoice.igst, 0)).label("total_igst")
-    ).filter(Invoice.id.in_(query.with_entities(Invoice.id)))
+    # Sorting Logic: (sort column, Invoice.id) is a total order, so pages never overlap
+    # and keyset cursors can resume exactly after the last row
+    if sort not in INVOICE_SORTS:
+        sort, descending = "created_at", True
+    else:
+        descending = dir == "desc"
+    if sort == "vendor" and not vendor_joined:
+        # Join if not already joined
+        query = query.join(Vendor)
+        vendor_joined = True
+    sort_column = INVOICE_SORTS[sort][0]
+    if descending:
+        query = query.order_by(sort_column.desc(), Invoice.id.desc())
+    else:
+        query = query.order_by(sort_column.asc(), Invoice.id.asc())
+
+    # Count and totals cover the whole filtered set (before pagination), in one pass
+    summary = await summarize_invoices(db, query, count, totals)
+
+    # Vendors are loaded eagerly: lazy loads cannot run on an AsyncSession
+    query = query.options(selectinload(Invoice.vendor))
+    next_cursor = None
+    if cursor is not None:
+        # Keyset mode: WHERE (sort, id) > (last sort, last id) instead of OFFSET,
+        # so page 1000 costs the same as page 1
+        if cursor:
+            last_value, last_id = decode_invoice_cursor(cursor, sort, descending)
+            position = tuple_(sort_column, Invoice.id)
+            query = query.where(position < tuple_(last_value, last_id) if descending else position > tuple_(last_value, last_id))
+        invoices = (await db.scalars(query.limit(limit + 1))).all()
+        if len(invoices) > limit:
+            invoices = invoices[:limit]
+            next_cursor = encode_invoice_cursor(invoices[-1], sort, descending)
+    else:
+        # Pagination Logic
+        offset = (page - 1) * limit
+        invoices = (await db.scalars(query.offset(offset).limit(limit))).all()
     
-    totals = totals_query.first()
-    total_amount = float(totals.total_amount or 0.0)
-    total_tax = float(totals.total_tax or 0.0)
-    total_igst = float(totals.total_igst or 0.0)
-
-    return {
-        "items": [{
-            "id": inv.id,
-            "invoice_no": inv.invoice_no,
-            "vendor_name": inv.vendor.company_name if inv.vendor else "Unknown",
-            "date": inv.invoice_date.strftime("%Y-%m-%d") if inv.invoice_date else "N/A",
-            "amount": f"₹{(float(inv.amount or 0) + (float(inv.tax_amount) if inv.tax_amount else (float(inv.cgst or 0) + float(inv.sgst or 0) + float(inv.igst or 0)))):,.2f}", # Total Amount (Base + Tax)
-            "base_amount": f"₹{inv.amount:,.2f}", # Base Amount (Stored Amount)
-            "taxable_value": f"₹{inv.taxable_value:,.2f}" if inv.taxable_value else "₹0.00",
-            "tax": f"₹{(float(inv.tax_amount) if inv.tax_amount else (float(inv.cgst or 0) + float(inv.sgst or 0) + float(inv.igst or 0))):,.2f}",
-            "cgst": float(inv.cgst or 0),
-            "sgst": float(inv.sgst or 0),
-            "igst": float(inv.igst or 0),
-            "status": inv.status.replace("_", " ").title() if inv.status else "Pending",
-            "file_path": inv.file_path
-        } for inv in invoices],
-        "total": total_count,
-        "total_amount": total_amount,
-        "total_tax": total_tax,
-        "total_igst": total_igst,
+    # Plain str/int/float payload: orjson encodes it directly, no jsonable_encoder pass
+    return FastJSONResponse({
+        "items": [invoice_list_item(inv, user["id"], raw) for inv in invoices],
+        **summary,
         "page": page,
-        "limit": limit
-    }
+        "limit": limit,
+        "next_cursor": next_cursor
+    })
 
 
 @router.post("/api/invoices/upload-file")
 async def upload_file_only(
     file: UploadFile = File(...),
-    user = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
 ):
     """Upload file immediately and return file path"""
-    # Save File
     file_ext = validate_file_extension(file.filename)
-    filename = f"{uuid.uuid4().hex}.{file_ext}"
-    upload_dir = "uploads/invoices"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, filename)
-
-    # Path Traversal Check
-    if not os.path.abspath(file_path).startswith(os.path.abspath(upload_dir)):
-         raise HTTPException(status_code=400, detail="Invalid file path")
     
-    content = await file.read()
-    file_hash = validation_service.calculate_file_hash(content)
+    # Streamed to a temp file in chunks, hashed on the way
+    staged = await storage_service.stage_upload(file, INVOICE_STORE)
+    stored = await accept_invoice_file(db, staged, file_ext)
     
-    with open(file_path, "wb") as buffer:
-        buffer.write(content)
+    return {"success": True, "file_path": stored["file_path"], "file_hash": stored["file_hash"]}
+
+
+async def accept_invoice_file(db: AsyncSession, staged: dict, file_ext: str) -> dict:
+    """
+    Put a staged upload into the invoice store for a later submit-metadata call.
+    Known duplicates are rejected before anything lands in the store.
+    """
+    try:
+        await validation_service.check_duplicate_file_async(db, staged["file_hash"])
+    except BaseException:
+        await storage_service.discard(staged)
+        raise
     
-    return {"success": True, "file_path": file_path, "file_hash": file_hash}
+    # Unclaimed until submit-metadata creates the invoice
+    stored = await storage_service.store_blob(db, staged, file_ext, claim=False)
+    await db.commit()
+    return stored
+
+
+@router.post("/api/invoices/probe")
+async def probe_file(
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
+):
+    """
+    Check a client-computed SHA-256 (and size) before uploading.
+    - duplicate: an invoice already uses this file, the upload would be hard-blocked
+    - exists: the store already holds the blob, so the client can skip the transfer
+      and call submit-metadata with the returned file_path/file_hash
+    """
+    file_hash = str(payload.get("file_hash") or "").strip().lower()
+    if len(file_hash) != 64 or any(c not in "0123456789abcdef" for c in file_hash):
+        raise HTTPException(status_code=400, detail="file_hash must be a hex SHA-256 digest")
+    try:
+        size = int(payload["size"]) if payload.get("size") is not None else None
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="size must be a number of bytes")
+
+    try:
+        await validation_service.check_duplicate_file_async(db, file_hash)
+    except HTTPException as e:
+        return {"success": True, "duplicate": True, "exists": True, "message": e.detail}
+
+    blob = await db.get(StoredFile, file_hash)
+    exists = bool(blob) and (size is None or blob.size == size) and os.path.exists(blob.file_path)
+    return {
+        "success": True,
+        "duplicate": False,
+        "exists": exists,
+        "file_hash": file_hash,
+        "file_path": blob.file_path if exists else None
+    }
 
 
 @router.post("/api/invoices/submit-metadata")
 async def submit_invoice_metadata(
     payload: dict = Body(...),
-    db: Session = Depends(get_db),
-    user = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
 ):
     """Submit invoice metadata with pre-uploaded file"""
     # Determine Vendor
@@ -240,8 +378,8 @@ async def submit_invoice_metadata(
                 pass
             
     # Validate
-    validation_service.validate_invoice(
-        db=db,
+    await validation_service.validate_invoice_async(
+        db,
         vendor_id=vendor_id,
         invoice_no=final_invoice_no,
         invoice_date=final_date,
@@ -255,6 +393,11 @@ async def submit_invoice_metadata(
     if final_document_type not in valid_doc_types:
         final_document_type = "invoice"
 
+    # Reference the stored blob; its recorded path wins over the client-supplied one
+    blob = await storage_service.claim_blob(db, payload.get("file_hash"))
+    if blob:
+        file_path = blob.file_path
+
     # Create Invoice
     try:
         new_inv = Invoice(
@@ -280,18 +423,26 @@ async def submit_invoice_metadata(
         )
         
         db.add(new_inv)
-        db.commit()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
         return {"success": False, "message": "Invoice number already exists (DB Constraint)"}
     except Exception as e:
-        db.rollback()
+        await db.rollback()
         raise HTTPException(status_code=500, detail=str(e))
     
     # Audit
-    audit_service.log_action(db, user["id"], AuditAction.INVOICE_UPLOAD, new_inv.id, f"Uploaded Invoice {final_invoice_no}")
+    await audit_service.log_action_async(db, user["id"], AuditAction.INVOICE_UPLOAD, new_inv.id, f"Uploaded Invoice {final_invoice_no}")
+    
+    # Rescans of an earlier invoice: a warning for the uploader and the admin report, not a block
+    similar = await near_duplicate_service.check_async(db, file_path, payload.get("file_hash"), new_inv.id)
     
-    return {"success": True, "message": "Invoice submitted successfully"}
+    return {
+        "success": True,
+        "message": "Invoice submitted successfully",
+        "near_duplicates": similar,
+        "warning": near_duplicate_service.warning(similar)
+    }
 
 
 @router.post("/api/invoices/upload")
@@ -311,8 +462,8 @@ async def upload_invoice(
     manual_description: Optional[str] = Form(None),
     manual_vendor_id: Optional[int] = Form(None), # For Admin Upload
     manual_document_type: Optional[str] = Form("invoice"), # Document Type: invoice, credit_note, debit_note
-    db: Session = Depends(get_db),
-    user = Depends(get_current_user)
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
 ):
     # Determine Vendor
     vendor_id = user.get("vendor_id")
@@ -328,23 +479,7 @@ async def upload_invoice(
             raise HTTPException(status_code=400, detail="No vendor linked to your account. Please contact admin.")
 
 
-    # Calculate Hash
-    content = await file.read()
-    file_hash = validation_service.calculate_file_hash(content)
-    
-    # Save File
     file_ext = validate_file_extension(file.filename)
-    filename = f"{uuid.uuid4().hex}.{file_ext}"
-    upload_dir = "uploads/invoices"
-    os.makedirs(upload_dir, exist_ok=True)
-    file_path = os.path.join(upload_dir, filename)
-    
-    # Path Traversal Check
-    if not os.path.abspath(file_path).startswith(os.path.abspath(upload_dir)):
-         raise HTTPException(status_code=400, detail="Invalid file path")
-
-    with open(file_path, "wb") as buffer:
-        buffer.write(content)
     
     # Metadata extraction
     final_invoice_no = manual_invoice_no or f"INV-{uuid.uuid4().hex[:8].upper()}"
@@ -364,15 +499,26 @@ async def upload_invoice(
             except:
                 pass
 
-    # Validation
-    validation_service.validate_invoice(
-        db=db,
-        vendor_id=vendor_id,
-        invoice_no=final_invoice_no,
-        invoice_date=final_date,
-        amount=final_amount,
-        file_hash=file_hash
-    )
+    # Streamed to a temp file in chunks; the hash is computed on the way
+    staged = await storage_service.stage_upload(file, INVOICE_STORE)
+    file_hash = staged["file_hash"]
+
+    # Validation runs before the file is placed, so rejected uploads never reach the store
+    try:
+        await validation_service.validate_invoice_async(
+            db,
+            vendor_id=vendor_id,
+            invoice_no=final_invoice_no,
+            invoice_date=final_date,
+            amount=final_amount,
+            file_hash=file_hash
+        )
+    except BaseException:
+        await storage_service.discard(staged)
+        raise
+
+    stored = await storage_service.store_blob(db, staged, file_ext)
+    file_path = stored["file_path"]
 
     # Validate document type
     valid_doc_types = ["invoice", "credit_note", "debit_note"]
@@ -405,20 +551,55 @@ async def upload_invoice(
     
     try:
         db.add(new_inv)
-        db.commit()
+        await db.commit()
     except IntegrityError:
-        db.rollback()
+        await db.rollback()
+        await storage_service.discard_blob(stored)
         return {"success": False, "message": "Invoice number already exists"}
     
     # Audit
-    audit_service.log_action(db, user["id"], AuditAction.INVOICE_UPLOAD, new_inv.id, f"Uploaded Invoice {final_invoice_no}")
+    await audit_service.log_action_async(db, user["id"], AuditAction.INVOICE_UPLOAD, new_inv.id, f"Uploaded Invoice {final_invoice_no}")
+    
+    similar = await near_duplicate_service.check_async(db, file_path, file_hash, new_inv.id)
     
     return {
         "success": True, 
         "message": "Invoice uploaded successfully",
-        "mismatch": False 
+        "mismatch": False,
+        "near_duplicates": similar,
+        "warning": near_duplicate_service.warning(similar)
     }
 
+@router.post("/api/invoices/bulk-import")
+async def bulk_import_invoices(
+    manifest: UploadFile = File(...),
+    archive: UploadFile = File(...),
+    vendor_id: Optional[int] = Form(None), # Default for manifest rows without a vendor_id
+    dry_run: bool = Form(False),
+    db: Session = Depends(get_db),
+    admin = Depends(require_admin)
+):
+    """
+    Import invoices from a CSV/XLSX manifest and a zip of their files.
+    Rows failing validation are skipped; the per-row report says why.
+    """
+    manifest_type = (manifest.filename or "").rsplit(".", 1)[-1].lower()
+    if manifest_type not in MANIFEST_TYPES:
+        raise HTTPException(status_code=400, detail="Manifest must be a .csv or .xlsx file")
+
+    # Both streamed to disk; the archive is then read member by member
+    staged = [await storage_service.stage_upload(manifest, IMPORT_DIR)]
+    try:
+        staged.append(await storage_service.stage_upload(archive, IMPORT_DIR, max_bytes=settings.BULK_IMPORT_MAX_MB * 1024 * 1024))
+        report = await run_in_threadpool(
+            bulk_import_service.run, db, admin, staged[0]["tmp_path"], manifest_type, staged[1]["tmp_path"], vendor_id, dry_run
+        )
+    finally:
+        for upload in staged:
+            await storage_service.discard(upload)
+
+    return FastJSONResponse(report)
+
 @router.post("/api/invoices/recategorise")
 async def recategorise_invoice(
     payload: dict = Body(...),
@@ -554,19 +735,18 @@ async def get_invoice_detail(invoice_id: int, db: Session = Depends(get_db), use
 
     vendor = db.query(Vendor).filter(Vendor.id == inv.vendor_id).first()
     
-    # Return calculated tax if tax_amount is 0
-    tax_amount = inv.tax_amount
-    if not tax_amount or float(tax_amount) == 0:
-        tax_amount = float(inv.cgst or 0) + float(inv.sgst or 0) + float(inv.igst or 0)
-
+    # Stored totals: tax_amount, or cgst + sgst + igst when it is 0
     base_val = float(inv.amount or 0)
-    tax_val = float(tax_amount or 0)
-    total_val = base_val + tax_val
+    tax_val = float(inv.effective_tax or 0)
+    total_val = float(inv.grand_total or 0)
 
     return {
         "id": inv.id,
         "invoice_no": inv.invoice_no,
         "vendor_name": vendor.company_name if vendor else "Unknown",
+        # Vendor contact, for the approve/reject notifications
+        "email": vendor.email if vendor else "",
+        "mobile": vendor.mobile if vendor else "",
         "amount": total_val,          # Total (Base + Tax)
         "base_amount": base_val,      # Base (Stored Amount)
         "tax_amount": tax_val,
@@ -581,6 +761,7 @@ async def get_invoice_detail(invoice_id: int, db: Session = Depends(get_db), use
         "ocr_confidence": inv.ocr_confidence or 0.0,
         "is_handwritten": bool(inv.is_handwritten),
         "file_path": inv.file_path,
+        "file_url": storage_service.signed_url(user["id"], inv.file_path, inv.file_hash),
         "line_items": [], # Mock for now
         "vendor_tds_applicable": vendor.tds_applicable if vendor else False,
         "vendor_tds_rate": vendor.tds_rate if vendor else 0.0,
@@ -593,15 +774,18 @@ async def get_invoice_detail(invoice_id: int, db: Session = Depends(get_db), use
     }
 
 @router.get("/api/invoices/view-original")
-async def view_original_file(invoice_id: int, db: Session = Depends(get_db), user = Depends(get_current_user)):
-    inv = db.query(Invoice).filter(Invoice.id == invoice_id).first()
+async def view_original_file(invoice_id: int, request: Request, db: AsyncSession = Depends(get_async_db), user = Depends(get_current_user_async)):
+    # Only the columns needed to authorize and serve, not the full invoice
+    inv = (await db.execute(
+        select(Invoice.vendor_id, Invoice.file_path, Invoice.file_hash).where(Invoice.id == invoice_id)
+    )).first()
     if not inv: raise HTTPException(status_code=404, detail="Invoice not found")
     
     # Access Control
     if user["role"] == "vendor" and inv.vendor_id != user["vendor_id"]:
         raise HTTPException(status_code=403, detail="Access Denied")
 
-    if not os.path.exists(inv.file_path):
+    if not inv.file_path:
          raise HTTPException(status_code=404, detail="File not found on server")
-         
-    return FileResponse(inv.file_path)
+
+    return storage_service.file_response(request, inv.file_path, storage_service.file_etag(inv.file_path, inv.file_hash))
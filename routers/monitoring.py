@@ -4,6 +4,7 @@ from typing import List
 
 from core.dependencies import get_db, require_admin
 from models.error_log import ErrorLog
+from services.auth import auth_service
 
 router = APIRouter(prefix="/api/monitoring", tags=["monitoring"])
 
@@ -47,3 +48,8 @@ async def resolve_error(error_id: int, db: Session = Depends(get_db), admin = De
     error_log.is_resolved = True
     db.commit()
     return {"success": True}
+
+@router.get("/cache")
+async def get_cache_stats(admin = Depends(require_admin)):
+    """Hit/miss counters for the in-process caches of this worker."""
+    return {"session_cache": auth_service.session_cache.stats()}
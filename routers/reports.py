@@ -1,11 +1,12 @@
 from fastapi import APIRouter, Depends, HTTPException, Query
 from fastapi.responses import FileResponse, JSONResponse
-from sqlalchemy.orm import Session
+from sqlalchemy.orm import Session, selectinload
 from sqlalchemy import func
 from typing import Optional
 import os
 
 from core.dependencies import get_db, require_user, get_current_user
+from core.query_counter import query_budget
 from models.invoice import Invoice, InvoiceStatus
 from models.vendor import Vendor
 from services.reporting import reporting_service
@@ -13,7 +14,8 @@ from services.audit import audit_service, AuditAction
 
 router = APIRouter(prefix="/api/reports", tags=["reports"])
 
-@router.get("/invoices-csv")
+# Session lookup + invoices + vendors + audit entry (insert, commit)
+@router.get("/invoices-csv", dependencies=[Depends(query_budget(6))])
 async def export_invoices_csv(
     db: Session = Depends(get_db),
     user = Depends(require_user)
@@ -27,7 +29,8 @@ async def export_invoices_csv(
             raise HTTPException(status_code=403, detail="No vendor linked to account")
         query = query.filter(Invoice.vendor_id == vendor_id)
     
-    invoices = query.order_by(Invoice.created_at.desc()).all()
+    # Vendors in one extra SELECT ... IN, not one lazy load per row
+    invoices = query.options(selectinload(Invoice.vendor)).order_by(Invoice.created_at.desc()).all()
     
     # Format data for reporting service
     report_data = []
@@ -38,7 +41,7 @@ async def export_invoices_csv(
             "date": inv.invoice_date.strftime("%Y-%m-%d") if inv.invoice_date else "N/A",
             "vendor_name": inv.vendor.company_name if inv.vendor else "Unknown",
             "amount": float(inv.amount or 0),
-            "tax_amount": float(inv.tax_amount or 0),
+            "tax_amount": float(inv.effective_tax or 0),
             "status": inv.status.value.replace("_", " ").title() if hasattr(inv.status, 'value') else str(inv.status).replace("_", " ").title(),
             "is_handwritten": "Yes" if inv.is_handwritten else "No"
         })
@@ -1,16 +1,16 @@
-from fastapi import APIRouter, Depends, HTTPException, UploadFile, File, Form
-from fastapi.responses import FileResponse
-from sqlalchemy.orm import Session
+from fastapi import APIRouter, Depends, HTTPException, Request, UploadFile, File, Form
+from sqlalchemy.orm import Session, selectinload
 from typing import List, Optional
 import os
 import uuid
-import shutil
 from datetime import datetime
 
 from core.dependencies import get_db, require_admin, get_current_user
+from core.query_counter import query_budget
 from models.tax_document import VendorTaxDocument, TaxQuarter
 from models.vendor import Vendor
 from services.audit import audit_service, AuditAction
+from services.storage import storage_service
 
 router = APIRouter(prefix="/api/tax-docs", tags=["Tax Documents"])
 
@@ -32,6 +32,17 @@ async def upload_tax_document(
     if not file.filename.lower().endswith(".pdf"):
         raise HTTPException(status_code=400, detail="Only PDF files are allowed")
     
+    vendor, file_path = prepare_tax_document(db, vendor_id, financial_year, quarter)
+    
+    # Streamed to disk in chunks off the event loop
+    await storage_service.save_upload(file, UPLOAD_DIR, os.path.basename(file_path))
+    
+    create_tax_document(db, admin, vendor, file_path, financial_year, quarter, document_type, remarks)
+    
+    return {"success": True, "message": "Form 16A uploaded successfully"}
+
+def prepare_tax_document(db: Session, vendor_id: int, financial_year: str, quarter: str):
+    """Validate the target vendor and period. Returns (vendor, file_path to write)."""
     # Validate Vendor
     vendor = db.query(Vendor).filter(Vendor.id == vendor_id).first()
     if not vendor:
@@ -51,16 +62,16 @@ async def upload_tax_document(
     # Double check path traversal
     if not os.path.abspath(file_path).startswith(os.path.abspath(UPLOAD_DIR)):
          raise HTTPException(status_code=400, detail="Invalid file path")
-    
-    with open(file_path, "wb") as buffer:
-        shutil.copyfileobj(file.file, buffer)
-        
+    return vendor, file_path
+
+def create_tax_document(db: Session, admin: dict, vendor: Vendor, file_path: str, financial_year: str, quarter: str, document_type: str = "Form 16A", remarks: Optional[str] = None) -> VendorTaxDocument:
+    """Record an uploaded tax document (file already at `file_path`) and audit it."""
     # check for existing to avoid duplicates? Or allow overwrite/multiple?
     # Let's allow multiple for now, or maybe replace? 
     # Logic: If same vendor, year, quarter exists, maybe warn? For now, just add new.
 
     new_doc = VendorTaxDocument(
-        vendor_id=vendor_id,
+        vendor_id=vendor.id,
         file_path=file_path,
         financial_year=financial_year,
         quarter=quarter,
@@ -74,10 +85,10 @@ async def upload_tax_document(
     
     # Audit
     audit_service.log_action(db, admin["id"], AuditAction.UPDATE, new_doc.id, f"Uploaded Form 16A for Vendor {vendor.company_name} ({financial_year} {quarter})")
-    
-    return {"success": True, "message": "Form 16A uploaded successfully"}
+    return new_doc
 
-@router.get("/list")
+# Session lookup + documents + vendors
+@router.get("/list", dependencies=[Depends(query_budget(3))])
 async def list_tax_documents(
     vendor_id: Optional[int] = None,
     db: Session = Depends(get_db),
@@ -99,7 +110,7 @@ async def list_tax_documents(
         # Admin can filter by vendor
         query = query.filter(VendorTaxDocument.vendor_id == vendor_id)
         
-    docs = query.order_by(VendorTaxDocument.created_at.desc()).all()
+    docs = query.options(selectinload(VendorTaxDocument.vendor)).order_by(VendorTaxDocument.created_at.desc()).all()
     
     return [{
         "id": doc.id,
@@ -109,16 +120,27 @@ async def list_tax_documents(
         "document_type": doc.document_type,
         "remarks": doc.remarks,
         "uploaded_at": doc.created_at.strftime("%Y-%m-%d"),
-        "filename": os.path.basename(doc.file_path)
+        "filename": os.path.basename(doc.file_path),
+        "download_url": storage_service.signed_url(
+            user["id"], doc.file_path, filename=download_filename(doc), media_type="application/pdf"
+        )
     } for doc in docs]
 
+def download_filename(doc) -> str:
+    quarter = doc.quarter.value if hasattr(doc.quarter, "value") else doc.quarter
+    return f"Form16A_{doc.financial_year}_{quarter}.pdf"
+
 @router.get("/download/{doc_id}")
 async def download_tax_document(
     doc_id: int,
+    request: Request,
     db: Session = Depends(get_db),
     user = Depends(get_current_user)
 ):
-    doc = db.query(VendorTaxDocument).filter(VendorTaxDocument.id == doc_id).first()
+    doc = db.query(
+        VendorTaxDocument.vendor_id, VendorTaxDocument.file_path,
+        VendorTaxDocument.financial_year, VendorTaxDocument.quarter
+    ).filter(VendorTaxDocument.id == doc_id).first()
     if not doc:
         raise HTTPException(status_code=404, detail="Document not found")
         
@@ -126,11 +148,10 @@ async def download_tax_document(
     if user["role"] == "vendor" and doc.vendor_id != user["vendor_id"]:
         raise HTTPException(status_code=403, detail="Access Denied")
         
-    if not os.path.exists(doc.file_path):
-        raise HTTPException(status_code=404, detail="File not found on server")
-        
-    return FileResponse(
-        doc.file_path, 
-        media_type="application/pdf", 
-        filename=f"Form16A_{doc.financial_year}_{doc.quarter}.pdf"
+    return storage_service.file_response(
+        request,
+        doc.file_path,
+        storage_service.file_etag(doc.file_path),
+        media_type="application/pdf",
+        filename=download_filename(doc)
     )
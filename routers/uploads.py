@@ -0,0 +1,133 @@
+from fastapi import APIRouter, Depends, HTTPException, Request, Body
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+import os
+
+from core.config import settings
+from core.dependencies import get_async_db, get_current_user_async
+from routers.invoices import validate_file_extension, accept_invoice_file
+from routers.tax_documents import UPLOAD_DIR as TAX_DOC_DIR, prepare_tax_document, create_tax_document
+from services.storage import INVOICE_STORE
+from services.uploads import resumable_upload_service
+
+router = APIRouter(prefix="/api/uploads", tags=["uploads"])
+
+ADMIN_ROLES = ["admin", "superadmin", "finance"]
+
+def _session_info(upload, ranges) -> dict:
+    return {
+        "upload_id": upload.id,
+        "purpose": upload.purpose,
+        "filename": upload.filename,
+        "size": upload.size,
+        "received": ranges,
+        "complete": ranges == [[0, upload.size]],
+        "chunk_size": settings.UPLOAD_CHUNK_MB * 1024 * 1024,
+        "expires_at": upload.expires_at.isoformat()
+    }
+
+@router.post("/sessions")
+async def create_upload_session(
+    payload: dict = Body(...),
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
+):
+    """
+    Start a resumable upload. Body: purpose ("invoice" or "tax_doc"), filename, size,
+    optional file_hash (hex SHA-256, verified on finalize).
+    """
+    purpose = payload.get("purpose", "invoice")
+    filename = os.path.basename(str(payload.get("filename") or ""))
+    if purpose == "invoice":
+        validate_file_extension(filename)
+    elif purpose == "tax_doc":
+        if user["role"] not in ADMIN_ROLES:
+            raise HTTPException(status_code=403, detail="Forbidden: Admin access required")
+        if not filename.lower().endswith(".pdf"):
+            raise HTTPException(status_code=400, detail="Only PDF files are allowed")
+    else:
+        raise HTTPException(status_code=400, detail="purpose must be 'invoice' or 'tax_doc'")
+
+    try:
+        size = int(payload.get("size"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="size must be a number of bytes")
+
+    file_hash = payload.get("file_hash")
+    if file_hash is not None:
+        file_hash = str(file_hash).strip().lower()
+        if len(file_hash) != 64 or any(c not in "0123456789abcdef" for c in file_hash):
+            raise HTTPException(status_code=400, detail="file_hash must be a hex SHA-256 digest")
+
+    upload = await resumable_upload_service.create(db, user["id"], purpose, filename, size, file_hash)
+    return {"success": True, **_session_info(upload, [])}
+
+@router.put("/sessions/{upload_id}/chunks")
+async def put_upload_chunk(
+    upload_id: str,
+    offset: int,
+    request: Request,
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
+):
+    """Store the raw request body as the chunk starting at byte `offset`."""
+    upload = await resumable_upload_service.get_owned(db, upload_id, user["id"])
+    length = await resumable_upload_service.write_chunk(db, upload, offset, request.stream())
+    ranges = await resumable_upload_service.received_ranges(upload)
+    return {"success": True, "offset": offset, "length": length, **_session_info(upload, ranges)}
+
+@router.get("/sessions/{upload_id}")
+async def get_upload_session(
+    upload_id: str,
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
+):
+    """Received byte ranges, so a client can resume after a dropped connection."""
+    upload = await resumable_upload_service.get_owned(db, upload_id, user["id"])
+    ranges = await resumable_upload_service.received_ranges(upload)
+    return {"success": True, **_session_info(upload, ranges)}
+
+@router.post("/sessions/{upload_id}/finalize")
+async def finalize_upload_session(
+    upload_id: str,
+    payload: dict = Body(default={}),
+    db: AsyncSession = Depends(get_async_db),
+    user = Depends(get_current_user_async)
+):
+    """
+    Assemble and verify the file, then hand it to the regular creation flow:
+    - invoice: stored like /api/invoices/upload-file; submit the returned
+      file_path/file_hash to /api/invoices/submit-metadata
+    - tax_doc: body carries vendor_id, financial_year, quarter, document_type, remarks
+      and the document is created as by /api/tax-docs/upload
+    """
+    upload = await resumable_upload_service.get_owned(db, upload_id, user["id"])
+
+    if upload.purpose == "invoice":
+        file_ext = validate_file_extension(upload.filename)
+        staged = await resumable_upload_service.assemble(upload, INVOICE_STORE)
+        stored = await accept_invoice_file(db, staged, file_ext)
+        await resumable_upload_service.close(db, upload)
+        return {"success": True, "file_path": stored["file_path"], "file_hash": stored["file_hash"]}
+
+    # tax_doc
+    if user["role"] not in ADMIN_ROLES:
+        raise HTTPException(status_code=403, detail="Forbidden: Admin access required")
+    try:
+        vendor_id = int(payload.get("vendor_id"))
+    except (TypeError, ValueError):
+        raise HTTPException(status_code=400, detail="vendor_id is required")
+    financial_year = str(payload.get("financial_year") or "")
+    quarter = str(payload.get("quarter") or "")
+    if not financial_year or not quarter:
+        raise HTTPException(status_code=400, detail="financial_year and quarter are required")
+
+    vendor, file_path = await db.run_sync(prepare_tax_document, vendor_id, financial_year, quarter)
+    staged = await resumable_upload_service.assemble(upload, TAX_DOC_DIR)
+    await run_in_threadpool(os.replace, staged["tmp_path"], file_path)
+    await db.run_sync(
+        create_tax_document, user, vendor, file_path, financial_year, quarter,
+        payload.get("document_type") or "Form 16A", payload.get("remarks")
+    )
+    await resumable_upload_service.close(db, upload)
+    return {"success": True, "message": "Form 16A uploaded successfully"}
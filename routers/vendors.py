@@ -9,6 +9,7 @@ from datetime import datetime
 
 from core.config import TEMPLATES
 from core.dependencies import get_db, require_admin, get_current_user, require_user
+from core.data_version import data_etag
 from models.vendor import Vendor, VendorStatus
 from models.user import User
 from services.audit import audit_service, AuditAction
@@ -41,24 +42,34 @@ async def get_vendor_profile(db: Session = Depends(get_db), user = Depends(get_c
         "status": vendor.status
     }
 
-@router.get("/api/vendor/stats")
+@router.get("/api/vendor/stats", dependencies=[Depends(data_etag(require_user))])
 async def get_vendor_stats(db: Session = Depends(get_db), user = Depends(require_user)):
     """Get statistics for dashboard. Admins see global stats, vendors see their own."""
-    from models.invoice import Invoice, InvoiceStatus
-    from sqlalchemy import func
+    from models.invoice import InvoiceStatus
+    from models.invoice_rollup import InvoiceRollup
+    from sqlalchemy import func, case
     
     vendor_id = user.get("vendor_id")
     is_admin = user.get("role") in ["admin", "superadmin", "finance"]
     
-    query = db.query(Invoice)
+    # One pass over the rollup rows (vendors x statuses x types) instead of three invoice scans
+    query = db.query(
+        func.sum(InvoiceRollup.invoice_count),
+        func.sum(case(
+            (InvoiceRollup.status.in_([InvoiceStatus.PENDING.value, InvoiceStatus.UNDER_REVIEW.value]), InvoiceRollup.invoice_count),
+            else_=0
+        )),
+        func.sum(case((InvoiceRollup.status == InvoiceStatus.PAID.value, InvoiceRollup.base_amount), else_=0))
+    )
     if not is_admin:
         if not vendor_id:
              raise HTTPException(status_code=400, detail="No vendor linked to account")
-        query = query.filter(Invoice.vendor_id == vendor_id)
+        query = query.filter(InvoiceRollup.vendor_id == vendor_id)
     
-    total_invoices = query.count()
-    pending = query.filter(Invoice.status.in_([InvoiceStatus.PENDING, InvoiceStatus.UNDER_REVIEW])).count()
-    paid_amount = query.filter(Invoice.status == InvoiceStatus.PAID).with_entities(func.sum(Invoice.amount)).scalar() or 0.0
+    total_invoices, pending, paid_amount = query.one()
+    total_invoices = total_invoices or 0
+    pending = pending or 0
+    paid_amount = paid_amount or 0.0
     
     return {
         "success": True,
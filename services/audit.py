@@ -1,4 +1,5 @@
 from sqlalchemy.orm import Session
+from sqlalchemy.ext.asyncio import AsyncSession
 from models.audit import AuditLog, AuditAction
 
 import logging
@@ -34,4 +35,8 @@ class AuditService:
             logging.error(f"FAILED TO AUDIT LOG: {e}")
             # raise e # Suppress for now to keep flow running
 
+    async def log_action_async(self, db: AsyncSession, actor_id: int, action: str, invoice_id: int = None, comment: str = None):
+        """log_action for routes running on the async engine."""
+        return await db.run_sync(self.log_action, actor_id, action, invoice_id, comment)
+
 audit_service = AuditService()
@@ -1,67 +1,106 @@
+import asyncio
 import hashlib
 import secrets
-from typing import Dict, Optional
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, Optional, Tuple
 from datetime import datetime, timedelta
 
 class AuthService:
     def __init__(self):
         from passlib.context import CryptContext
-        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto")
+        from core.cache import TTLCache
+        from core.config import settings
+        # Hashes with a different cost are flagged by needs_update() and upgraded on login
+        self.pwd_context = CryptContext(schemes=["bcrypt"], deprecated="auto", bcrypt__rounds=settings.BCRYPT_ROUNDS)
+        # bcrypt releases the GIL, so a small thread pool keeps it off the event loop
+        self._hash_executor = ThreadPoolExecutor(max_workers=settings.PASSWORD_HASH_WORKERS, thread_name_prefix="pwhash")
+        # token hash -> user dict, so repeat API calls skip the sessions/users lookup
+        self.session_cache = TTLCache(
+            max_entries=settings.SESSION_CACHE_MAX_ENTRIES,
+            ttl_seconds=settings.SESSION_CACHE_TTL_SECONDS
+        )
     
     def _hash_password(self, password: str) -> str:
         return self.pwd_context.hash(password)
 
     def verify_password(self, plain_password: str, hashed_password: str) -> bool:
+        return self._verify_and_update(plain_password, hashed_password)[0]
+
+    def _verify_and_update(self, plain_password: str, hashed_password: str) -> Tuple[bool, Optional[str]]:
+        """Returns (is_valid, new_hash). new_hash is set when the stored hash should be replaced."""
         if not hashed_password: 
-            return False
+            return False, None
             
         # Standard Bcrypt Verify
         try:
-            return self.pwd_context.verify(plain_password, hashed_password)
+            return self.pwd_context.verify_and_update(plain_password, hashed_password)
         except Exception:
             # Fallback for simple hex-hashes during dev/test if needed
-            return plain_password == hashed_password
+            if plain_password == hashed_password:
+                return True, self._hash_password(plain_password)
+            return False, None
+
+    async def _run_in_hash_pool(self, fn, *args):
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(self._hash_executor, fn, *args)
+
+    async def hash_password(self, password: str) -> str:
+        """Hash a password in the worker pool instead of on the event loop."""
+        return await self._run_in_hash_pool(self._hash_password, password)
+
+    def _create_session(self, db, user) -> dict:
+        """Persist a new session for `user` and return the login payload."""
+        from models.session import Session as UserSession
+        from core.config import settings
+        
+        # Create session token
+        raw_token = secrets.token_urlsafe(32)
+        token_hash = hashlib.sha256(raw_token.encode()).hexdigest()
+        
+        vendor_id = user.vendor_id if user.role == "vendor" else None
+
+        # Store session in database (persistent)
+        expires_at = datetime.now() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
+        session_record = UserSession(
+            token=token_hash,
+            user_id=user.id,
+            vendor_id=vendor_id,
+            expires_at=expires_at
+        )
+        db.add(session_record)
+        db.commit()
+        
+        return {"token": raw_token, "id": user.id, "name": user.name, "role": user.role, "vendor_id": vendor_id}
     
-    def authenticate(self, email: str, password: str) -> Optional[dict]:
+    async def authenticate(self, email: str, password: str) -> Optional[dict]:
         """Verify credentials against DB and create persistent session."""
         from models.database import SessionLocal
         from models.user import User
-        from models.session import Session as UserSession
         
         email = email.lower().strip()
         db = SessionLocal()
         try:
             user = db.query(User).filter(User.email == email).first()
-            if not user or not self.verify_password(password, user.password_hash):
+            if not user:
+                return None
+            
+            valid, new_hash = await self._run_in_hash_pool(self._verify_and_update, password, user.password_hash)
+            if not valid:
                 return None
             
             if not user.is_active:
                 from core.error_handler import AuthenticationError
                 raise AuthenticationError("Account is pending admin approval")
             
-            # Create session token
-            raw_token = secrets.token_urlsafe(32)
-            token_hash = hashlib.sha256(raw_token.encode()).hexdigest()
-            from core.config import settings
+            # Transparently upgrade hashes made with a different bcrypt cost
+            if new_hash:
+                user.password_hash = new_hash
             
-            vendor_id = user.vendor_id if user.role == "vendor" else None
-
-            # Store session in database (persistent)
-            expires_at = datetime.now() + timedelta(minutes=settings.ACCESS_TOKEN_EXPIRE_MINUTES)
-            session_record = UserSession(
-                token=token_hash,
-                user_id=user.id,
-                vendor_id=vendor_id,
-                expires_at=expires_at
-            )
-            db.add(session_record)
-            db.commit()
-            
-            return {"token": raw_token, "id": user.id, "name": user.name, "role": user.role, "vendor_id": vendor_id}
+            return self._create_session(db, user)
         finally:
             db.close()
 
-    def register_vendor(self, data: dict) -> dict:
+    async def register_vendor(self, data: dict) -> dict:
         """Register a new vendor and associated user."""
         from models.database import SessionLocal
         from models.user import User
@@ -84,6 +123,9 @@ class AuthService:
             existing_user = db.query(User).filter(User.email == data['email']).first()
             if existing_user:
                 raise ValueError("Email already registered")
+            
+            # Hash before opening the write transaction so the DB isn't locked meanwhile
+            pwd_hash = await self.hash_password(data['password'])
                 
             # Create Vendor
             new_vendor = Vendor(
@@ -97,7 +139,6 @@ class AuthService:
             db.flush() # Get ID
             
             # Create User
-            pwd_hash = self._hash_password(data['password'])
             new_user = User(
                 email=data['email'],
                 name=data['contact_person'],
@@ -107,11 +148,10 @@ class AuthService:
                 is_active=True # Allow login but vendor status is pending
             )
             db.add(new_user)
-            db.commit()
-            db.refresh(new_user)
+            db.flush()
             
-            # Auto-login (create session)
-            return self.authenticate(data['email'], data['password'])
+            # Auto-login: the password was just hashed, no need to verify it again
+            return self._create_session(db, new_user)
             
         except Exception as e:
             db.rollback()
@@ -119,34 +159,82 @@ class AuthService:
         finally:
             db.close()
     
-    def validate_session(self, token: str) -> Optional[dict]:
-        """Check if session token is valid in database."""
-        from models.database import SessionLocal
+    @staticmethod
+    def _session_lookup(token_hash: str):
+        """Session and user in a single round trip (no row for a deactivated user)."""
+        from sqlalchemy import select
         from models.session import Session as UserSession
         from models.user import User
+        return select(
+            UserSession.expires_at,
+            UserSession.vendor_id,
+            User.id,
+            User.email,
+            User.name,
+            User.role
+        ).join(User, User.id == UserSession.user_id).where(
+            UserSession.token == token_hash,
+            User.is_active.is_(True)
+        )
+
+    def _session_user_from_row(self, token_hash: str, row) -> Optional[dict]:
+        if not row or datetime.now() > row.expires_at:
+            return None
+        
+        session_user = {
+            "id": row.id,
+            "email": row.email,
+            "name": row.name,
+            "role": row.role,
+            "vendor_id": row.vendor_id
+        }
+        # Never cache past the session's own expiry
+        remaining = (row.expires_at - datetime.now()).total_seconds()
+        self.session_cache.set(token_hash, session_user, ttl_seconds=remaining)
+        return dict(session_user)
+
+    def validate_session(self, token: str, db=None) -> Optional[dict]:
+        """
+        Check if session token is valid in database.
+        Pass the request's `db` to reuse its unit of work instead of opening a new Session.
+        """
+        from models.database import SessionLocal
         
         # Hash the incoming token to lookup
         token_hash = hashlib.sha256(token.encode()).hexdigest()
         
-        db = SessionLocal()
+        cached = self.session_cache.get(token_hash)
+        if cached is not None:
+            return dict(cached)
+        
+        owns_session = db is None
+        if owns_session:
+            db = SessionLocal()
         try:
-            session_record = db.query(UserSession).filter(UserSession.token == token_hash).first()
-            if not session_record or datetime.now() > session_record.expires_at:
-                return None
-            
-            user = db.query(User).filter(User.id == session_record.user_id).first()
-            if not user:
-                return None
-            
-            return {
-                "id": user.id,
-                "email": user.email,
-                "name": user.name,
-                "role": user.role,
-                "vendor_id": session_record.vendor_id
-            }
+            row = db.execute(self._session_lookup(token_hash)).first()
+            return self._session_user_from_row(token_hash, row)
         finally:
-            db.close()
+            if owns_session:
+                db.close()
+
+    async def validate_session_async(self, token: str, db) -> Optional[dict]:
+        """validate_session for routes running on the async engine (`db` is an AsyncSession)."""
+        token_hash = hashlib.sha256(token.encode()).hexdigest()
+        
+        cached = self.session_cache.get(token_hash)
+        if cached is not None:
+            return dict(cached)
+        
+        row = (await db.execute(self._session_lookup(token_hash))).first()
+        return self._session_user_from_row(token_hash, row)
+
+    def invalidate_user(self, user_id: int) -> int:
+        """Drop cached sessions for a user (e.g. after deactivation)."""
+        return self.session_cache.invalidate_where(lambda u: u["id"] == user_id)
+
+    def invalidate_vendor(self, vendor_id: int) -> int:
+        """Drop cached sessions of every user linked to a vendor."""
+        return self.session_cache.invalidate_where(lambda u: u.get("vendor_id") == vendor_id)
 
     def logout(self, token: str) -> bool:
         """Invalidate session by deleting from database."""
@@ -154,6 +242,7 @@ class AuthService:
         from models.session import Session as UserSession
         
         token_hash = hashlib.sha256(token.encode()).hexdigest()
+        self.session_cache.invalidate(token_hash)
         
         db = SessionLocal()
         try:
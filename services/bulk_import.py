@@ -0,0 +1,507 @@
+"""
+Bulk invoice import: a CSV/XLSX manifest (one row per invoice) plus a zip of the files.
+
+Manifest columns (header row, case-insensitive):
+  invoice_no, file, amount                       required; `file` names a member of the zip
+  invoice_date                                   DD-MM-YYYY or YYYY-MM-DD (default: today)
+  vendor_id                                      default: the vendor chosen for the import
+  tax_amount, taxable_value, non_taxable_value,
+  discount, cgst, sgst, igst                     default 0
+  category, description, document_type
+
+The archive is staged to disk and read member by member, so memory stays flat
+however large it is; what it expands to is capped per file and in total. Members
+are extracted and hashed by a thread pool, every row is checked against the
+hard-block rules with a few set-based queries
+(ValidationService.validate_invoices), and the accepted invoices are inserted in
+batches with their audit entries, blobs and rollups, in one transaction.
+"""
+import csv
+import hashlib
+import io
+import os
+import threading
+import uuid
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime
+from decimal import Decimal, InvalidOperation
+
+from fastapi import HTTPException
+from sqlalchemy import bindparam, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import Session
+
+from core.config import settings
+from core.data_version import mark_changed
+from core.error_handler import logger
+from models.audit import AuditLog, AuditAction
+from models.invoice import Invoice, InvoiceStatus, DocumentType, effective_tax
+from models.invoice_rollup import add_to_invoice_rollups
+from models.stored_file import StoredFile
+from models.user import User
+from models.vendor import Vendor
+from services.storage import storage_service, CHUNK_SIZE, INVOICE_STORE
+from services.validation import validation_service
+
+IMPORT_DIR = "uploads/imports"
+MANIFEST_TYPES = {"csv", "xlsx"}
+# Same file types as a single upload (routers.invoices.ALLOWED_EXTENSIONS)
+FILE_EXTENSIONS = {"pdf", "png", "jpg", "jpeg"}
+MONEY_FIELDS = ("tax_amount", "taxable_value", "non_taxable_value", "discount", "cgst", "sgst", "igst")
+LOOKUP_SIZE = 500
+
+# Columns written for an imported invoice, in COPY order
+INSERT_COLUMNS = (
+    "invoice_no", "document_type", "vendor_id", "amount", "tax_amount", "description", "category",
+    "invoice_date", "file_path", "status", "ocr_confidence", "is_handwritten", "file_hash",
+    "taxable_value", "non_taxable_value", "discount", "cgst", "sgst", "igst",
+    "effective_tax", "grand_total", "tds_amount", "created_at", "updated_at"
+)
+COPY_NULL = r"\N"
+
+
+def _chunks(items: list, size: int):
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _remove(path: str):
+    try:
+        os.remove(path)
+    except FileNotFoundError:
+        pass
+
+def _too_large() -> str:
+    return f"Archive files add up to more than {settings.BULK_IMPORT_MAX_EXTRACTED_MB} MB; split the import"
+
+class _ByteBudget:
+    """Bytes the extraction threads may still write between them."""
+
+    def __init__(self, limit: int):
+        self.left = limit
+        self.exceeded = False
+        self._lock = threading.Lock()
+
+    def take(self, size: int) -> bool:
+        with self._lock:
+            self.left -= size
+            if self.left < 0:
+                self.exceeded = True
+            return not self.exceeded
+
+def _text(value) -> str:
+    return "" if value is None else str(value).strip()
+
+def _money(value, field: str, required: bool = False) -> Decimal:
+    raw = _text(value).replace(",", "").replace("₹", "")
+    if not raw:
+        if required:
+            raise ValueError(f"{field} is required")
+        return Decimal("0.00")
+    try:
+        amount = Decimal(raw).quantize(Decimal("0.01"))
+    except InvalidOperation:
+        raise ValueError(f"{field} is not a number: {raw}")
+    if not amount.is_finite() or amount < 0:
+        raise ValueError(f"{field} must be a positive number")
+    return amount
+
+def _date(value) -> datetime:
+    if isinstance(value, datetime):
+        return value
+    raw = _text(value)
+    if not raw:
+        return datetime.now()
+    for fmt in ("%d-%m-%Y", "%Y-%m-%d"):
+        try:
+            return datetime.strptime(raw[:10], fmt)
+        except ValueError:
+            pass
+    raise ValueError(f"invoice_date is not DD-MM-YYYY or YYYY-MM-DD: {raw}")
+
+
+class BulkImportService:
+    """Manifest + zip imports. run() is synchronous; routes call it in the threadpool."""
+
+    # --- Manifest -----------------------------------------------------------
+
+    @staticmethod
+    def _manifest_rows(path: str, manifest_type: str):
+        """(spreadsheet row number, {column: value}) for every non-blank data row."""
+        if manifest_type == "xlsx":
+            try:
+                import openpyxl
+            except ImportError:
+                raise HTTPException(status_code=400, detail="XLSX manifests need openpyxl on the server; upload the manifest as CSV")
+            try:
+                workbook = openpyxl.load_workbook(path, read_only=True, data_only=True)
+            except Exception:
+                raise HTTPException(status_code=400, detail="Manifest is not a readable XLSX workbook")
+            try:
+                rows = workbook.active.iter_rows(values_only=True)
+                header = [_text(h).lower().replace(" ", "_") for h in next(rows, ())]
+                for number, values in enumerate(rows, start=2):
+                    if any(_text(v) for v in values):
+                        yield number, dict(zip(header, values))
+            finally:
+                workbook.close()
+            return
+
+        with open(path, newline="", encoding="utf-8-sig") as handle:
+            reader = csv.reader(handle)
+            header = [_text(h).lower().replace(" ", "_") for h in next(reader, [])]
+            for number, values in enumerate(reader, start=2):
+                if any(_text(v) for v in values):
+                    yield number, dict(zip(header, values))
+
+    @staticmethod
+    def _parse_row(raw: dict, default_vendor_id: int = None) -> dict:
+        """Manifest row -> invoice fields. Raises ValueError with the reason."""
+        invoice_no = _text(raw.get("invoice_no"))
+        if not invoice_no:
+            raise ValueError("invoice_no is required")
+        if len(invoice_no) > 50:
+            raise ValueError("invoice_no is longer than 50 characters")
+        file_name = _text(raw.get("file"))
+        if not file_name:
+            raise ValueError("file is required")
+
+        vendor_id = _text(raw.get("vendor_id")) or default_vendor_id
+        if not vendor_id:
+            raise ValueError("vendor_id is required (column or import vendor)")
+        try:
+            vendor_id = int(float(vendor_id))
+        except ValueError:
+            raise ValueError(f"vendor_id is not a number: {vendor_id}")
+
+        document_type = _text(raw.get("document_type")).lower()
+        fields = {
+            "invoice_no": invoice_no,
+            "file": file_name,
+            "vendor_id": vendor_id,
+            "amount": _money(raw.get("amount"), "amount", required=True),
+            "invoice_date": _date(raw.get("invoice_date")),
+            "category": _text(raw.get("category")) or "General",
+            "description": _text(raw.get("description")) or None,
+            "document_type": document_type if document_type in {d.value for d in DocumentType} else DocumentType.INVOICE.value,
+        }
+        for field in MONEY_FIELDS:
+            fields[field] = _money(raw.get(field), field)
+        return fields
+
+    # --- Archive ------------------------------------------------------------
+
+    @staticmethod
+    def _member_index(archive: zipfile.ZipFile) -> tuple:
+        """Members by full name, and by base name where that is unambiguous."""
+        by_name, by_base, ambiguous = {}, {}, set()
+        for info in archive.infolist():
+            if info.is_dir():
+                continue
+            by_name[info.filename] = info
+            base = os.path.basename(info.filename)
+            if base in by_base:
+                ambiguous.add(base)
+            by_base[base] = info
+        for base in ambiguous:
+            del by_base[base]
+        return by_name, by_base
+
+    @staticmethod
+    def _extract(archive: zipfile.ZipFile, info: zipfile.ZipInfo, max_bytes: int, budget: _ByteBudget) -> dict:
+        """Stream one member into a temp file in the invoice store, hashing on the way (like stage_upload)."""
+        os.makedirs(INVOICE_STORE, exist_ok=True)
+        tmp_path = os.path.join(INVOICE_STORE, f".{uuid.uuid4().hex}.part")
+        hasher = hashlib.sha256()
+        size = 0
+        try:
+            with archive.open(info) as source, open(tmp_path, "wb") as target:
+                while True:
+                    chunk = source.read(CHUNK_SIZE)
+                    if not chunk:
+                        break
+                    size += len(chunk)
+                    # The header's size can lie; count what actually comes out
+                    if size > max_bytes:
+                        raise ValueError(f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                    if not budget.take(len(chunk)):
+                        raise ValueError("Archive exceeds the extracted size limit")
+                    hasher.update(chunk)
+                    target.write(chunk)
+        except ValueError as e:
+            _remove(tmp_path)
+            return {"error": str(e)}
+        except (zipfile.BadZipFile, RuntimeError, NotImplementedError, OSError) as e:
+            # Corrupt (CRC), encrypted or unsupported-compression members
+            _remove(tmp_path)
+            return {"error": f"Cannot read {info.filename} from the archive: {e}"}
+        return {"tmp_path": tmp_path, "file_hash": hasher.hexdigest(), "size": size}
+
+    def _extract_all(self, archive_path: str, infos: list) -> list:
+        """
+        _extract every member on a thread pool, each thread reading through its own
+        ZipFile handle. Rejects the whole import once the members written add up to
+        more than BULK_IMPORT_MAX_EXTRACTED_MB.
+        """
+        max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+        budget = _ByteBudget(settings.BULK_IMPORT_MAX_EXTRACTED_MB * 1024 * 1024)
+        local = threading.local()
+        handles = []
+
+        def extract(info):
+            archive = getattr(local, "archive", None)
+            if archive is None:
+                archive = local.archive = zipfile.ZipFile(archive_path)
+                handles.append(archive)
+            return self._extract(archive, info, max_bytes, budget)
+
+        try:
+            with ThreadPoolExecutor(max_workers=max(1, settings.BULK_IMPORT_WORKERS), thread_name_prefix="bulk-import") as pool:
+                staged = list(pool.map(extract, infos))
+        finally:
+            for archive in handles:
+                archive.close()
+        if budget.exceeded:
+            for member in staged:
+                if "tmp_path" in member:
+                    _remove(member["tmp_path"])
+            raise HTTPException(status_code=400, detail=_too_large())
+        return staged
+
+    # --- Database -----------------------------------------------------------
+
+    @staticmethod
+    def _copy_invoices(connection, values: list):
+        """COPY ... FROM STDIN through psycopg2: one round trip and no per-row statement overhead."""
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        for row in values:
+            writer.writerow([COPY_NULL if row[column] is None else row[column] for column in INSERT_COLUMNS])
+        buffer.seek(0)
+        cursor = connection.connection.cursor()
+        try:
+            cursor.copy_expert(
+                f"COPY invoices ({', '.join(INSERT_COLUMNS)}) FROM STDIN WITH (FORMAT csv, NULL '{COPY_NULL}')",
+                buffer
+            )
+        finally:
+            cursor.close()
+
+    def _insert_invoices(self, db: Session, values: list) -> dict:
+        """Insert one batch; returns {invoice_no: id}."""
+        connection = db.connection()
+        if connection.dialect.name == "postgresql" and connection.dialect.driver == "psycopg2":
+            self._copy_invoices(connection, values)
+        else:
+            # executemany; Core insert skips the ORM flush (and its hooks), see run()
+            db.execute(insert(Invoice.__table__), values)
+        ids = {}
+        for chunk in _chunks([row["invoice_no"] for row in values], LOOKUP_SIZE):
+            ids.update(db.execute(select(Invoice.invoice_no, Invoice.id).where(Invoice.invoice_no.in_(chunk))).all())
+        return ids
+
+    def _record_blobs(self, db: Session, blobs: list, now: datetime):
+        """StoredFile rows for placed blobs: new rows, or one more reference on existing ones."""
+        existing = set()
+        for chunk in _chunks([blob["file_hash"] for blob in blobs], LOOKUP_SIZE):
+            existing.update(db.scalars(select(StoredFile.file_hash).where(StoredFile.file_hash.in_(chunk))))
+        new = [
+            {"file_hash": b["file_hash"], "file_path": b["file_path"], "size": b["size"], "ref_count": 1, "created_at": now}
+            for b in blobs if b["file_hash"] not in existing
+        ]
+        if new:
+            db.execute(insert(StoredFile.__table__), new)
+        if existing:
+            table = StoredFile.__table__
+            db.execute(
+                update(table).where(table.c.file_hash == bindparam("hash")).values(ref_count=table.c.ref_count + 1),
+                [{"hash": file_hash} for file_hash in existing]
+            )
+
+    # --- Pipeline -----------------------------------------------------------
+
+    def run(self, db: Session, user: dict, manifest_path: str, manifest_type: str, archive_path: str,
+            vendor_id: int = None, dry_run: bool = False) -> dict:
+        """
+        Import every valid manifest row. Rejected rows are reported and skipped; the
+        rest are committed together. With dry_run, rows are checked but nothing is written.
+        """
+        report = []
+        pending = []  # (report entry, parsed fields) still in the running
+
+        def reject(entry: dict, error: str):
+            entry.update(status="rejected", error=error)
+
+        for number, raw in self._manifest_rows(manifest_path, manifest_type):
+            if len(report) >= settings.BULK_IMPORT_MAX_ROWS:
+                raise HTTPException(status_code=400, detail=f"Manifest has more than {settings.BULK_IMPORT_MAX_ROWS} rows; split the import")
+            entry = {"row": number, "invoice_no": _text(raw.get("invoice_no")) or None, "file": _text(raw.get("file")) or None,
+                     "status": None, "error": None, "invoice_id": None}
+            report.append(entry)
+            try:
+                pending.append((entry, self._parse_row(raw, vendor_id)))
+            except ValueError as e:
+                reject(entry, str(e))
+        if not report:
+            raise HTTPException(status_code=400, detail="Manifest has no invoice rows")
+
+        # Unknown vendors
+        vendor_ids = sorted({fields["vendor_id"] for _, fields in pending})
+        known = set()
+        for chunk in _chunks(vendor_ids, LOOKUP_SIZE):
+            known.update(db.scalars(select(Vendor.id).where(Vendor.id.in_(chunk))))
+        for entry, fields in pending:
+            if fields["vendor_id"] not in known:
+                reject(entry, f"Unknown vendor_id {fields['vendor_id']}")
+        pending = [(entry, fields) for entry, fields in pending if entry["status"] is None]
+
+        # Match rows to archive members
+        try:
+            with zipfile.ZipFile(archive_path) as archive:
+                by_name, by_base = self._member_index(archive)
+        except zipfile.BadZipFile:
+            raise HTTPException(status_code=400, detail="Archive is not a valid zip file")
+        wanted = {}
+        for entry, fields in pending:
+            info = by_name.get(fields["file"]) or by_base.get(os.path.basename(fields["file"]))
+            if info is None:
+                reject(entry, f"File {fields['file']} is not in the archive")
+            elif "." not in info.filename or info.filename.rsplit(".", 1)[1].lower() not in FILE_EXTENSIONS:
+                reject(entry, f"File type not allowed. Allowed: {', '.join(sorted(FILE_EXTENSIONS))}")
+            else:
+                fields["member"] = info.filename
+                wanted[info.filename] = info
+        pending = [(entry, fields) for entry, fields in pending if entry["status"] is None]
+
+        # Extract and hash the referenced members, once each (refusing up front what the headers already give away)
+        names = sorted(wanted)
+        if sum(info.file_size for info in wanted.values()) > settings.BULK_IMPORT_MAX_EXTRACTED_MB * 1024 * 1024:
+            raise HTTPException(status_code=400, detail=_too_large())
+        staged = dict(zip(names, self._extract_all(archive_path, [wanted[name] for name in names])))
+        placed = []
+        try:
+            for entry, fields in pending:
+                member = staged[fields["member"]]
+                if "error" in member:
+                    reject(entry, member["error"])
+                else:
+                    fields["file_hash"] = member["file_hash"]
+            pending = [(entry, fields) for entry, fields in pending if entry["status"] is None]
+
+            # Hard-block rules for all rows at once
+            errors = validation_service.validate_invoices(db, [fields for _, fields in pending])
+            for (entry, _), error in zip(pending, errors):
+                if error:
+                    reject(entry, error)
+            accepted = [(entry, fields) for entry, fields in pending if entry["status"] is None]
+
+            if dry_run or not accepted:
+                for entry, _ in accepted:
+                    entry["status"] = "valid"
+            else:
+                placed = self._write(db, user, accepted, staged)
+        finally:
+            # Members no accepted row claimed (and everything on a dry run or failure)
+            claimed = {blob["tmp_path"] for blob in placed}
+            for member in staged.values():
+                if "tmp_path" in member and member["tmp_path"] not in claimed:
+                    _remove(member["tmp_path"])
+
+        imported = sum(1 for entry in report if entry["status"] == "imported")
+        rejected = sum(1 for entry in report if entry["status"] == "rejected")
+        if imported:
+            logger.info(f"Bulk import by user {user['id']}: {imported} imported, {rejected} rejected")
+        return {
+            "success": True,
+            "dry_run": dry_run,
+            "total": len(report),
+            "imported": imported,
+            "valid": sum(1 for entry in report if entry["status"] == "valid"),
+            "rejected": rejected,
+            "rows": report
+        }
+
+    def _write(self, db: Session, user: dict, accepted: list, staged: dict) -> list:
+        """Store the files and insert invoices, audit entries and rollups in one transaction. Returns the placed blobs."""
+        now = datetime.now()
+        actor = db.get(User, user["id"])
+        blobs = []
+        for _, fields in accepted:
+            member = staged[fields["member"]]
+            # One blob per accepted row: validation rejects a second row with the same file
+            blobs.append({**member, "ext": fields["member"].rsplit(".", 1)[-1].lower()})
+
+        # Blobs already in the store (e.g. uploaded but never submitted) keep their path
+        paths = {}
+        for chunk in _chunks([blob["file_hash"] for blob in blobs], LOOKUP_SIZE):
+            paths.update(db.execute(select(StoredFile.file_hash, StoredFile.file_path).where(StoredFile.file_hash.in_(chunk))).all())
+
+        created = []
+        try:
+            for blob in blobs:
+                stored = storage_service.place_staged_blob(blob, blob["ext"], paths.get(blob["file_hash"]))
+                blob["file_path"] = stored["file_path"]
+                if stored["created"]:
+                    created.append(stored["file_path"])
+            self._record_blobs(db, blobs, now)
+
+            rows = []
+            for (entry, fields), blob in zip(accepted, blobs):
+                tax = effective_tax(fields["tax_amount"], fields["cgst"], fields["sgst"], fields["igst"]).quantize(Decimal("0.01"))
+                rows.append({
+                    **{field: fields[field] for field in MONEY_FIELDS},
+                    "invoice_no": fields["invoice_no"],
+                    "document_type": fields["document_type"],
+                    "vendor_id": fields["vendor_id"],
+                    "amount": fields["amount"],
+                    "description": fields["description"],
+                    "category": fields["category"],
+                    "invoice_date": fields["invoice_date"],
+                    "file_path": blob["file_path"],
+                    "status": InvoiceStatus.PENDING.value,
+                    "ocr_confidence": Decimal("0.00"),
+                    "is_handwritten": 0,
+                    "file_hash": blob["file_hash"],
+                    # Stored totals, as set_invoice_totals would set them on a flush
+                    "effective_tax": tax,
+                    "grand_total": fields["amount"] + tax,
+                    "tds_amount": Decimal("0.00"),
+                    "created_at": now,
+                    "updated_at": now,
+                })
+
+            for batch in _chunks(list(zip(accepted, rows)), max(1, settings.BULK_IMPORT_BATCH_SIZE)):
+                ids = self._insert_invoices(db, [row for _, row in batch])
+                for (entry, _), row in batch:
+                    entry.update(status="imported", invoice_id=ids.get(row["invoice_no"]))
+                db.execute(insert(AuditLog.__table__), [{
+                    "action": AuditAction.INVOICE_UPLOAD.value,
+                    "invoice_id": ids.get(row["invoice_no"]),
+                    "actor_id": user["id"],
+                    "actor_name": actor.name if actor else "System",
+                    "actor_role": actor.role if actor else "System",
+                    "comment": f"Bulk imported Invoice {row['invoice_no']}",
+                    "timestamp": now,
+                } for _, row in batch])
+
+            # Core inserts bypass the flush hooks: fold the rollups in and bump the data version here
+            add_to_invoice_rollups(db.connection(), rows)
+            mark_changed(db)
+            db.commit()
+        except BaseException as e:
+            db.rollback()
+            for file_path in created:
+                _remove(file_path)
+            for entry, _ in accepted:
+                entry.update(status=None, invoice_id=None)
+            if isinstance(e, IntegrityError):
+                # Another upload took one of these numbers or files after validation
+                raise HTTPException(status_code=409, detail="An invoice in this import was uploaded elsewhere while it ran; nothing was imported, please retry")
+            raise
+
+        for row in rows:
+            validation_service.remember(vendor_id=row["vendor_id"], invoice_no=row["invoice_no"], amount=row["amount"], file_hash=row["file_hash"])
+        return blobs
+
+
+bulk_import_service = BulkImportService()
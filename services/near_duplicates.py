@@ -0,0 +1,323 @@
+"""
+Near-duplicate detection for invoice files: rescans, re-exports and re-saves of the
+same paper invoice have a different SHA-256, so the exact file_hash rule misses them.
+
+Every stored file gets a similarity fingerprint:
+  - image  PNG/JPG scans, and PDFs without a text layer (their first embedded image):
+           a 256-bit difference hash (dHash) of the page shrunk to 17x16 grey pixels.
+           Similar when at most IMAGE_MAX_DISTANCE bits differ.
+  - text   PDFs with a text layer: a MinHash of the normalized 5-word shingles of the
+           first pages. Similar when the estimated Jaccard similarity is TEXT_MIN_SIMILARITY or more.
+
+Fingerprints are split into bands and stored as (bucket, file) rows in
+fingerprint_bands, a locality-sensitive hash index: similar files land in at least
+one common bucket, so finding candidates is an index lookup on a handful of bucket
+keys whatever the size of the archive. Candidates are then verified against the
+full signature. Matches are recorded for the admin "possible duplicates" report and
+returned to the upload as a warning; they never block it.
+
+Pillow and pypdf are optional: without them the affected file types are not fingerprinted.
+"""
+import hashlib
+import random
+import re
+from typing import Optional
+
+from sqlalchemy import func, insert, select, or_
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.orm import Session, aliased
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from core.error_handler import logger
+from models.fingerprint import FileFingerprint, FingerprintBand, NearDuplicateMatch
+from models.invoice import Invoice
+from models.vendor import Vendor
+
+IMAGE_EXTENSIONS = {"png", "jpg", "jpeg"}
+
+# dHash: 16 rows x 16 horizontal gradients; 16 bands of 16 bits. Two hashes within
+# 15 bits share a band for certain (pigeonhole), farther ones usually still do.
+DHASH_SIZE = 16
+IMAGE_BANDS = 16
+IMAGE_MAX_DISTANCE = 24
+
+# MinHash: 128 permutations in 16 bands of 8 rows, so the candidate threshold
+# (1/16) ** (1/8) ~ 0.71 sits just under TEXT_MIN_SIMILARITY.
+SHINGLE_WORDS = 5
+MINHASH_PERMUTATIONS = 128
+TEXT_BANDS = 16
+TEXT_MIN_SIMILARITY = 0.8
+TEXT_MIN_WORDS = 20 # Fewer extracted words: treat the PDF as a scan
+PDF_MAX_PAGES = 3
+
+# Verified per lookup at most; the buckets of one fingerprint hold few files unless
+# the archive is full of copies of the same document
+MAX_CANDIDATES = 500
+
+_MERSENNE = (1 << 61) - 1
+_rng = random.Random(0x5EED) # Fixed: signatures must stay comparable across processes and restarts
+_PERMUTATIONS = [(_rng.randrange(1, _MERSENNE), _rng.randrange(0, _MERSENNE)) for _ in range(MINHASH_PERMUTATIONS)]
+_KIND_IDS = {"image": 1, "text": 2}
+_WORD = re.compile(r"[a-z0-9]+")
+
+
+def _h64(data: bytes) -> int:
+    return int.from_bytes(hashlib.blake2b(data, digest_size=8).digest(), "big")
+
+def _band_key(kind: str, band: int, value: int) -> int:
+    """kind (8 bits) | band (8 bits) | 48-bit bucket value, within a signed BIGINT."""
+    return (_KIND_IDS[kind] << 56) | (band << 48) | (value & ((1 << 48) - 1))
+
+
+class NearDuplicateService:
+
+    def __init__(self):
+        self._missing = set()
+
+    def _optional(self, module: str):
+        """Import an optional dependency, logging once when it is not installed."""
+        try:
+            return __import__(module)
+        except ImportError:
+            if module not in self._missing:
+                self._missing.add(module)
+                logger.warning(f"Near-duplicate detection: {module} is not installed, some files are not fingerprinted")
+            return None
+
+    # --- Fingerprints -------------------------------------------------------
+
+    @staticmethod
+    def _dhash(image) -> bytes:
+        from PIL import Image
+        grey = image.convert("L").resize((DHASH_SIZE + 1, DHASH_SIZE), Image.LANCZOS)
+        pixels = list(grey.getdata())
+        bits = 0
+        for row in range(DHASH_SIZE):
+            for col in range(DHASH_SIZE):
+                left = pixels[row * (DHASH_SIZE + 1) + col]
+                bits = (bits << 1) | (left > pixels[row * (DHASH_SIZE + 1) + col + 1])
+        return bits.to_bytes(DHASH_SIZE * DHASH_SIZE // 8, "big")
+
+    @staticmethod
+    def _minhash(text: str) -> Optional[bytes]:
+        words = _WORD.findall(text.lower())
+        if len(words) < TEXT_MIN_WORDS:
+            return None
+        shingles = {_h64(" ".join(words[i:i + SHINGLE_WORDS]).encode()) for i in range(len(words) - SHINGLE_WORDS + 1)}
+        signature = bytearray()
+        for a, b in _PERMUTATIONS:
+            signature += min((a * s + b) % _MERSENNE for s in shingles).to_bytes(8, "big")
+        return bytes(signature)
+
+    def fingerprint(self, file_path: str) -> Optional[tuple]:
+        """(kind, signature) of a stored file, or None when it cannot be fingerprinted. CPU-bound."""
+        ext = file_path.rsplit(".", 1)[-1].lower()
+        try:
+            if ext in IMAGE_EXTENSIONS:
+                if not self._optional("PIL"):
+                    return None
+                from PIL import Image
+                with Image.open(file_path) as image:
+                    # JPEG scans decode at 1/8 scale or less; the hash only needs 17x16 pixels
+                    image.draft("L", (DHASH_SIZE * 8, DHASH_SIZE * 8))
+                    return "image", self._dhash(image)
+
+            if ext == "pdf":
+                if not self._optional("pypdf"):
+                    return None
+                from pypdf import PdfReader
+                reader = PdfReader(file_path)
+                pages = reader.pages[:PDF_MAX_PAGES]
+                signature = self._minhash(" ".join(page.extract_text() or "" for page in pages))
+                if signature:
+                    return "text", signature
+                # No text layer: a scanned page, compare its image instead
+                if pages and self._optional("PIL"):
+                    images = list(pages[0].images)
+                    if images:
+                        largest = max(images, key=lambda img: len(img.data))
+                        return "image", self._dhash(largest.image)
+        except Exception as e:
+            # Corrupt or unusual files are stored anyway; they just get no fingerprint
+            logger.warning(f"Near-duplicate fingerprint failed for {file_path}: {e}")
+        return None
+
+    @staticmethod
+    def band_keys(kind: str, signature: bytes) -> list:
+        if kind == "image":
+            width = len(signature) // IMAGE_BANDS
+            return [_band_key(kind, band, int.from_bytes(signature[band * width:(band + 1) * width], "big"))
+                    for band in range(IMAGE_BANDS)]
+        width = len(signature) // TEXT_BANDS
+        return [_band_key(kind, band, _h64(signature[band * width:(band + 1) * width])) for band in range(TEXT_BANDS)]
+
+    @staticmethod
+    def similarity(kind: str, a: bytes, b: bytes) -> float:
+        """1 - Hamming distance / bits for images, share of equal MinHash values for text."""
+        if kind == "image":
+            distance = bin(int.from_bytes(a, "big") ^ int.from_bytes(b, "big")).count("1")
+            return 1 - distance / (len(a) * 8)
+        slots = len(a) // 8
+        return sum(a[i * 8:(i + 1) * 8] == b[i * 8:(i + 1) * 8] for i in range(slots)) / slots
+
+    @staticmethod
+    def is_match(kind: str, similarity: float) -> bool:
+        if kind == "image":
+            return similarity >= 1 - IMAGE_MAX_DISTANCE / (DHASH_SIZE * DHASH_SIZE)
+        return similarity >= TEXT_MIN_SIMILARITY
+
+    # --- Index --------------------------------------------------------------
+
+    def index(self, db: Session, file_hash: str, fingerprint: Optional[tuple]) -> list:
+        """
+        Add a file's fingerprint to the index (once per file_hash) and record the earlier
+        files it resembles. Returns [(match_hash, kind, similarity)], best first. Flushes only.
+        """
+        if not file_hash:
+            return []
+        if db.get(FileFingerprint, file_hash) is not None:
+            return self._recorded_matches(db, file_hash)
+        if not fingerprint:
+            return []
+
+        kind, signature = fingerprint
+        keys = self.band_keys(kind, signature)
+        candidates = select(FingerprintBand.file_hash).where(
+            FingerprintBand.band_key.in_(keys),
+            FingerprintBand.file_hash != file_hash
+        ).distinct().limit(MAX_CANDIDATES).subquery()
+        matches = []
+        for other_hash, other_kind, other_signature in db.execute(
+            select(FileFingerprint.file_hash, FileFingerprint.kind, FileFingerprint.signature)
+            .where(FileFingerprint.file_hash.in_(select(candidates.c.file_hash)))
+        ):
+            if other_kind != kind:
+                continue
+            score = self.similarity(kind, signature, other_signature)
+            if self.is_match(kind, score):
+                matches.append((other_hash, kind, round(score, 4)))
+        matches.sort(key=lambda m: -m[2])
+
+        db.add(FileFingerprint(file_hash=file_hash, kind=kind, signature=signature))
+        db.execute(insert(FingerprintBand), [{"band_key": key, "file_hash": file_hash} for key in sorted(set(keys))])
+        if matches:
+            db.execute(insert(NearDuplicateMatch), [
+                {"file_hash": file_hash, "match_hash": other_hash, "kind": kind, "similarity": score}
+                for other_hash, kind, score in matches
+            ])
+        db.flush()
+        return matches
+
+    @staticmethod
+    def _recorded_matches(db: Session, file_hash: str) -> list:
+        rows = db.execute(
+            select(NearDuplicateMatch.match_hash, NearDuplicateMatch.kind, NearDuplicateMatch.similarity)
+            .where(NearDuplicateMatch.file_hash == file_hash)
+            .order_by(NearDuplicateMatch.similarity.desc())
+        )
+        return [tuple(row) for row in rows]
+
+    def similar_invoices(self, db: Session, matches: list, exclude_invoice_id: int = None) -> list:
+        """Invoices using the matched files, for the upload warning."""
+        if not matches:
+            return []
+        scores = {match_hash: (kind, score) for match_hash, kind, score in matches}
+        query = select(Invoice.id, Invoice.invoice_no, Invoice.file_hash, Invoice.status, Vendor.company_name).join(
+            Vendor, Invoice.vendor_id == Vendor.id, isouter=True
+        ).where(Invoice.file_hash.in_(list(scores)))
+        if exclude_invoice_id:
+            query = query.where(Invoice.id != exclude_invoice_id)
+        result = [{
+            "invoice_id": row.id,
+            "invoice_no": row.invoice_no,
+            "vendor": row.company_name,
+            "status": row.status,
+            "kind": scores[row.file_hash][0],
+            "similarity": scores[row.file_hash][1],
+        } for row in db.execute(query)]
+        result.sort(key=lambda item: -item["similarity"])
+        return result
+
+    def check(self, db: Session, file_hash: str, fingerprint: Optional[tuple], invoice_id: int = None) -> list:
+        """index() + similar_invoices(), committing the new fingerprint."""
+        matches = self.index(db, file_hash, fingerprint)
+        db.commit()
+        return self.similar_invoices(db, matches, exclude_invoice_id=invoice_id)
+
+    async def check_async(self, db: AsyncSession, file_path: str, file_hash: str, invoice_id: int = None) -> list:
+        """
+        Fingerprint an uploaded file (in the threadpool) and return the invoices it resembles.
+        Never raises: detection failing must not fail the upload it only warns about.
+        """
+        if not settings.NEAR_DUPLICATES or not file_path or not file_hash:
+            return []
+        try:
+            fingerprint = None
+            # A blob shared with an earlier upload is fingerprinted already
+            if await db.get(FileFingerprint, file_hash) is None:
+                fingerprint = await run_in_threadpool(self.fingerprint, file_path)
+            return await db.run_sync(self.check, file_hash, fingerprint, invoice_id)
+        except Exception as e:
+            await db.rollback()
+            logger.warning(f"Near-duplicate check failed for {file_hash}: {e}")
+            return []
+
+    @staticmethod
+    def warning(similar: list) -> Optional[str]:
+        """Upload warning for the invoices returned by check_async()."""
+        if not similar:
+            return None
+        best = similar[0]
+        vendor = f" ({best['vendor']})" if best["vendor"] else ""
+        more = f" and {len(similar) - 1} more" if len(similar) > 1 else ""
+        return f"Possible duplicate: this file is {best['similarity']:.0%} similar to invoice {best['invoice_no']}{vendor}{more}. Please check before it is approved."
+
+    # --- Report -------------------------------------------------------------
+
+    def report(self, db: Session, limit: int = 100, min_similarity: float = 0.0, vendor_id: int = None) -> list:
+        """
+        Invoice pairs whose files were found similar, most recently detected first.
+        Each file stands for its first invoice, so a blob shared by several invoices
+        still gives one row per match.
+        """
+        new, earlier = aliased(Invoice), aliased(Invoice)
+        new_vendor, earlier_vendor = aliased(Vendor), aliased(Vendor)
+
+        def first_invoice(file_hash):
+            return select(func.min(Invoice.id)).where(Invoice.file_hash == file_hash).scalar_subquery()
+
+        query = (
+            select(NearDuplicateMatch, new, earlier, new_vendor.company_name, earlier_vendor.company_name)
+            .select_from(NearDuplicateMatch)
+            .join(new, new.id == first_invoice(NearDuplicateMatch.file_hash))
+            .join(earlier, earlier.id == first_invoice(NearDuplicateMatch.match_hash))
+            .join(new_vendor, new.vendor_id == new_vendor.id, isouter=True)
+            .join(earlier_vendor, earlier.vendor_id == earlier_vendor.id, isouter=True)
+            .where(NearDuplicateMatch.similarity >= min_similarity)
+            .order_by(NearDuplicateMatch.detected_at.desc(), NearDuplicateMatch.id.desc())
+            .limit(limit)
+        )
+        if vendor_id:
+            query = query.where(or_(new.vendor_id == vendor_id, earlier.vendor_id == vendor_id))
+
+        def side(inv: Invoice, vendor_name: str) -> dict:
+            return {
+                "id": inv.id,
+                "invoice_no": inv.invoice_no,
+                "vendor": vendor_name,
+                "amount": float(inv.amount or 0),
+                "invoice_date": inv.invoice_date.strftime("%Y-%m-%d") if inv.invoice_date else None,
+                "status": inv.status,
+            }
+
+        return [{
+            "kind": match.kind,
+            "similarity": match.similarity,
+            "detected_at": match.detected_at.isoformat() if match.detected_at else None,
+            "invoice": side(inv, inv_vendor),
+            "similar_to": side(other, other_vendor),
+        } for match, inv, other, inv_vendor, other_vendor in db.execute(query)]
+
+
+near_duplicate_service = NearDuplicateService()
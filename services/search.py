@@ -0,0 +1,151 @@
+from typing import Optional
+
+from sqlalchemy import Integer, bindparam, column, or_, select, text
+
+from core.error_handler import logger
+from models.invoice import Invoice
+from models.vendor import Vendor
+
+# SQLite: external-content FTS5 tables with the trigram tokenizer (substring, case-insensitive),
+# kept in sync with their base table by triggers
+FTS_TABLES = {
+    "invoice_fts": ("invoices", ["invoice_no", "payment_reference"]),
+    "vendor_fts": ("vendors", ["company_name", "gstin", "pan", "email"]),
+}
+
+# Vendor columns matched by invoice searches; the vendor directory also matches email
+VENDOR_SEARCH_COLUMNS = ["company_name", "gstin", "pan"]
+
+# PostgreSQL: pg_trgm GIN indexes, which serve ILIKE '%term%' directly
+TRGM_INDEXES = {
+    "ix_invoices_invoice_no_trgm": ("invoices", "invoice_no"),
+    "ix_invoices_payment_reference_trgm": ("invoices", "payment_reference"),
+    "ix_vendors_company_name_trgm": ("vendors", "company_name"),
+    "ix_vendors_gstin_trgm": ("vendors", "gstin"),
+    "ix_vendors_pan_trgm": ("vendors", "pan"),
+    "ix_vendors_email_trgm": ("vendors", "email"),
+}
+
+# Trigram indexes cannot answer shorter terms; those fall back to a scan
+MIN_INDEXED_TERM = 3
+
+
+class SearchIndexService:
+    """
+    Substring search over invoice numbers / UTRs and vendor names / GSTIN / PAN / email.
+    Same semantics as ILIKE '%term%', but answered from a trigram index:
+    FTS5 on SQLite, pg_trgm on PostgreSQL, plain ILIKE anywhere else.
+    """
+
+    def __init__(self):
+        self.fts_enabled = False
+
+    @staticmethod
+    def _triggers(fts: str, table: str, columns: list) -> list:
+        cols = ", ".join(columns)
+        new = ", ".join(f"new.{c}" for c in columns)
+        old = ", ".join(f"old.{c}" for c in columns)
+        return [
+            (f"{fts}_ai", f"CREATE TRIGGER IF NOT EXISTS {fts}_ai AFTER INSERT ON {table} BEGIN "
+                          f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"),
+            (f"{fts}_ad", f"CREATE TRIGGER IF NOT EXISTS {fts}_ad AFTER DELETE ON {table} BEGIN "
+                          f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); END"),
+            (f"{fts}_au", f"CREATE TRIGGER IF NOT EXISTS {fts}_au AFTER UPDATE OF {cols} ON {table} BEGIN "
+                          f"INSERT INTO {fts}({fts}, rowid, {cols}) VALUES ('delete', old.id, {old}); "
+                          f"INSERT INTO {fts}(rowid, {cols}) VALUES (new.id, {new}); END"),
+        ]
+
+    def install(self, connection) -> bool:
+        """
+        Create the search index for this database if missing (idempotent; run from init_db).
+        Returns True when an indexed search is available.
+        """
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            try:
+                for fts, (table, columns) in FTS_TABLES.items():
+                    triggers = self._triggers(fts, table, columns)
+                    present = connection.execute(text(
+                        "SELECT count(*) FROM sqlite_master WHERE type = 'trigger' AND name IN :names"
+                    ).bindparams(bindparam("names", expanding=True)), {"names": [name for name, _ in triggers]}).scalar()
+                    indexed = [row[1] for row in connection.execute(text(f"PRAGMA table_info({fts})"))]
+                    if indexed and indexed != columns:
+                        # Column set changed since it was created: drop it and index from scratch
+                        for name, _ in triggers:
+                            connection.execute(text(f"DROP TRIGGER IF EXISTS {name}"))
+                        connection.execute(text(f"DROP TABLE {fts}"))
+                    elif present == len(triggers):
+                        continue
+                    connection.execute(text(
+                        f"CREATE VIRTUAL TABLE IF NOT EXISTS {fts} USING fts5({', '.join(columns)}, "
+                        f"content='{table}', content_rowid='id', tokenize='trigram case_sensitive 0')"
+                    ))
+                    for _, ddl in triggers:
+                        connection.execute(text(ddl))
+                    # Index whatever was written while the triggers were missing
+                    connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+                self.fts_enabled = True
+            except Exception as e:
+                # e.g. an SQLite build without FTS5 / the trigram tokenizer (< 3.34)
+                logger.warning(f"Search index unavailable, falling back to ILIKE scans: {e}")
+                self.fts_enabled = False
+            return self.fts_enabled
+
+        if dialect == "postgresql":
+            try:
+                connection.execute(text("CREATE EXTENSION IF NOT EXISTS pg_trgm"))
+                for name, (table, col) in TRGM_INDEXES.items():
+                    connection.execute(text(f"CREATE INDEX IF NOT EXISTS {name} ON {table} USING gin ({col} gin_trgm_ops)"))
+                return True
+            except Exception as e:
+                logger.warning(f"pg_trgm indexes unavailable, searches will scan: {e}")
+        return False
+
+    def rebuild(self, connection):
+        """Rebuild the index from the base tables (after bulk edits outside the app, restores, ...)."""
+        dialect = connection.dialect.name
+        if dialect == "sqlite":
+            for fts in FTS_TABLES:
+                connection.execute(text(f"INSERT INTO {fts}({fts}) VALUES ('rebuild')"))
+        elif dialect == "postgresql":
+            for name in TRGM_INDEXES:
+                connection.execute(text(f"REINDEX INDEX {name}"))
+
+    def _fts_ids(self, fts: str, term: str, columns: Optional[list] = None):
+        """
+        SELECT rowid FROM <fts> WHERE <fts> MATCH '"term"' (a phrase, i.e. a substring),
+        optionally only in the given columns.
+        """
+        phrase = '"' + term.replace('"', '""') + '"'
+        if columns:
+            phrase = "{" + " ".join(columns) + "} : " + phrase
+        return text(f"SELECT rowid FROM {fts} WHERE {fts} MATCH :{fts}_q").bindparams(
+            **{f"{fts}_q": phrase}
+        ).columns(column("rowid", Integer))
+
+    def _use_fts(self, dialect: str, term: str) -> bool:
+        return self.fts_enabled and dialect == "sqlite" and len(term) >= MIN_INDEXED_TERM
+
+    def invoice_filter(self, dialect: str, term: str):
+        """WHERE clause for invoices whose number or payment reference (UTR) contains `term`."""
+        term = term.strip()
+        if self._use_fts(dialect, term):
+            return Invoice.id.in_(self._fts_ids("invoice_fts", term))
+        pattern = f"%{term}%"
+        return or_(Invoice.invoice_no.ilike(pattern), Invoice.payment_reference.ilike(pattern))
+
+    def vendor_filter(self, dialect: str, term: str, email: bool = False):
+        """WHERE clause for vendors whose name, GSTIN or PAN (or, with `email`, email) contains `term`."""
+        term = term.strip()
+        columns = VENDOR_SEARCH_COLUMNS + ["email"] if email else VENDOR_SEARCH_COLUMNS
+        if self._use_fts(dialect, term):
+            return Vendor.id.in_(self._fts_ids("vendor_fts", term, columns))
+        pattern = f"%{term}%"
+        return or_(*(getattr(Vendor, c).ilike(pattern) for c in columns))
+
+    def invoice_vendor_filter(self, dialect: str, term: str):
+        """WHERE clause for invoices of vendors matching `term`, without joining vendors."""
+        return Invoice.vendor_id.in_(select(Vendor.id).where(self.vendor_filter(dialect, term)))
+
+
+search_index = SearchIndexService()
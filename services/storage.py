@@ -0,0 +1,272 @@
+import hashlib
+import mimetypes
+import os
+import uuid
+from datetime import datetime, timedelta
+from typing import Optional
+
+from fastapi import HTTPException, Request, UploadFile
+from fastapi.responses import FileResponse, Response
+from sqlalchemy import delete, exists, insert, select, update
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+
+CHUNK_SIZE = 1024 * 1024  # 1 MB
+INVOICE_STORE = "uploads/invoices"
+UPLOAD_ROOT = "uploads"
+
+
+class StorageService:
+    """
+    Streams uploads to disk in fixed-size chunks, hashing as it goes.
+    Disk I/O runs in the threadpool so large scans never block the event loop,
+    and peak memory stays at one chunk regardless of file size.
+
+    Invoice files are content-addressed: a blob lives at
+    uploads/invoices/ab/cd/<sha256>.<ext>, is stored once however many times it is
+    uploaded, and is tracked by a StoredFile row with a reference count; unreferenced
+    blobs are swept by purge_orphans().
+    """
+
+    @staticmethod
+    def _write_chunk(buffer, hasher, chunk: bytes):
+        hasher.update(chunk)
+        buffer.write(chunk)
+
+    @staticmethod
+    def _discard(path: str):
+        try:
+            os.remove(path)
+        except FileNotFoundError:
+            pass
+
+    @staticmethod
+    def blob_path(file_hash: str, ext: str, root: str = INVOICE_STORE) -> str:
+        """Fan-out location of a blob, e.g. uploads/invoices/ab/cd/abcd...ef.pdf"""
+        return os.path.join(root, file_hash[:2], file_hash[2:4], f"{file_hash}.{ext}")
+
+    async def stage_upload(self, upload: UploadFile, dest_dir: str, max_bytes: int = None) -> dict:
+        """
+        Stream `upload` into a temp file under dest_dir, enforcing `max_bytes` mid-stream.
+        Returns {"tmp_path", "file_hash", "size"}; the caller must place or discard it.
+        """
+        max_bytes = max_bytes or settings.MAX_UPLOAD_MB * 1024 * 1024
+        os.makedirs(dest_dir, exist_ok=True)
+        tmp_path = os.path.join(dest_dir, f".{uuid.uuid4().hex}.part")
+
+        hasher = hashlib.sha256()
+        size = 0
+        buffer = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            while True:
+                chunk = await upload.read(CHUNK_SIZE)
+                if not chunk:
+                    break
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File exceeds the {max_bytes // (1024 * 1024)} MB upload limit")
+                await run_in_threadpool(self._write_chunk, buffer, hasher, chunk)
+        except BaseException:
+            await run_in_threadpool(buffer.close)
+            await run_in_threadpool(self._discard, tmp_path)
+            raise
+        await run_in_threadpool(buffer.close)
+        return {"tmp_path": tmp_path, "file_hash": hasher.hexdigest(), "size": size}
+
+    async def discard(self, staged: dict):
+        """Drop a staged upload that was rejected."""
+        await run_in_threadpool(self._discard, staged["tmp_path"])
+
+    async def save_upload(self, upload: UploadFile, dest_dir: str, filename: str, max_bytes: int = None) -> dict:
+        """
+        Save `upload` as dest_dir/filename. The bytes go to a temp file first and are
+        renamed into place only once the whole stream was read and is within `max_bytes`.
+        Returns {"file_path", "file_hash", "size"}.
+        """
+        staged = await self.stage_upload(upload, dest_dir, max_bytes)
+        file_path = os.path.join(dest_dir, filename)
+        # Atomic on the same filesystem: readers never see a half-written file
+        await run_in_threadpool(os.replace, staged["tmp_path"], file_path)
+        return {"file_path": file_path, "file_hash": staged["file_hash"], "size": staged["size"]}
+
+    @staticmethod
+    def _place_blob(tmp_path: str, file_path: str) -> bool:
+        """Move a staged file to its blob path. Returns False if the blob was already on disk."""
+        if os.path.exists(file_path):
+            os.remove(tmp_path)
+            return False
+        os.makedirs(os.path.dirname(file_path), exist_ok=True)
+        os.replace(tmp_path, file_path)
+        return True
+
+    def place_staged_blob(self, staged: dict, ext: str, file_path: str = None) -> dict:
+        """
+        store_blob's file step for callers already off the event loop (bulk import):
+        move a staged file to `file_path` (default: its blob path). The caller records
+        the StoredFile row. Returns {"file_path", "file_hash", "created"}.
+        """
+        file_path = file_path or self.blob_path(staged["file_hash"], ext)
+        created = self._place_blob(staged["tmp_path"], file_path)
+        return {"file_path": file_path, "file_hash": staged["file_hash"], "created": created}
+
+    @staticmethod
+    async def _record_blob(db: AsyncSession, values: dict):
+        """INSERT the StoredFile row unless another transaction already recorded this hash."""
+        from models.stored_file import StoredFile
+
+        dialect = db.bind.dialect.name
+        if dialect in ("sqlite", "postgresql"):
+            if dialect == "sqlite":
+                from sqlalchemy.dialects.sqlite import insert as upsert
+            else:
+                from sqlalchemy.dialects.postgresql import insert as upsert
+            await db.execute(upsert(StoredFile).values(**values).on_conflict_do_nothing(index_elements=["file_hash"]))
+            return
+        try:
+            async with db.begin_nested():
+                await db.execute(insert(StoredFile).values(**values))
+        except IntegrityError:
+            pass
+
+    @staticmethod
+    async def _add_reference(db: AsyncSession, file_hash: str) -> bool:
+        """ref_count + 1 in SQL, so concurrent claims add up. False if the blob is unknown."""
+        from models.stored_file import StoredFile
+
+        result = await db.execute(
+            update(StoredFile).where(StoredFile.file_hash == file_hash).values(ref_count=StoredFile.ref_count + 1)
+        )
+        return result.rowcount > 0
+
+    async def store_blob(self, db: AsyncSession, staged: dict, ext: str, claim: bool = True) -> dict:
+        """
+        Place a staged upload in the content-addressed store and record it.
+        With `claim`, the blob's reference count is incremented in the caller's
+        transaction, so it is only counted once the referencing invoice commits.
+        Unclaimed blobs are removed by purge_orphans() once they are old enough.
+        Returns {"file_path", "file_hash", "created"}; `created` is True when this call
+        wrote the blob, so a failed insert can remove it again with discard_blob().
+        """
+        from models.stored_file import StoredFile
+
+        file_hash = staged["file_hash"]
+        recorded = select(StoredFile.file_path).where(StoredFile.file_hash == file_hash)
+        file_path = await db.scalar(recorded) or self.blob_path(file_hash, ext)
+        created = await run_in_threadpool(self._place_blob, staged["tmp_path"], file_path)
+
+        await self._record_blob(db, {"file_hash": file_hash, "file_path": file_path, "size": staged["size"], "ref_count": 0})
+        winner = await db.scalar(recorded)
+        if winner != file_path:
+            # A concurrent upload of the same content (other extension) recorded its path first
+            if created:
+                await run_in_threadpool(self._discard, file_path)
+            file_path, created = winner, False
+        if claim:
+            await self._add_reference(db, file_hash)
+        return {"file_path": file_path, "file_hash": file_hash, "created": created}
+
+    async def claim_blob(self, db: AsyncSession, file_hash: str):
+        """Add a reference to an already stored blob. Returns the StoredFile, or None if unknown."""
+        from models.stored_file import StoredFile
+
+        if not file_hash or not await self._add_reference(db, file_hash):
+            return None
+        return await db.get(StoredFile, file_hash)
+
+    async def purge_orphans(self, db: AsyncSession, older_than_hours: int = None) -> int:
+        """
+        Remove blobs no invoice references: uploads never claimed by a submit-metadata
+        call, and blobs of deleted invoices. Only blobs older than `older_than_hours`
+        (default: the upload session TTL) go, so a pending submission keeps its file.
+        """
+        from models.invoice import Invoice
+        from models.stored_file import StoredFile
+
+        if older_than_hours is None:
+            older_than_hours = settings.UPLOAD_SESSION_TTL_HOURS
+        cutoff = datetime.now() - timedelta(hours=older_than_hours)
+        orphans = (await db.execute(select(StoredFile.file_hash, StoredFile.file_path).where(
+            StoredFile.ref_count <= 0,
+            StoredFile.created_at < cutoff,
+            ~exists().where(Invoice.file_hash == StoredFile.file_hash)
+        ))).all()
+        removed = []
+        for file_hash, file_path in orphans:
+            # Skips blobs claimed since the SELECT
+            result = await db.execute(delete(StoredFile).where(StoredFile.file_hash == file_hash, StoredFile.ref_count <= 0))
+            if result.rowcount:
+                removed.append(file_path)
+        await db.commit()
+        # Files go only after the rows are gone for good
+        for file_path in removed:
+            await run_in_threadpool(self._discard, file_path)
+        return len(removed)
+
+    async def discard_blob(self, stored: dict):
+        """Remove a blob written by store_blob() whose referencing insert failed."""
+        if stored.get("created"):
+            await run_in_threadpool(self._discard, stored["file_path"])
+
+    @staticmethod
+    def _etag_matches(request: Request, etag: str) -> bool:
+        if_none_match = request.headers.get("if-none-match")
+        if not if_none_match:
+            return False
+        tags = [t.strip() for t in if_none_match.split(",")]
+        # Weak comparison, as RFC 9110 requires for If-None-Match
+        return "*" in tags or etag in (t[2:] if t.startswith("W/") else t for t in tags)
+
+    @staticmethod
+    def file_etag(file_path: str, file_hash: str = None) -> str:
+        """
+        Strong validator for a stored file. Files are never rewritten in place, so the
+        content hash (or, for files stored without one, the unique path) identifies the bytes.
+        """
+        return file_hash or hashlib.sha256(file_path.encode()).hexdigest()
+
+    def signed_url(self, user_id: int, file_path: str, file_hash: str = None, filename: str = None, media_type: str = None) -> Optional[str]:
+        """Short-lived URL that serves `file_path` without an Authorization header or DB lookup."""
+        from core.security import sign_file_token
+
+        if not file_path:
+            return None
+        token = sign_file_token(file_path, user_id, self.file_etag(file_path, file_hash), filename, media_type)
+        return f"/api/files/{token}"
+
+    def file_response(self, request: Request, file_path: str, etag: str, media_type: str = None, filename: str = None) -> Response:
+        """
+        Serve a stored file with a strong ETag and private caching.
+        - If-None-Match hit: 304 without touching the disk
+        - Range / If-Range: partial content (handled by FileResponse)
+        - FILE_OFFLOAD set: headers only, the front proxy sends the bytes
+        `etag` must change whenever the file content can, e.g. the SHA-256 of a blob.
+        """
+        etag = f'"{etag}"'
+        headers = {
+            "ETag": etag,
+            "Cache-Control": f"private, max-age={settings.FILE_CACHE_MAX_AGE}"
+        }
+        if self._etag_matches(request, etag):
+            return Response(status_code=304, headers=headers)
+
+        if not os.path.isfile(file_path):
+            raise HTTPException(status_code=404, detail="File not found on server")
+
+        offload = (settings.FILE_OFFLOAD or "").lower()
+        if offload in ("x-accel-redirect", "x-sendfile"):
+            if filename:
+                headers["Content-Disposition"] = f'attachment; filename="{filename}"'
+            if offload == "x-accel-redirect":
+                relative = os.path.relpath(os.path.abspath(file_path), os.path.abspath(UPLOAD_ROOT))
+                headers["X-Accel-Redirect"] = settings.FILE_OFFLOAD_PREFIX.rstrip("/") + "/" + relative.replace(os.sep, "/")
+            else:
+                headers["X-Sendfile"] = os.path.abspath(file_path)
+            return Response(media_type=media_type or mimetypes.guess_type(file_path)[0] or "application/octet-stream", headers=headers)
+
+        return FileResponse(file_path, media_type=media_type, filename=filename, headers=headers)
+
+
+storage_service = StorageService()
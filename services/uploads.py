@@ -0,0 +1,181 @@
+import hashlib
+import os
+import shutil
+import uuid
+from datetime import datetime, timedelta
+from typing import AsyncIterator, List, Tuple
+
+from fastapi import HTTPException
+from sqlalchemy import func, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from starlette.concurrency import run_in_threadpool
+
+from core.config import settings
+from models.upload_session import UploadSession
+from services.storage import CHUNK_SIZE
+
+PARTIAL_DIR = "uploads/partial"
+
+
+class ResumableUploadService:
+    """
+    Resumable uploads: the client creates a session, PUTs chunks at byte offsets
+    (in any order, retrying as needed), asks which ranges arrived, then finalizes.
+    Each chunk is stored as uploads/partial/<session id>/<offset>.chunk, so a
+    dropped connection only costs the chunk in flight. Offsets are multiples of
+    the chunk size, so chunks never overlap and a session stores at most its
+    declared size on disk.
+    """
+
+    @staticmethod
+    def session_dir(upload_id: str) -> str:
+        return os.path.join(PARTIAL_DIR, upload_id)
+
+    @staticmethod
+    def _expiry() -> datetime:
+        return datetime.now() + timedelta(hours=settings.UPLOAD_SESSION_TTL_HOURS)
+
+    async def create(self, db: AsyncSession, user_id: int, purpose: str, filename: str, size: int, file_hash: str = None) -> UploadSession:
+        max_bytes = settings.MAX_UPLOAD_MB * 1024 * 1024
+        if size <= 0 or size > max_bytes:
+            raise HTTPException(status_code=413 if size > 0 else 400, detail=f"File size must be between 1 byte and {settings.MAX_UPLOAD_MB} MB")
+
+        open_sessions = await db.scalar(select(func.count()).select_from(UploadSession).where(
+            UploadSession.user_id == user_id, UploadSession.expires_at >= datetime.now()
+        ))
+        if open_sessions >= settings.UPLOAD_MAX_SESSIONS_PER_USER:
+            raise HTTPException(status_code=429, detail=f"At most {settings.UPLOAD_MAX_SESSIONS_PER_USER} unfinished uploads at a time; finish or wait for one to expire")
+
+        upload = UploadSession(
+            id=uuid.uuid4().hex,
+            user_id=user_id,
+            purpose=purpose,
+            filename=filename,
+            size=size,
+            file_hash=file_hash,
+            expires_at=self._expiry()
+        )
+        await run_in_threadpool(os.makedirs, self.session_dir(upload.id), exist_ok=True)
+        db.add(upload)
+        await db.commit()
+        return upload
+
+    async def get_owned(self, db: AsyncSession, upload_id: str, user_id: int) -> UploadSession:
+        """Load a live session belonging to `user_id`, or raise 404."""
+        upload = await db.get(UploadSession, upload_id)
+        if not upload or upload.user_id != user_id or upload.expires_at < datetime.now():
+            raise HTTPException(status_code=404, detail="Upload session not found or expired")
+        return upload
+
+    async def write_chunk(self, db: AsyncSession, upload: UploadSession, offset: int, body: AsyncIterator[bytes]) -> int:
+        """
+        Stream one chunk to disk at `offset`, a multiple of the chunk size.
+        Re-sending an offset replaces that chunk.
+        """
+        max_chunk = settings.UPLOAD_CHUNK_MB * 1024 * 1024
+        if offset < 0 or offset >= upload.size:
+            raise HTTPException(status_code=416, detail="Offset outside the declared file size")
+        if offset % max_chunk:
+            raise HTTPException(status_code=416, detail=f"Offset must be a multiple of the chunk size ({max_chunk} bytes)")
+
+        chunk_dir = self.session_dir(upload.id)
+        tmp_path = os.path.join(chunk_dir, f".{uuid.uuid4().hex}.part")
+        length = 0
+        buffer = await run_in_threadpool(open, tmp_path, "wb")
+        try:
+            async for data in body:
+                length += len(data)
+                if length > max_chunk or offset + length > upload.size:
+                    raise HTTPException(status_code=413, detail=f"Chunk exceeds {settings.UPLOAD_CHUNK_MB} MB or the declared file size")
+                await run_in_threadpool(buffer.write, data)
+        except BaseException:
+            await run_in_threadpool(buffer.close)
+            await run_in_threadpool(os.remove, tmp_path)
+            raise
+        await run_in_threadpool(buffer.close)
+        if length == 0:
+            await run_in_threadpool(os.remove, tmp_path)
+            raise HTTPException(status_code=400, detail="Empty chunk")
+
+        await run_in_threadpool(os.replace, tmp_path, os.path.join(chunk_dir, f"{offset}.chunk"))
+
+        # Sliding expiry: a session stays alive while chunks keep arriving
+        upload.expires_at = self._expiry()
+        await db.commit()
+        return length
+
+    @staticmethod
+    def _chunks(chunk_dir: str) -> List[Tuple[int, int]]:
+        """(offset, length) of every stored chunk, sorted by offset."""
+        chunks = []
+        for name in os.listdir(chunk_dir):
+            if name.endswith(".chunk"):
+                chunks.append((int(name[:-len(".chunk")]), os.path.getsize(os.path.join(chunk_dir, name))))
+        return sorted(chunks)
+
+    async def received_ranges(self, upload: UploadSession) -> List[List[int]]:
+        """Merged [start, end) byte ranges received so far."""
+        chunks = await run_in_threadpool(self._chunks, self.session_dir(upload.id))
+        ranges = []
+        for offset, length in chunks:
+            if ranges and offset <= ranges[-1][1]:
+                ranges[-1][1] = max(ranges[-1][1], offset + length)
+            else:
+                ranges.append([offset, offset + length])
+        return ranges
+
+    def _assemble(self, upload: UploadSession, dest_dir: str) -> dict:
+        """Concatenate the chunks into a staged file under dest_dir, hashing on the way."""
+        chunk_dir = self.session_dir(upload.id)
+        os.makedirs(dest_dir, exist_ok=True)
+        tmp_path = os.path.join(dest_dir, f".{uuid.uuid4().hex}.part")
+        hasher = hashlib.sha256()
+        position = 0
+        try:
+            with open(tmp_path, "wb") as out:
+                for offset, length in self._chunks(chunk_dir):
+                    if offset > position:
+                        break  # gap, reported below
+                    if offset + length <= position:
+                        continue  # fully covered by earlier chunks
+                    with open(os.path.join(chunk_dir, f"{offset}.chunk"), "rb") as chunk:
+                        chunk.seek(position - offset)
+                        for data in iter(lambda: chunk.read(CHUNK_SIZE), b""):
+                            hasher.update(data)
+                            out.write(data)
+                    position = offset + length
+            if position != upload.size:
+                raise HTTPException(status_code=409, detail=f"Upload incomplete: {position} of {upload.size} bytes contiguous")
+            file_hash = hasher.hexdigest()
+            if upload.file_hash and upload.file_hash.lower() != file_hash:
+                raise HTTPException(status_code=422, detail="SHA-256 of the received file does not match the declared hash")
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+        return {"tmp_path": tmp_path, "file_hash": file_hash, "size": position}
+
+    async def assemble(self, upload: UploadSession, dest_dir: str) -> dict:
+        """
+        Build the final file from the received chunks and verify size and SHA-256.
+        Returns a staged upload ({"tmp_path", "file_hash", "size"}) for StorageService.
+        """
+        return await run_in_threadpool(self._assemble, upload, dest_dir)
+
+    async def close(self, db: AsyncSession, upload: UploadSession):
+        """Delete a finished session and its chunks."""
+        await run_in_threadpool(shutil.rmtree, self.session_dir(upload.id), True)
+        await db.delete(upload)
+        await db.commit()
+
+    async def purge_expired(self, db: AsyncSession) -> int:
+        """Remove sessions (and their chunks) that stopped receiving data before expiring."""
+        expired = (await db.scalars(select(UploadSession).where(UploadSession.expires_at < datetime.now()))).all()
+        for upload in expired:
+            await run_in_threadpool(shutil.rmtree, self.session_dir(upload.id), True)
+            await db.delete(upload)
+        await db.commit()
+        return len(expired)
+
+
+resumable_upload_service = ResumableUploadService()
@@ -1,18 +1,159 @@
 from sqlalchemy.orm import Session
-from sqlalchemy import or_, and_, func
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy import event, literal, select, tuple_, union_all
 from datetime import datetime, timedelta
+from decimal import Decimal, InvalidOperation
+from models.database import SessionLocal
 from models.invoice import Invoice, InvoiceStatus
 from fastapi import HTTPException
+from core.cache import BloomFilter
+from core.config import settings
+from core.error_handler import logger
 import hashlib
+import threading
+
+# Sizing of the duplicate filter: each invoice adds up to three keys, and the
+# filter is built with room for as many invoices again as the table holds
+DUPLICATE_FILTER_MIN_CAPACITY = 100_000
+KEYS_PER_INVOICE = 3
+# Keys per IN (...) lookup in validate_invoices
+BATCH_LOOKUP_SIZE = 500
+
+def _amount_value(amount):
+    """An amount as every duplicate check compares it: rounded to cents, the column's scale."""
+    try:
+        return Decimal(str(amount)).quantize(Decimal("0.01"))
+    except (InvalidOperation, ValueError):
+        return amount
+
+def _amount_key(amount) -> str:
+    return str(_amount_value(amount))
+
+def _chunks(items: list, size: int = None):
+    size = size or BATCH_LOOKUP_SIZE
+    for start in range(0, len(items), size):
+        yield items[start:start + size]
+
+def _too_old(invoice_date: datetime) -> bool:
+    return invoice_date < datetime.now() - timedelta(days=90)
+
+# Hard-block messages, shared by the single and the batch checks
+def _age_block(invoice_date: datetime) -> str:
+    return f"HARD BLOCK: Invoice date ({invoice_date.strftime('%Y-%m-%d')}) is older than 90 days limit."
+
+def _number_block(invoice_no: str, paid: bool) -> str:
+    if paid:
+        return f"HARD BLOCK: An invoice with number {invoice_no} marked as PAID already exists."
+    return f"HARD BLOCK: Invoice number {invoice_no} already exists for this vendor."
+
+def _proximity_block(invoice_no: str) -> str:
+    return f"HARD BLOCK: Potential duplicate found. An invoice with same amount and similar date (within 180 days) exists (Inv: {invoice_no})."
+
+def _file_block(invoice_no: str) -> str:
+    return f"HARD BLOCK: This exact file has already been uploaded (Invoice: {invoice_no})."
+
+def _filter_keys(vendor_id=None, invoice_no=None, amount=None, file_hash=None) -> dict:
+    """Keys an invoice contributes to the duplicate filter, by hard-block rule."""
+    keys = {}
+    if vendor_id is not None and invoice_no:
+        keys["number"] = f"n:{vendor_id}:{invoice_no}"
+    if vendor_id is not None and amount is not None:
+        keys["proximity"] = f"a:{vendor_id}:{_amount_key(amount)}"
+    if file_hash:
+        keys["file"] = f"h:{file_hash}"
+    return keys
 
 class ValidationService:
+    """
+    Hard-block checks for new invoices. The duplicate checks run as one query, and
+    an in-memory Bloom filter over (vendor, invoice no), (vendor, amount) and file
+    hashes answers the common "no duplicate" case without touching the database.
+    The filter is built at startup (warm_up) and fed by every flush that writes an
+    invoice; until it is built, every check goes to the database. Once saturated it
+    is rebuilt at twice the size on a background thread while it keeps answering.
+    """
+
+    def __init__(self):
+        self.duplicate_filter = None
+        self._filter_lock = threading.Lock()
+        # Keys flushed while warm_up() reads the table, replayed into the new filter
+        self._pending = None
+        self._rebuild_thread = None
+        self._rebuild_lock = threading.Lock()
+
     @staticmethod
     def calculate_file_hash(file_content: bytes) -> str:
         """Calculate SHA-256 hash of file content."""
         return hashlib.sha256(file_content).hexdigest()
 
-    @staticmethod
+    def warm_up(self, db: Session, only_if_saturated: bool = False) -> int:
+        """(Re)build the duplicate filter from the invoices table. Returns the number of invoices read."""
+        if not settings.DUPLICATE_FILTER:
+            return 0
+        with self._filter_lock:
+            current = self.duplicate_filter
+            if only_if_saturated and (current is None or not current.saturated):
+                # Another request rebuilt it while this one waited for the lock
+                return 0
+            total = db.scalar(select(Invoice.id).order_by(Invoice.id.desc()).limit(1)) or 0
+            bloom = BloomFilter(capacity=max(DUPLICATE_FILTER_MIN_CAPACITY, 2 * KEYS_PER_INVOICE * total))
+            # The old filter (if any) keeps answering until the new one is complete
+            pending = _PendingKeys()
+            self._pending = pending
+            rows = db.execute(
+                select(Invoice.vendor_id, Invoice.invoice_no, Invoice.amount, Invoice.file_hash)
+                .execution_options(yield_per=10000)
+            )
+            count = 0
+            for row in rows:
+                for key in _filter_keys(row.vendor_id, row.invoice_no, row.amount, row.file_hash).values():
+                    bloom.add(key)
+                count += 1
+            for key in pending.drain():
+                bloom.add(key)
+            self._pending = None
+            self.duplicate_filter = bloom
+        logger.info(f"Duplicate filter built from {count} invoices ({bloom.stats()})")
+        return count
+
+    def schedule_rebuild(self) -> bool:
+        """Rebuild the saturated filter on a background thread; False if one is already running."""
+        with self._rebuild_lock:
+            thread = self._rebuild_thread
+            if thread is not None and thread.is_alive():
+                return False
+            thread = threading.Thread(target=self._rebuild, name="duplicate-filter-rebuild", daemon=True)
+            self._rebuild_thread = thread
+            thread.start()
+            return True
+
+    def _rebuild(self):
+        try:
+            with SessionLocal() as db:
+                self.warm_up(db, only_if_saturated=True)
+        except Exception as e:
+            logger.error(f"Duplicate filter rebuild failed: {e}")
+
+    def remember(self, **fields):
+        """Add an invoice's keys to the filter (called for every flushed invoice)."""
+        keys = _filter_keys(**fields).values()
+        bloom = self.duplicate_filter
+        if bloom is not None:
+            for key in keys:
+                bloom.add(key)
+        pending = self._pending
+        if pending is not None:
+            pending.extend(keys)
+
+    def _may_exist(self, keys: dict) -> dict:
+        """The subset of `keys` the filter cannot rule out (all of them when it is not built)."""
+        bloom = self.duplicate_filter
+        if bloom is None:
+            return keys
+        return {rule: key for rule, key in keys.items() if key in bloom}
+
     def validate_invoice(
+        self,
         db: Session,
         vendor_id: int,
         invoice_no: str,
@@ -28,60 +169,185 @@ class ValidationService:
         4. Already Paid check
         5. Age Limit (90 days)
         """
-        
+
         # 5. Age Limit: Invoice date older than 90 days
-        ninety_days_ago = datetime.now() - timedelta(days=90)
-        if invoice_date < ninety_days_ago:
-            raise HTTPException(
-                status_code=400, 
-                detail=f"HARD BLOCK: Invoice date ({invoice_date.strftime('%Y-%m-%d')}) is older than 90 days limit."
-            )
+        if _too_old(invoice_date):
+            raise HTTPException(status_code=400, detail=_age_block(invoice_date))
+
+        bloom = self.duplicate_filter
+        if bloom is not None and bloom.saturated:
+            # Past its capacity the false-positive rate climbs (more checks reach the
+            # database, none are missed); rebuild it without holding up this request
+            self.schedule_rebuild()
 
-        # 1. Duplicate Number & 4. Already Paid Check
-        existing_by_no = db.query(Invoice).filter(
-            Invoice.vendor_id == vendor_id,
-            Invoice.invoice_no == invoice_no
-        ).all()
-        
-        if existing_by_no:
+        # Rules 1-4 in one round trip, for the rules the filter cannot rule out
+        rules = self._may_exist(_filter_keys(vendor_id, invoice_no, amount, file_hash))
+        if not rules:
+            return True
+
+        checks = []
+        if "number" in rules:
+            # 1. Duplicate Number & 4. Already Paid Check
+            checks.append(select(literal("number").label("rule"), Invoice.invoice_no, Invoice.status).where(
+                Invoice.vendor_id == vendor_id,
+                Invoice.invoice_no == invoice_no
+            ))
+        if "proximity" in rules:
+            # 2. Proximity Duplicate (vendor + date + amount within 180 days)
+            checks.append(self._first(select(literal("proximity").label("rule"), Invoice.invoice_no, Invoice.status).where(
+                Invoice.vendor_id == vendor_id,
+                Invoice.amount == _amount_value(amount),
+                Invoice.invoice_date >= invoice_date - timedelta(days=180),
+                Invoice.invoice_date <= invoice_date + timedelta(days=180)
+            )))
+        if "file" in rules:
+            # 3. File Hash check
+            checks.append(self._first(select(literal("file").label("rule"), Invoice.invoice_no, Invoice.status).where(
+                Invoice.file_hash == file_hash
+            )))
+        query = checks[0] if len(checks) == 1 else union_all(*checks)
+        hits = {}
+        for row in db.execute(query):
+            hits.setdefault(row.rule, []).append(row)
+
+        if "number" in hits:
             # Check if any existing one is marked as PAID
-            if any(inv.status == InvoiceStatus.PAID.value for inv in existing_by_no):
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"HARD BLOCK: An invoice with number {invoice_no} marked as PAID already exists."
-                )
-            # Default duplicate number block
-            raise HTTPException(
-                status_code=400,
-                detail=f"HARD BLOCK: Invoice number {invoice_no} already exists for this vendor."
-            )
+            paid = any(row.status == InvoiceStatus.PAID.value for row in hits["number"])
+            raise HTTPException(status_code=400, detail=_number_block(invoice_no, paid))
 
-        # 2. Proximity Duplicate (vendor + date + amount within 180 days)
-        one_eighty_days_ago = invoice_date - timedelta(days=180)
-        one_eighty_days_after = invoice_date + timedelta(days=180)
-        
-        proximity_match = db.query(Invoice).filter(
-            Invoice.vendor_id == vendor_id,
-            Invoice.amount == amount,
-            Invoice.invoice_date >= one_eighty_days_ago,
-            Invoice.invoice_date <= one_eighty_days_after
-        ).first()
-        
-        if proximity_match:
-            raise HTTPException(
-                status_code=400,
-                detail=f"HARD BLOCK: Potential duplicate found. An invoice with same amount and similar date (within 180 days) exists (Inv: {proximity_match.invoice_no})."
-            )
+        if "proximity" in hits:
+            raise HTTPException(status_code=400, detail=_proximity_block(hits["proximity"][0].invoice_no))
 
-        # 3. File Hash check
-        if file_hash:
-            duplicate_file = db.query(Invoice).filter(Invoice.file_hash == file_hash).first()
-            if duplicate_file:
-                raise HTTPException(
-                    status_code=400,
-                    detail=f"HARD BLOCK: This exact file has already been uploaded (Invoice: {duplicate_file.invoice_no})."
-                )
+        if "file" in hits:
+            raise HTTPException(status_code=400, detail=_file_block(hits["file"][0].invoice_no))
 
         return True
 
+    @staticmethod
+    def _first(query):
+        """`query` LIMIT 1, wrapped so it can be a UNION member (SQLite rejects a bare LIMIT there)."""
+        sub = query.limit(1).subquery()
+        return select(*sub.c)
+
+    def check_duplicate_file(self, db: Session, file_hash: str = None):
+        """Hard block if an invoice already uses this exact file (rule 3 of validate_invoice)."""
+        if file_hash and self._may_exist(_filter_keys(file_hash=file_hash)):
+            invoice_no = db.scalar(select(Invoice.invoice_no).where(Invoice.file_hash == file_hash).limit(1))
+            if invoice_no:
+                raise HTTPException(status_code=400, detail=_file_block(invoice_no))
+
+    def validate_invoices(self, db: Session, rows: list) -> list:
+        """
+        validate_invoice for a whole batch with set-based queries (a few IN lookups per
+        BATCH_LOOKUP_SIZE rows instead of a round trip per row). `rows` are dicts with
+        vendor_id, invoice_no, invoice_date, amount and file_hash. Rows are checked in
+        order, each one also against the rows accepted before it, as if they were
+        uploaded one by one. Returns the hard-block message of each row, or None.
+        """
+        keys = [_filter_keys(r["vendor_id"], r["invoice_no"], r["amount"], r["file_hash"]) for r in rows]
+        wanted = {"number": set(), "proximity": set(), "file": set()}
+        for row, row_keys in zip(rows, keys):
+            may_exist = self._may_exist(row_keys)
+            if "number" in may_exist:
+                wanted["number"].add(row["invoice_no"])
+            if "proximity" in may_exist:
+                wanted["proximity"].add((row["vendor_id"], _amount_key(row["amount"])))
+            if "file" in may_exist:
+                wanted["file"].add(row["file_hash"])
+
+        # invoice_no -> [(vendor_id, status)]: the number is unique across vendors in the table
+        numbers = {}
+        for chunk in _chunks(sorted(wanted["number"])):
+            for row in db.execute(select(Invoice.invoice_no, Invoice.vendor_id, Invoice.status).where(Invoice.invoice_no.in_(chunk))):
+                numbers.setdefault(row.invoice_no, []).append((row.vendor_id, row.status))
+
+        # (vendor_id, amount) -> [(invoice_date, invoice_no)] within reach of any row's date
+        amounts = {}
+        dates = [r["invoice_date"] for r in rows]
+        if wanted["proximity"] and dates:
+            low, high = min(dates) - timedelta(days=180), max(dates) + timedelta(days=180)
+            for chunk in _chunks(sorted(wanted["proximity"])):
+                pairs = [(vendor_id, _amount_value(amount)) for vendor_id, amount in chunk]
+                for row in db.execute(select(Invoice.vendor_id, Invoice.amount, Invoice.invoice_date, Invoice.invoice_no).where(
+                    tuple_(Invoice.vendor_id, Invoice.amount).in_(pairs),
+                    Invoice.invoice_date >= low,
+                    Invoice.invoice_date <= high
+                )):
+                    amounts.setdefault((row.vendor_id, _amount_key(row.amount)), []).append((row.invoice_date, row.invoice_no))
+
+        # file_hash -> invoice_no
+        files = {}
+        for chunk in _chunks(sorted(wanted["file"])):
+            for row in db.execute(select(Invoice.file_hash, Invoice.invoice_no).where(Invoice.file_hash.in_(chunk))):
+                files.setdefault(row.file_hash, row.invoice_no)
+
+        errors = []
+        for row in rows:
+            error = self._batch_error(row, numbers, amounts, files)
+            errors.append(error)
+            if error is None:
+                # Accepted rows count as existing invoices for the rows after them
+                numbers.setdefault(row["invoice_no"], []).append((row["vendor_id"], InvoiceStatus.PENDING.value))
+                amounts.setdefault((row["vendor_id"], _amount_key(row["amount"])), []).append((row["invoice_date"], row["invoice_no"]))
+                if row["file_hash"]:
+                    files.setdefault(row["file_hash"], row["invoice_no"])
+        return errors
+
+    @staticmethod
+    def _batch_error(row: dict, numbers: dict, amounts: dict, files: dict):
+        """The first hard block `row` hits against the looked-up invoices, in validate_invoice's order."""
+        invoice_no, vendor_id, invoice_date = row["invoice_no"], row["vendor_id"], row["invoice_date"]
+        if _too_old(invoice_date):
+            return _age_block(invoice_date)
+
+        existing = numbers.get(invoice_no, [])
+        same_vendor = [status for owner, status in existing if owner == vendor_id]
+        if same_vendor:
+            return _number_block(invoice_no, InvoiceStatus.PAID.value in same_vendor)
+        if existing:
+            # Another vendor's invoice: the unique constraint would reject the insert
+            return f"Invoice number {invoice_no} already exists"
+
+        window = timedelta(days=180)
+        for other_date, other_no in amounts.get((vendor_id, _amount_key(row["amount"])), []):
+            if other_date is not None and invoice_date - window <= other_date <= invoice_date + window:
+                return _proximity_block(other_no)
+
+        if row["file_hash"] and row["file_hash"] in files:
+            return _file_block(files[row["file_hash"]])
+        return None
+
+    async def check_duplicate_file_async(self, db: AsyncSession, file_hash: str = None):
+        """check_duplicate_file for routes running on the async engine."""
+        return await db.run_sync(self.check_duplicate_file, file_hash)
+
+    async def validate_invoice_async(self, db: AsyncSession, **kwargs):
+        """validate_invoice for routes running on the async engine."""
+        return await db.run_sync(self.validate_invoice, **kwargs)
+
+class _PendingKeys:
+    """Keys flushed while warm_up() is reading the table."""
+
+    def __init__(self):
+        self._keys = []
+        self._lock = threading.Lock()
+
+    def extend(self, keys):
+        with self._lock:
+            self._keys.extend(keys)
+
+    def drain(self) -> list:
+        with self._lock:
+            keys, self._keys = self._keys, []
+            return keys
+
 validation_service = ValidationService()
+
+@event.listens_for(Session, "after_flush")
+def remember_flushed_invoices(session, flush_context):
+    """Feed new and edited invoices to the duplicate filter (rolled-back ones only cost a false positive)."""
+    for obj in list(session.new) + list(session.dirty):
+        if isinstance(obj, Invoice):
+            validation_service.remember(
+                vendor_id=obj.vendor_id, invoice_no=obj.invoice_no, amount=obj.amount, file_hash=obj.file_hash
+            )
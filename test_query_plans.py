@@ -0,0 +1,429 @@
+"""
+Query-plan and query-budget regression suite for the hot SQL statements.
+Seeds a throwaway database, captures the SQL emitted by the hot endpoints, runs
+EXPLAIN QUERY PLAN (SQLite) / EXPLAIN (PostgreSQL) on every SELECT, and fails when an
+expected index is not used or a large table is scanned without an explicit allowance.
+Then calls every route that declares a query_budget() with QUERY_BUDGET_STRICT on, so a
+reintroduced N+1 fails the run.
+
+Usage: python test_query_plans.py [invoices] [--show]     (default: 20000 invoices)
+       QUERY_PLAN_DATABASE_URL=postgresql://... python test_query_plans.py
+         runs against an empty scratch PostgreSQL database instead (it is filled, not reset)
+"""
+
+import os
+import random
+import re
+import sys
+import tempfile
+from datetime import datetime, timedelta
+
+_tmp = tempfile.TemporaryDirectory()
+DATABASE_URL = os.getenv("QUERY_PLAN_DATABASE_URL") or f"sqlite:///{os.path.join(_tmp.name, 'plans.db')}"
+# Must be set before the app (models.database) creates its engines
+os.environ["DATABASE_URL"] = DATABASE_URL
+os.environ.pop("ASYNC_DATABASE_URL", None)
+
+from fastapi import HTTPException
+from fastapi.testclient import TestClient
+from sqlalchemy import event, insert, select
+
+import main
+from core.config import settings
+from models.database import engine, async_engine, SessionLocal
+from models.audit import AuditLog
+from models.invoice import Invoice, backfill_invoice_totals
+from models.invoice_rollup import rebuild_invoice_rollups
+from models.fingerprint import FileFingerprint, FingerprintBand, NearDuplicateMatch
+from models.message import Message
+from models.session import Session as UserSession
+from models.tax_document import VendorTaxDocument
+from models.user import User
+from models.vendor import Vendor
+from services.auth import auth_service
+from services.near_duplicates import near_duplicate_service
+from services.search import search_index
+from services.validation import validation_service
+
+VENDORS = 300
+STATUSES = ["pending", "under_review", "approved", "rejected", "paid", "hold"]
+
+# Tables big enough in production that a full scan is a regression
+LARGE_TABLES = {"invoices", "audit_logs", "messages", "sessions", "vendor_tax_documents",
+                "file_fingerprints", "fingerprint_bands", "near_duplicate_matches"}
+
+
+class PlanCapture:
+    """Records the SELECTs both engines send to the database while active."""
+
+    def __init__(self):
+        self.statements = None
+        for target in (engine, async_engine.sync_engine):
+            event.listen(target, "before_cursor_execute", self._record)
+
+    def _record(self, conn, cursor, statement, parameters, context, executemany):
+        if self.statements is not None and not executemany and statement.lstrip().upper().startswith(("SELECT", "WITH")):
+            self.statements.append((statement, parameters))
+
+    def __enter__(self):
+        self.statements = []
+        return self.statements
+
+    def __exit__(self, *exc):
+        self.statements, captured = None, self.statements
+        return False
+
+
+def explain(statement: str, parameters) -> list:
+    """
+    The plan of one captured statement as (kind, table, index) steps: kind is "scan"
+    (whole table), "walk" (table or index read in order until LIMIT is reached),
+    "search" (index or key lookup) or "other" (index holds the plan detail).
+    """
+    steps = []
+    with engine.connect() as conn:
+        if conn.dialect.name == "sqlite":
+            for row in conn.exec_driver_sql("EXPLAIN QUERY PLAN " + statement, tuple(parameters or ())):
+                detail = row[-1]
+                match = re.match(r"(SCAN|SEARCH) (?:TABLE )?(\w+)(?: AS \w+)?(?: USING (?:COVERING |INTEGER PRIMARY KEY|PRIMARY KEY|AUTOMATIC \w+ )?(?:INDEX )?(\w+)?)?", detail)
+                if not match:
+                    steps.append(("other", None, detail))
+                    continue
+                verb, table, index = match.groups()
+                steps.append(("scan" if verb == "SCAN" else "search", table, index))
+        else:
+            # Statements captured from the asyncpg engine use $n placeholders
+            if isinstance(parameters, (list, tuple)) and re.search(r"\$\d+", statement):
+                values = list(parameters)
+                parameters = tuple(values[int(n) - 1] for n in re.findall(r"\$(\d+)", statement))
+                statement = re.sub(r"\$\d+", "%s", statement.replace("%", "%%"))
+            plan = conn.exec_driver_sql("EXPLAIN (FORMAT JSON) " + statement, parameters or ()).scalar()
+            plan = plan[0]["Plan"] if isinstance(plan, list) else plan
+
+            def walk(node):
+                node_type = node.get("Node Type", "")
+                table = node.get("Relation Name")
+                if node_type == "Seq Scan":
+                    steps.append(("scan", table, None))
+                elif node_type in ("Sort", "Incremental Sort"):
+                    steps.append(("sort", None, None))
+                elif "Index" in node_type or node_type == "Bitmap Heap Scan":
+                    steps.append(("search", table, node.get("Index Name")))
+                for child in node.get("Plans", []):
+                    walk(child)
+            walk(plan)
+
+    # A scan in the requested order under LIMIT stops after the page (an ordered walk);
+    # without LIMIT, or when the rows must be sorted first, it reads the whole table
+    ordered = not any(kind == "other" and "TEMP B-TREE FOR ORDER BY" in detail for kind, _, detail in steps)
+    sorted_pg = any(kind == "sort" for kind, _, _ in steps)
+    if re.search(r"\bLIMIT\b", statement, re.IGNORECASE) and ordered and not sorted_pg:
+        steps = [("walk" if kind == "scan" else kind, table, index) for kind, table, index in steps]
+    return [step for step in steps if step[0] != "sort"]
+
+
+class Case:
+    """
+    One hot path: `run` exercises it while its SQL is captured.
+    expect: index names, at least one of each tuple must appear in the plans
+    allow_scan: {table: reason} for large tables this path legitimately reads in full
+    """
+
+    def __init__(self, name, run, expect=(), allow_scan=None):
+        self.name = name
+        self.run = run
+        self.expect = [(e,) if isinstance(e, str) else tuple(e) for e in expect]
+        self.allow_scan = allow_scan or {}
+
+
+def seed(rows: int) -> dict:
+    """Fill the database with `rows` invoices and proportional side tables, then ANALYZE."""
+    rng = random.Random(7)
+    now = datetime.now()
+    with engine.begin() as conn:
+        conn.execute(insert(Vendor), [
+            {"id": v, "company_name": f"Vendor {v:03d} Travels", "email": f"v{v}@example.com", "mobile": f"9{v:09d}",
+             "pan": f"ABCDE{v:04d}F", "gstin": f"29ABCDE{v:04d}F1Z5",
+             "status": "active" if v % 4 else "pending", "kyc_verified": v % 4 != 0}
+            for v in range(1, VENDORS + 1)
+        ])
+        conn.execute(insert(User), [{"id": 1, "email": "admin@example.com", "password_hash": "-", "name": "Admin", "role": "admin", "is_active": True, "vendor_id": None}] + [
+            {"id": 1 + v, "email": f"v{v}@example.com", "password_hash": "-", "name": f"Vendor {v}", "role": "vendor", "is_active": True, "vendor_id": v}
+            for v in range(1, VENDORS + 1)
+        ])
+        for offset in range(0, rows, 50000):
+            conn.execute(insert(Invoice), [{
+                "invoice_no": f"INV-{i:08d}",
+                "vendor_id": rng.randint(1, VENDORS),
+                "amount": rng.randint(1000, 500000) / 100,
+                "tax_amount": 0,
+                "cgst": 9, "sgst": 9, "igst": 0,
+                "status": rng.choice(STATUSES),
+                "invoice_date": now - timedelta(days=rng.randint(0, 720)),
+                "created_at": now - timedelta(minutes=rows - i),
+                "file_hash": f"{i:064x}",
+                "payment_reference": f"UTR{rng.randrange(10 ** 12):012d}" if rng.random() < 0.3 else None,
+            } for i in range(offset, min(offset + 50000, rows))])
+        backfill_invoice_totals(conn)
+        conn.execute(insert(AuditLog), [
+            {"invoice_id": rng.randint(1, rows), "actor_id": 1, "actor_name": "Admin", "actor_role": "admin",
+             "action": "UPDATE", "timestamp": now - timedelta(minutes=i)}
+            for i in range(rows)
+        ])
+        conn.execute(insert(Message), [
+            {"sender_id": sender, "receiver_id": 1 if sender != 1 else rng.randint(2, VENDORS + 1),
+             "content": "hello", "created_at": now - timedelta(minutes=i)}
+            for i, sender in enumerate(rng.choice([1, rng.randint(2, VENDORS + 1)]) for _ in range(rows // 2))
+        ])
+        conn.execute(insert(UserSession), [
+            {"token": f"{i:064x}", "user_id": rng.randint(1, VENDORS + 1), "expires_at": now + timedelta(hours=rng.randint(-48, 8))}
+            for i in range(rows // 4)
+        ])
+        conn.execute(insert(VendorTaxDocument), [
+            {"vendor_id": rng.randint(1, VENDORS), "file_path": f"uploads/tax/{i}.pdf", "financial_year": "2025-2026",
+             "quarter": rng.choice(["Q1", "Q2", "Q3", "Q4"]), "uploaded_by": 1, "created_at": now - timedelta(hours=i)}
+            for i in range(rows // 10)
+        ])
+        # Image fingerprints for a quarter of the files, a few of them matched
+        signatures = [(f"{i:064x}", rng.randbytes(32)) for i in range(0, rows, 4)]
+        conn.execute(insert(FileFingerprint), [
+            {"file_hash": file_hash, "kind": "image", "signature": signature} for file_hash, signature in signatures
+        ])
+        conn.execute(insert(FingerprintBand), [
+            {"band_key": key, "file_hash": file_hash}
+            for file_hash, signature in signatures for key in set(near_duplicate_service.band_keys("image", signature))
+        ])
+        conn.execute(insert(NearDuplicateMatch), [
+            {"file_hash": f"{i:064x}", "match_hash": f"{i - 4:064x}", "kind": "image", "similarity": 0.95,
+             "detected_at": now - timedelta(minutes=i)}
+            for i in range(4, rows, 400)
+        ])
+        search_index.rebuild(conn)
+    with SessionLocal() as db:
+        rebuild_invoice_rollups(db)
+        db.commit()
+        admin = auth_service._create_session(db, db.get(User, 1))
+        vendor = auth_service._create_session(db, db.get(User, 2))
+    with engine.begin() as conn:
+        # Planner statistics, as a long-running database would have them
+        conn.exec_driver_sql("ANALYZE")
+    return {"admin": admin["token"], "vendor": vendor["token"], "vendor_id": 1, "vendor_user_id": 2}
+
+
+def build_cases(c: TestClient, auth: dict) -> list:
+    A = {"Authorization": auth["admin"]}
+    V = {"Authorization": auth["vendor"]}
+
+    def get(path, headers, **params):
+        def run():
+            response = c.get(path, headers=headers, params=params)
+            assert response.status_code == 200, (path, response.status_code, response.text)
+        return run
+
+    def next_page(path, headers, **params):
+        """Second keyset page, so the cursor predicate is part of the captured SQL."""
+        first = c.get(path, headers=headers, params={**params, "cursor": ""}).json()
+        return get(path, headers, **params, cursor=first["next_cursor"])
+
+    def validate():
+        # Without the Bloom filter, so the duplicate query runs with all three checks
+        bloom, validation_service.duplicate_filter = validation_service.duplicate_filter, None
+        with SessionLocal() as db:
+            try:
+                validation_service.validate_invoice(db, vendor_id=auth["vendor_id"], invoice_no="INV-NEW-1",
+                                                    invoice_date=datetime.now() - timedelta(days=3), amount=1234.56,
+                                                    file_hash="f" * 64)
+            except HTTPException:
+                pass  # a hard block is still a valid run of the checks
+            finally:
+                validation_service.duplicate_filter = bloom
+
+    def near_duplicate_lookup():
+        with SessionLocal() as db:
+            near_duplicate_service.index(db, "e" * 64, ("image", bytes(range(32))))
+            db.rollback()
+
+    def session_lookup():
+        auth_service.session_cache.clear()
+        assert auth_service.validate_session(auth["vendor"]) is not None
+
+    full_list = "unfiltered admin list: count and totals cover every invoice"
+    vendor_keys = ("ix_invoices_vendor_invoice_no", "ix_invoices_vendor_amount_date")
+    return [
+        Case("invoices/data admin, default sort", get("/api/invoices/data", A), allow_scan={"invoices": full_list}),
+        Case("invoices/data admin, status", get("/api/invoices/data", A, status="approved"),
+             expect=[("ix_invoices_status_created_at", "ix_invoices_status")]),
+        Case("invoices/data admin, status + amount sort", get("/api/invoices/data", A, status="pending", sort="amount", dir="desc"),
+             expect=[("ix_invoices_status_created_at", "ix_invoices_status")]),
+        Case("invoices/data admin, FY range", get("/api/invoices/data", A, start_date="2025-04-01", end_date="2026-03-31"),
+             expect=["ix_invoices_invoice_date"]),
+        Case("invoices/data admin, search", get("/api/invoices/data", A, search="INV-0000123"), expect=["invoice_fts"]),
+        Case("invoices/data admin, vendor search", get("/api/invoices/data", A, vendor_search="Vendor 01"),
+             expect=["vendor_fts", vendor_keys]),
+        Case("invoices/data admin, amount keyset page 2", next_page("/api/invoices/data", A, sort="amount", dir="desc", count="none", totals="false"),
+             expect=["ix_invoices_grand_total"]),
+        Case("invoices/data admin, created keyset page 2", next_page("/api/invoices/data", A, count="none", totals="false")),
+        Case("invoices/data vendor, default sort", get("/api/invoices/data", V), expect=[vendor_keys]),
+        Case("invoices/data vendor, status", get("/api/invoices/data", V, status="paid"), expect=[vendor_keys]),
+        Case("invoices/data vendor, amount sort", get("/api/invoices/data", V, sort="amount", dir="desc"), expect=[vendor_keys]),
+        Case("validate_invoice", validate, expect=[("ix_invoices_vendor_invoice_no", "ix_invoices_invoice_no"), "ix_invoices_vendor_amount_date", "ix_invoices_file_hash"]),
+        Case("admin/stats", get("/api/admin/stats", A)),
+        Case("admin/pending-invoices", get("/api/admin/pending-invoices", A),
+             expect=[("ix_invoices_status_created_at", "ix_invoices_status")]),
+        Case("admin/pending-invoices, vendor", get("/api/admin/pending-invoices", A, vendor_id=auth["vendor_id"]),
+             expect=[vendor_keys + ("ix_invoices_status_created_at", "ix_invoices_status")]),
+        Case("admin/pending-invoices page", get("/api/admin/pending-invoices", A, limit=20, page=3),
+             expect=[("ix_invoices_status_created_at", "ix_invoices_status")]),
+        Case("admin/pending-invoices, search", get("/api/admin/pending-invoices", A, limit=20, search="Vendor 01"),
+             expect=["vendor_fts", vendor_keys]),
+        Case("admin/pending-invoices NDJSON", get("/api/admin/pending-invoices", A, format="ndjson"),
+             expect=[("ix_invoices_status_created_at", "ix_invoices_status")]),
+        Case("vendor/stats", get("/api/vendor/stats", V)),
+        Case("chat/history", get("/api/chat/history", A, receiver_id=auth["vendor_user_id"]), expect=["ix_messages_conversation"]),
+        Case("session validation", session_lookup, expect=["ix_sessions_token"]),
+        Case("near-duplicate lookup", near_duplicate_lookup,
+             expect=[("sqlite_autoindex_fingerprint_bands_1", "fingerprint_bands_pkey"),
+                     ("sqlite_autoindex_file_fingerprints_1", "file_fingerprints_pkey")]),
+        Case("admin/possible-duplicates", get("/api/admin/possible-duplicates", A),
+             expect=["ix_near_duplicate_matches_detected_at", "ix_invoices_file_hash"]),
+        Case("admin/vendors page", get("/api/admin/vendors", A, limit=25, page=3, fields="id,company_name"),
+             expect=["ix_vendors_company_name"]),
+        Case("admin/vendors, status", get("/api/admin/vendors", A, limit=25, status="pending"),
+             expect=["ix_vendors_status_company_name"]),
+        Case("admin/vendors, KYC", get("/api/admin/vendors", A, limit=25, kyc_verified="false"),
+             expect=[("ix_vendors_kyc_verified_company_name", "ix_vendors_status_company_name")]),
+        Case("admin/vendors, search", get("/api/admin/vendors", A, limit=25, search="v12@exam"), expect=["vendor_fts"]),
+        Case("tax documents, vendor", get("/api/tax-docs/list", A, vendor_id=auth["vendor_id"]), expect=["ix_vendor_tax_documents_vendor_created"]),
+    ]
+
+
+def budget_requests(auth: dict) -> list:
+    """
+    (path, headers, params) for every route with a query_budget(): big pages, every
+    optional join, so an N+1 shows up as statements per row.
+    """
+    A = {"Authorization": auth["admin"]}
+    V = {"Authorization": auth["vendor"]}
+    return [
+        ("/api/invoices/data", A, {"limit": 100}),
+        ("/api/invoices/data", A, {"limit": 100, "sort": "vendor", "vendor_search": "Vendor 01", "raw": "true"}),
+        ("/api/invoices/data", V, {"limit": 100, "cursor": ""}),
+        ("/api/admin/vendors", A, {}),
+        ("/api/admin/vendors", A, {"limit": 100, "search": "Travels"}),
+        ("/api/admin/pending-invoices", A, {}),
+        ("/api/admin/pending-invoices", A, {"limit": 100, "sort": "vendor", "search": "Vendor 01"}),
+        ("/api/admin/pending-invoices", A, {"format": "ndjson"}),
+        ("/api/reports/invoices-csv", A, {}),
+        ("/api/tax-docs/list", A, {}),
+        ("/api/tax-docs/list", A, {"vendor_id": auth["vendor_id"]}),
+    ]
+
+
+def budgeted_routes() -> set:
+    """Paths of the app's routes that declare a query_budget()."""
+    paths = set()
+    for route in main.app.routes:
+        dependant = getattr(route, "dependant", None)
+        if dependant and any(getattr(dep.call, "__name__", "") == "declare_budget" for dep in dependant.dependencies):
+            paths.add(route.path)
+    return paths
+
+
+def check_budgets(c: TestClient, auth: dict) -> int:
+    """
+    Run every budgeted route with QUERY_BUDGET_STRICT on and a cold session cache
+    (so the session lookup counts too). Returns the number of failures.
+    """
+    failures = 0
+    requests = budget_requests(auth)
+    missing = budgeted_routes() - {path for path, _, _ in requests}
+    for path in sorted(missing):
+        failures += 1
+        print(f"❌ {path}: has a query budget but no request in budget_requests()")
+    settings.QUERY_BUDGET_STRICT = settings.QUERY_COUNT_HEADER = True
+    try:
+        for path, headers, params in requests:
+            auth_service.session_cache.clear()
+            response = c.get(path, headers=headers, params=params)
+            label = f"{path} {params}" if params else path
+            if response.status_code != 200:
+                failures += 1
+                print(f"❌ {label}: {response.status_code} {response.text[:300]}")
+            else:
+                print(f"✅ {label} ({response.headers.get('X-Query-Count')} statements)")
+    finally:
+        settings.QUERY_BUDGET_STRICT = settings.QUERY_COUNT_HEADER = False
+    return failures
+
+
+def check(case: Case, statements: list, show: bool) -> list:
+    """Problems found in the plans of one case's statements (empty when it passes)."""
+    problems = []
+    used = set()
+    for statement, parameters in statements:
+        steps = explain(statement, parameters)
+        if show:
+            print("    " + " ".join(statement.split())[:160])
+            for kind, table, index in steps:
+                print(f"      {kind:<6} {table or '':<22} {index or ''}")
+        for kind, table, index in steps:
+            if index:
+                used.add(index)
+            if table:
+                used.add(table)  # FTS virtual tables show up as a scanned table
+            if kind == "scan" and table in LARGE_TABLES and table not in case.allow_scan:
+                problems.append(f"full scan of {table}: {' '.join(statement.split())[:120]}")
+    for options in case.expect:
+        if not used.intersection(options):
+            problems.append(f"expected index not used: {' or '.join(options)}")
+    if not statements:
+        problems.append("no SQL captured")
+    return problems
+
+
+def main_suite():
+    args = [a for a in sys.argv[1:] if not a.startswith("--")]
+    show = "--show" in sys.argv
+    rows = int(args[0]) if args else 20000
+
+    print("=" * 60)
+    print("QUERY PLAN REGRESSION SUITE")
+    print("=" * 60)
+    print(f"ℹ Database: {engine.dialect.name}, {rows:,} invoices")
+
+    failures = 0
+    with TestClient(main.app) as c:  # startup runs the migrations
+        with SessionLocal() as db:
+            if db.scalar(select(Invoice.id).limit(1)) is not None:
+                print("❌ The database already has invoices; point QUERY_PLAN_DATABASE_URL at an empty one")
+                return False
+        auth = seed(rows)
+        capture = PlanCapture()
+        for case in build_cases(c, auth):
+            case.run()  # warm up: session cache, lazy imports
+            with capture as statements:
+                case.run()
+            problems = check(case, statements, show)
+            if problems:
+                failures += 1
+                print(f"❌ {case.name}")
+                for problem in problems:
+                    print(f"    {problem}")
+            else:
+                allowed = f"   (scan allowed: {', '.join(case.allow_scan)})" if case.allow_scan else ""
+                print(f"✅ {case.name} ({len(statements)} statements){allowed}")
+
+        print("\nℹ Query budgets (QUERY_BUDGET_STRICT)")
+        failures += check_budgets(c, auth)
+
+    print("\n" + "=" * 60)
+    print("❌ %d case(s) failed" % failures if failures else "✅ All query plans use their indexes and routes stay within budget")
+    print("=" * 60)
+    return failures == 0
+
+
+if __name__ == "__main__":
+    ok = main_suite()
+    engine.dispose()
+    _tmp.cleanup()
+    sys.exit(0 if ok else 1)